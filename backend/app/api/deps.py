@@ -7,17 +7,15 @@ from uuid import UUID
 
 from app.database import get_db
 from app.core.security import decode_token
+from app.core.principal import Principal, principal_cache
 from app.models.user import User
+from app.models.vendor import Vendor
 
 security = HTTPBearer()
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    """Extract and validate user from JWT token."""
-    token = credentials.credentials
+def _token_subject(token: str) -> UUID:
+    """Validate an access token and return its user id."""
     payload = decode_token(token)
 
     if payload is None:
@@ -40,14 +38,69 @@ async def get_current_user(
             detail="Invalid token payload",
         )
 
-    result = await db.execute(select(User).where(User.id == UUID(user_id)))
+    return UUID(user_id)
+
+
+def _inactive_user() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="User not found or inactive",
+    )
+
+
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+) -> Principal:
+    """Resolve the caller without loading the ORM User."""
+    return await principal_for_token(credentials.credentials, db)
+
+
+async def principal_for_token(token: str, db: AsyncSession) -> Principal:
+    """Resolve an access token to its principal (also for WebSockets).
+
+    Served from ``principal_cache``; on a miss a single column query fetches
+    role, active flag and vendor id.
+    """
+    user_id = _token_subject(token)
+
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        result = await db.execute(
+            select(User.role, User.is_active, Vendor.id)
+            .outerjoin(Vendor, Vendor.user_id == User.id)
+            .where(User.id == user_id)
+        )
+        row = result.first()
+        if row is None:
+            raise _inactive_user()
+        principal = Principal(
+            id=user_id, role=row[0], is_active=row[1], vendor_id=row[2]
+        )
+        principal_cache.set(principal)
+
+    if not principal.is_active:
+        raise _inactive_user()
+
+    return principal
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """Extract and validate user from JWT token, loading the full User row.
+
+    Only for endpoints that read or modify the user's own columns; everything
+    else should depend on ``get_current_principal``.
+    """
+    user_id = _token_subject(credentials.credentials)
+
+    result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
 
     if not user or not user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found or inactive",
-        )
+        raise _inactive_user()
 
     return user
 
@@ -1,8 +1,7 @@
 """Comprehensive Admin panel endpoints."""
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_, desc, asc
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy import select, func, or_, desc
 from uuid import UUID
 from datetime import datetime, timedelta
 from typing import Optional
@@ -13,21 +12,38 @@ from app.database import get_db
 from app.config import get_settings
 
 settings = get_settings()
-from app.api.deps import get_current_user
+from app.api.deps import get_current_principal
+from app.core.principal import Principal, invalidate_principal
+from app.core.load_plans import (
+    ADMIN_ORDER_ROW, ADMIN_ORDER_DETAIL, ADMIN_PRODUCT_ROW, ADMIN_VENDOR_DETAIL,
+    ADMIN_PAYMENT_ROW, ADMIN_PAYOUT_ROW, ADMIN_REVIEW_ROW,
+)
+from app.core.counting import count_total
+from app.core.cache import invalidate_on_commit
 from app.models.user import User, UserRole
 from app.models.vendor import Vendor, VendorStatus
 from app.models.product import Product, ProductCategory, ProductStatus, ProductImage
-from app.models.order import Order, OrderStatus, OrderStatusHistory, PaymentStatus
+from app.models.order import (
+    Order, OrderStatus, OrderStatusHistory, PaymentStatus, DailySalesRollup, CustomerStats,
+)
 from app.models.payment import Payment, VendorPayout, PayoutStatus
 from app.models.promotion import Coupon, DiscountType
 from app.models.review import Review
 from app.schemas.vendor import VendorResponse, VendorAdminUpdate
-from app.schemas.base import ResponseBase, PaginatedResponse
+from app.schemas.product import CategoryUpdate
+from app.schemas.base import ResponseBase, PaginatedResponse, Keyset, page_count
+from app.services.dashboard import dashboard_snapshot
+from app.services.categories import category_tree
+from app.services.prefix_index import index_product_on_commit, unindex_product_on_commit
+from app.services.rollups import record_status_change, customer_stats_projection
+from app.services.outbox import record_order_event
+from app.services.tracking import location_tracker
+from app.api.v1.websockets import manager as ws_manager
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 
-def _require_admin(user: User):
+def _require_admin(user: Principal):
     if user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Admin access required")
 
@@ -38,72 +54,30 @@ def _require_admin(user: User):
 
 @router.get("/dashboard")
 async def admin_dashboard(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
-    users_count = (await db.execute(select(func.count(User.id)))).scalar() or 0
-    customers_count = (await db.execute(
-        select(func.count(User.id)).where(User.role == UserRole.CUSTOMER))).scalar() or 0
-    vendors_count = (await db.execute(select(func.count(Vendor.id)))).scalar() or 0
-    pending_vendors = (await db.execute(
-        select(func.count(Vendor.id)).where(Vendor.status == VendorStatus.PENDING))).scalar() or 0
-    active_vendors = (await db.execute(
-        select(func.count(Vendor.id)).where(Vendor.is_active == True))).scalar() or 0
-    total_orders = (await db.execute(select(func.count(Order.id)))).scalar() or 0
-    pending_orders = (await db.execute(
-        select(func.count(Order.id)).where(Order.status == OrderStatus.PENDING))).scalar() or 0
-    total_revenue = (await db.execute(
-        select(func.sum(Order.total_amount)).where(Order.status == OrderStatus.DELIVERED))).scalar() or 0
-    total_commission = (await db.execute(
-        select(func.sum(Order.commission_amount)).where(Order.status == OrderStatus.DELIVERED))).scalar() or 0
-    total_products = (await db.execute(select(func.count(Product.id)))).scalar() or 0
-    low_stock_count = (await db.execute(
-        select(func.count(Product.id)).where(
-            Product.stock_quantity <= Product.low_stock_threshold,
-            Product.status == ProductStatus.ACTIVE))).scalar() or 0
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    monthly_revenue = (await db.execute(
-        select(func.sum(Order.total_amount)).where(
-            Order.status == OrderStatus.DELIVERED, Order.created_at >= thirty_days_ago))).scalar() or 0
-    monthly_orders = (await db.execute(
-        select(func.count(Order.id)).where(Order.created_at >= thirty_days_ago))).scalar() or 0
-    new_customers = (await db.execute(
-        select(func.count(User.id)).where(
-            User.role == UserRole.CUSTOMER, User.created_at >= thirty_days_ago))).scalar() or 0
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    weekly_revenue = (await db.execute(
-        select(func.sum(Order.total_amount)).where(
-            Order.status == OrderStatus.DELIVERED, Order.created_at >= seven_days_ago))).scalar() or 0
-    weekly_orders = (await db.execute(
-        select(func.count(Order.id)).where(Order.created_at >= seven_days_ago))).scalar() or 0
-    return {"success": True, "data": {
-        "total_users": users_count, "total_customers": customers_count,
-        "total_vendors": vendors_count, "active_vendors": active_vendors,
-        "pending_vendors": pending_vendors, "total_orders": total_orders,
-        "pending_orders": pending_orders, "total_revenue": float(total_revenue),
-        "total_commission": float(total_commission), "monthly_revenue": float(monthly_revenue),
-        "monthly_orders": monthly_orders, "weekly_revenue": float(weekly_revenue),
-        "weekly_orders": weekly_orders, "new_customers_30d": new_customers,
-        "total_products": total_products, "low_stock_count": low_stock_count,
-    }}
+    data = await dashboard_snapshot.get(db)
+    return {"success": True, "data": data, "as_of": dashboard_snapshot.computed_at.isoformat()}
 
 
 @router.get("/dashboard/revenue-chart")
 async def revenue_chart(
     period: str = Query("daily", pattern="^(daily|weekly|monthly)$"),
     days: int = Query(30, ge=7, le=365),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
-    start_date = datetime.utcnow() - timedelta(days=days)
+    start_date = (datetime.utcnow() - timedelta(days=days)).date()
     trunc = {"daily": "day", "weekly": "week", "monthly": "month"}[period]
-    date_trunc = func.date_trunc(trunc, Order.created_at)
+    date_trunc = func.date_trunc(trunc, DailySalesRollup.day)
     result = await db.execute(
-        select(date_trunc.label("period"), func.sum(Order.total_amount).label("revenue"),
-               func.sum(Order.commission_amount).label("commission"), func.count(Order.id).label("orders"))
-        .where(Order.created_at >= start_date, Order.status == OrderStatus.DELIVERED)
+        select(date_trunc.label("period"), func.sum(DailySalesRollup.revenue).label("revenue"),
+               func.sum(DailySalesRollup.commission).label("commission"),
+               func.sum(DailySalesRollup.order_count).label("orders"))
+        .where(DailySalesRollup.day >= start_date, DailySalesRollup.status == OrderStatus.DELIVERED)
         .group_by(date_trunc).order_by(date_trunc))
     return {"success": True, "data": [
         {"period": r.period.isoformat() if r.period else "", "revenue": float(r.revenue or 0),
@@ -113,13 +87,13 @@ async def revenue_chart(
 @router.get("/dashboard/recent-orders")
 async def recent_orders(
     limit: int = Query(10, ge=1, le=50),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
     result = await db.execute(
         select(Order)
-        .options(joinedload(Order.customer), joinedload(Order.vendor), selectinload(Order.items))
+        .options(*ADMIN_ORDER_ROW)
         .order_by(Order.created_at.desc())
         .limit(limit)
     )
@@ -136,7 +110,7 @@ async def recent_orders(
 @router.get("/dashboard/top-vendors")
 async def top_vendors(
     limit: int = Query(5, ge=1, le=20),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
@@ -154,7 +128,7 @@ async def top_vendors(
 @router.get("/dashboard/top-products")
 async def top_products(
     limit: int = Query(5, ge=1, le=20),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
@@ -167,6 +141,13 @@ async def top_products(
          "avg_rating": r.avg_rating, "stock_quantity": r.stock_quantity} for r in result.all()]}
 
 
+@router.get("/system/websockets")
+async def websocket_stats(current_user: Principal = Depends(get_current_principal)):
+    """Send-queue health and location coalescing of this worker's WebSockets."""
+    _require_admin(current_user)
+    return {"success": True, "data": {**ws_manager.stats(), "locations": location_tracker.stats()}}
+
+
 # ═══════════════════════════════════════════════════════════════
 # VENDOR MANAGEMENT
 # ═══════════════════════════════════════════════════════════════
@@ -174,29 +155,30 @@ async def top_products(
 @router.get("/vendors", response_model=PaginatedResponse[VendorResponse])
 async def list_all_vendors(
     status: Optional[VendorStatus] = None, search: Optional[str] = None,
-    page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None, page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
     query = select(Vendor)
     if status: query = query.where(Vendor.status == status)
     if search: query = query.where(or_(Vendor.store_name.ilike(f"%{search}%"), Vendor.city.ilike(f"%{search}%")))
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-    query = query.order_by(Vendor.created_at.desc()).offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    vendors = result.scalars().all()
+    total = await count_total(db, query, include_total)
+    keyset = Keyset(Vendor.created_at, Vendor.id, cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    vendors = keyset.page(result.scalars().all())
     return PaginatedResponse(data=[VendorResponse.model_validate(v) for v in vendors],
-        total=total, page=page, page_size=page_size, total_pages=(total + page_size - 1) // page_size)
+        total=total, page=page, page_size=page_size, total_pages=page_count(total, page_size),
+        **keyset.meta())
 
 
 @router.get("/vendors/{vendor_id}")
-async def get_vendor_detail(vendor_id: UUID, current_user: User = Depends(get_current_user),
+async def get_vendor_detail(vendor_id: UUID, current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
     result = await db.execute(
         select(Vendor)
-        .options(joinedload(Vendor.user), selectinload(Vendor.documents))
+        .options(*ADMIN_VENDOR_DETAIL)
         .where(Vendor.id == vendor_id)
     )
     vendor = result.scalar_one_or_none()
@@ -221,7 +203,7 @@ async def get_vendor_detail(vendor_id: UUID, current_user: User = Depends(get_cu
 
 @router.put("/vendors/{vendor_id}", response_model=ResponseBase[VendorResponse])
 async def update_vendor_admin(vendor_id: UUID, data: VendorAdminUpdate,
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
     result = await db.execute(select(Vendor).where(Vendor.id == vendor_id))
     vendor = result.scalar_one_or_none()
@@ -231,6 +213,7 @@ async def update_vendor_admin(vendor_id: UUID, data: VendorAdminUpdate,
     if data.status == VendorStatus.APPROVED: vendor.is_active = True
     elif data.status in (VendorStatus.REJECTED, VendorStatus.SUSPENDED): vendor.is_active = False
     await db.flush()
+    invalidate_on_commit(db, "vendors")
     return ResponseBase(data=VendorResponse.model_validate(vendor))
 
 
@@ -245,15 +228,12 @@ async def admin_list_orders(
     date_from: Optional[str] = None, date_to: Optional[str] = None,
     sort_by: str = Query("created_at", pattern="^(created_at|total_amount|order_number)$"),
     sort_order: str = Query("desc", pattern="^(asc|desc)$"),
-    page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None, page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
-    query = select(Order).options(
-        joinedload(Order.customer),
-        joinedload(Order.vendor),
-        selectinload(Order.items)
-    )
+    query = select(Order).options(*ADMIN_ORDER_ROW)
     if status: query = query.where(Order.status == status)
     if payment_status: query = query.where(Order.payment_status == payment_status)
     if vendor_id: query = query.where(Order.vendor_id == vendor_id)
@@ -264,13 +244,11 @@ async def admin_list_orders(
     if date_to:
         try: query = query.where(Order.created_at <= datetime.fromisoformat(date_to))
         except ValueError: pass
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-    sort_col = getattr(Order, sort_by)
-    query = query.order_by(desc(sort_col) if sort_order == "desc" else asc(sort_col))
-    query = query.offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    orders = result.scalars().all()
+    total = await count_total(db, query, include_total)
+    keyset = Keyset(getattr(Order, sort_by), Order.id, descending=sort_order == "desc",
+        cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    orders = keyset.page(result.scalars().all())
     return {"success": True, "data": [
         {"id": str(o.id), "order_number": o.order_number,
          "customer_id": str(o.customer_id), "customer_name": o.customer.full_name if o.customer else "N/A",
@@ -283,21 +261,16 @@ async def admin_list_orders(
             "quantity": i.quantity, "total_price": i.total_price} for i in o.items],
          "created_at": o.created_at.isoformat()} for o in orders],
      "total": total, "page": page, "page_size": page_size,
-     "total_pages": (total + page_size - 1) // page_size}
+     "total_pages": page_count(total, page_size), **keyset.meta()}
 
 
 @router.get("/orders/{order_id}")
-async def admin_get_order(order_id: UUID, current_user: User = Depends(get_current_user),
+async def admin_get_order(order_id: UUID, current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
     result = await db.execute(
         select(Order)
-        .options(
-            joinedload(Order.customer),
-            joinedload(Order.vendor),
-            selectinload(Order.items),
-            selectinload(Order.status_history)
-        )
+        .options(*ADMIN_ORDER_DETAIL)
         .where(Order.id == order_id)
     )
     order = result.scalar_one_or_none()
@@ -328,14 +301,17 @@ async def admin_get_order(order_id: UUID, current_user: User = Depends(get_curre
 
 @router.put("/orders/{order_id}/status")
 async def admin_update_order_status(order_id: UUID, status: OrderStatus, note: Optional[str] = None,
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    # Locked, so the old status counted in the rollups is the current one
+    result = await db.execute(select(Order).where(Order.id == order_id).with_for_update())
     order = result.scalar_one_or_none()
     if not order: raise HTTPException(status_code=404, detail="Order not found")
+    await record_status_change(db, order, order.status, status)
     order.status = status
     db.add(OrderStatusHistory(order_id=order_id, status=status,
         note=note or f"Status updated by admin", changed_by=current_user.id))
+    record_order_event(db, order, status, note)
     await db.flush()
     return {"success": True, "message": f"Order status updated to {status.value}"}
 
@@ -347,43 +323,46 @@ async def admin_update_order_status(order_id: UUID, status: OrderStatus, note: O
 @router.get("/customers")
 async def admin_list_customers(
     search: Optional[str] = None, is_active: Optional[bool] = None,
-    sort_by: str = Query("created_at", pattern="^(created_at|full_name|email)$"),
+    sort_by: str = Query("created_at", pattern="^(created_at|full_name|email|order_count|total_spent)$"),
     sort_order: str = Query("desc", pattern="^(asc|desc)$"),
-    page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None, page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
     query = select(User).where(User.role == UserRole.CUSTOMER)
     if search:
         query = query.where(or_(User.full_name.ilike(f"%{search}%"), User.email.ilike(f"%{search}%")))
     if is_active is not None: query = query.where(User.is_active == is_active)
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-    sort_col = getattr(User, sort_by)
-    query = query.order_by(desc(sort_col) if sort_order == "desc" else asc(sort_col))
-    query = query.offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    users = result.scalars().all()
-    data = []
-    for u in users:
-        oc = (await db.execute(select(func.count(Order.id)).where(Order.customer_id == u.id))).scalar() or 0
-        ts = (await db.execute(select(func.sum(Order.total_amount)).where(
-            Order.customer_id == u.id, Order.status == OrderStatus.DELIVERED))).scalar() or 0
-        data.append({"id": str(u.id), "email": u.email, "full_name": u.full_name, "phone": u.phone,
-            "is_active": u.is_active, "is_verified": u.is_verified, "order_count": oc,
-            "total_spent": float(ts), "created_at": u.created_at.isoformat()})
+    total = await count_total(db, query, include_total)
+    stats = CustomerStats.__table__ if settings.CUSTOMER_STATS_SOURCE == "table" else customer_stats_projection()
+    order_count = func.coalesce(stats.c.order_count, 0)
+    total_spent = func.coalesce(stats.c.total_spent, 0.0)
+    sort_column = {"order_count": order_count, "total_spent": total_spent}.get(sort_by, getattr(User, sort_by, None))
+    keyset = Keyset(sort_column, User.id, descending=sort_order == "desc",
+        cursor=cursor, page=page, page_size=page_size, name=sort_by)
+    query = query.outerjoin(stats, stats.c.user_id == User.id).add_columns(
+        order_count.label("order_count"), total_spent.label("total_spent"))
+    result = await db.execute(keyset.apply(query))
+    rows = keyset.page(result.all(), key=lambda r: (
+        getattr(r, sort_by) if sort_by in ("order_count", "total_spent") else getattr(r.User, sort_by), r.User.id))
+    data = [{"id": str(r.User.id), "email": r.User.email, "full_name": r.User.full_name, "phone": r.User.phone,
+        "is_active": r.User.is_active, "is_verified": r.User.is_verified, "order_count": r.order_count,
+        "total_spent": float(r.total_spent), "created_at": r.User.created_at.isoformat()} for r in rows]
     return {"success": True, "data": data, "total": total, "page": page,
-        "page_size": page_size, "total_pages": (total + page_size - 1) // page_size}
+        "page_size": page_size, "total_pages": page_count(total, page_size),
+        **keyset.meta()}
 
 
 @router.put("/customers/{user_id}/toggle-active")
-async def admin_toggle_customer(user_id: UUID, current_user: User = Depends(get_current_user),
+async def admin_toggle_customer(user_id: UUID, current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
     if not user: raise HTTPException(status_code=404, detail="User not found")
     user.is_active = not user.is_active
+    invalidate_principal(db, user.id)
     await db.flush()
     return {"success": True, "data": {"id": str(user.id), "is_active": user.is_active}}
 
@@ -398,28 +377,23 @@ async def admin_list_products(
     vendor_id: Optional[UUID] = None, search: Optional[str] = None, low_stock: bool = False,
     sort_by: str = Query("created_at", pattern="^(created_at|price|total_sold|stock_quantity|name)$"),
     sort_order: str = Query("desc", pattern="^(asc|desc)$"),
-    page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None, page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
-    query = select(Product).options(
-        joinedload(Product.vendor),
-        joinedload(Product.category),
-        selectinload(Product.images)
-    )
+    query = select(Product).options(*ADMIN_PRODUCT_ROW)
     if status: query = query.where(Product.status == status)
     if category_id: query = query.where(Product.category_id == category_id)
     if vendor_id: query = query.where(Product.vendor_id == vendor_id)
     if search: query = query.where(Product.name.ilike(f"%{search}%"))
     if low_stock: query = query.where(Product.stock_quantity <= Product.low_stock_threshold,
         Product.status == ProductStatus.ACTIVE)
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-    sort_col = getattr(Product, sort_by)
-    query = query.order_by(desc(sort_col) if sort_order == "desc" else asc(sort_col))
-    query = query.offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    products = result.scalars().all()
+    total = await count_total(db, query, include_total)
+    keyset = Keyset(getattr(Product, sort_by), Product.id, descending=sort_order == "desc",
+        cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    products = keyset.page(result.scalars().all())
     return {"success": True, "data": [
         {"id": str(p.id), "name": p.name, "price": p.price, "compare_at_price": p.compare_at_price,
          "stock_quantity": p.stock_quantity, "low_stock_threshold": p.low_stock_threshold,
@@ -429,25 +403,19 @@ async def admin_list_products(
          "image_url": p.images[0].image_url if p.images else None, "is_featured": p.is_featured,
          "created_at": p.created_at.isoformat()} for p in products],
      "total": total, "page": page, "page_size": page_size,
-     "total_pages": (total + page_size - 1) // page_size}
+     "total_pages": page_count(total, page_size), **keyset.meta()}
 
 
 @router.get("/categories")
-async def admin_list_categories(current_user: User = Depends(get_current_user),
+async def admin_list_categories(current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
-    result = await db.execute(
-        select(ProductCategory)
-        .options(selectinload(ProductCategory.children))
-        .where(ProductCategory.parent_id == None)
-        .order_by(ProductCategory.sort_order)
-    )
-    categories = result.scalars().all()
+    tree = await category_tree.get(db)
     def to_dict(c):
         return {"id": str(c.id), "name": c.name, "slug": c.slug, "icon_url": c.icon_url,
             "image_url": c.image_url, "is_active": c.is_active, "sort_order": c.sort_order,
             "children": [to_dict(ch) for ch in c.children]}
-    return {"success": True, "data": [to_dict(c) for c in categories]}
+    return {"success": True, "data": [to_dict(c) for c in tree.roots]}
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -457,18 +425,18 @@ async def admin_list_categories(current_user: User = Depends(get_current_user),
 @router.get("/transactions")
 async def admin_list_transactions(
     payment_method: Optional[str] = None, status: Optional[str] = None,
-    page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None, page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
-    query = select(Payment).options(joinedload(Payment.order))
+    query = select(Payment).options(*ADMIN_PAYMENT_ROW)
     if payment_method: query = query.where(Payment.payment_method == payment_method)
     if status: query = query.where(Payment.status == status)
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-    query = query.order_by(Payment.created_at.desc()).offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    payments = result.scalars().all()
+    total = await count_total(db, query, include_total)
+    keyset = Keyset(Payment.created_at, Payment.id, cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    payments = keyset.page(result.scalars().all())
     return {"success": True, "data": [
         {"id": str(p.id), "order_id": str(p.order_id),
          "order_number": p.order.order_number if p.order else "N/A",
@@ -478,24 +446,24 @@ async def admin_list_transactions(
          "paid_at": p.paid_at.isoformat() if p.paid_at else None,
          "created_at": p.created_at.isoformat()} for p in payments],
      "total": total, "page": page, "page_size": page_size,
-     "total_pages": (total + page_size - 1) // page_size}
+     "total_pages": page_count(total, page_size), **keyset.meta()}
 
 
 @router.get("/payouts")
 async def list_payouts(
     status: Optional[PayoutStatus] = None, vendor_id: Optional[UUID] = None,
-    page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None, page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
-    query = select(VendorPayout).options(joinedload(VendorPayout.vendor))
+    query = select(VendorPayout).options(*ADMIN_PAYOUT_ROW)
     if status: query = query.where(VendorPayout.status == status)
     if vendor_id: query = query.where(VendorPayout.vendor_id == vendor_id)
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-    query = query.order_by(VendorPayout.created_at.desc()).offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    payouts = result.scalars().all()
+    total = await count_total(db, query, include_total)
+    keyset = Keyset(VendorPayout.created_at, VendorPayout.id, cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    payouts = keyset.page(result.scalars().all())
     return {"success": True, "data": [
         {"id": str(p.id), "vendor_id": str(p.vendor_id),
          "vendor_name": p.vendor.store_name if p.vendor else "N/A",
@@ -506,7 +474,7 @@ async def list_payouts(
          "processed_at": p.processed_at.isoformat() if p.processed_at else None,
          "created_at": p.created_at.isoformat()} for p in payouts],
      "total": total, "page": page, "page_size": page_size,
-     "total_pages": (total + page_size - 1) // page_size}
+     "total_pages": page_count(total, page_size), **keyset.meta()}
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -515,18 +483,17 @@ async def list_payouts(
 
 @router.get("/coupons")
 async def list_coupons(
-    is_active: Optional[bool] = None, page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db),
+    is_active: Optional[bool] = None, cursor: Optional[str] = None, page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100), include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
     query = select(Coupon)
     if is_active is not None: query = query.where(Coupon.is_active == is_active)
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-    query = query.order_by(Coupon.created_at.desc()).offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    coupons = result.scalars().all()
+    total = await count_total(db, query, include_total)
+    keyset = Keyset(Coupon.created_at, Coupon.id, cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    coupons = keyset.page(result.scalars().all())
     return {"success": True, "data": [
         {"id": str(c.id), "code": c.code, "description": c.description,
          "discount_type": c.discount_type.value, "discount_value": c.discount_value,
@@ -535,14 +502,14 @@ async def list_coupons(
          "start_date": c.start_date.isoformat(), "end_date": c.end_date.isoformat(),
          "created_at": c.created_at.isoformat()} for c in coupons],
      "total": total, "page": page, "page_size": page_size,
-     "total_pages": (total + page_size - 1) // page_size}
+     "total_pages": page_count(total, page_size), **keyset.meta()}
 
 
 @router.post("/coupons")
 async def create_coupon(code: str, discount_type: str, discount_value: float,
     min_order_amount: float = 0, max_discount_amount: float = None, max_uses: int = 0,
     start_date: datetime = None, end_date: datetime = None,
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
     existing = await db.execute(select(Coupon).where(Coupon.code == code.upper()))
     if existing.scalar_one_or_none():
@@ -558,7 +525,7 @@ async def create_coupon(code: str, discount_type: str, discount_value: float,
 
 
 @router.put("/coupons/{coupon_id}/toggle")
-async def toggle_coupon(coupon_id: UUID, current_user: User = Depends(get_current_user),
+async def toggle_coupon(coupon_id: UUID, current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
     result = await db.execute(select(Coupon).where(Coupon.id == coupon_id))
@@ -570,7 +537,7 @@ async def toggle_coupon(coupon_id: UUID, current_user: User = Depends(get_curren
 
 
 @router.delete("/coupons/{coupon_id}")
-async def delete_coupon(coupon_id: UUID, current_user: User = Depends(get_current_user),
+async def delete_coupon(coupon_id: UUID, current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
     result = await db.execute(select(Coupon).where(Coupon.id == coupon_id))
@@ -587,18 +554,17 @@ async def delete_coupon(coupon_id: UUID, current_user: User = Depends(get_curren
 
 @router.get("/reviews")
 async def admin_list_reviews(
-    is_approved: Optional[bool] = None, page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db),
+    is_approved: Optional[bool] = None, cursor: Optional[str] = None, page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100), include_total: bool = True,
+    current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db),
 ):
     _require_admin(current_user)
-    query = select(Review).options(joinedload(Review.user), joinedload(Review.product))
+    query = select(Review).options(*ADMIN_REVIEW_ROW)
     if is_approved is not None: query = query.where(Review.is_approved == is_approved)
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-    query = query.order_by(Review.created_at.desc()).offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    reviews = result.scalars().all()
+    total = await count_total(db, query, include_total)
+    keyset = Keyset(Review.created_at, Review.id, cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    reviews = keyset.page(result.scalars().all())
     return {"success": True, "data": [
         {"id": str(r.id), "user_name": r.user.full_name if r.user else "N/A",
          "product_name": r.product.name if r.product else "N/A", "rating": r.rating,
@@ -606,11 +572,11 @@ async def admin_list_reviews(
          "is_approved": r.is_approved, "helpful_count": r.helpful_count,
          "created_at": r.created_at.isoformat()} for r in reviews],
      "total": total, "page": page, "page_size": page_size,
-     "total_pages": (total + page_size - 1) // page_size}
+     "total_pages": page_count(total, page_size), **keyset.meta()}
 
 
 @router.put("/reviews/{review_id}/toggle-approve")
-async def toggle_review_approval(review_id: UUID, current_user: User = Depends(get_current_user),
+async def toggle_review_approval(review_id: UUID, current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)):
     _require_admin(current_user)
     result = await db.execute(select(Review).where(Review.id == review_id))
@@ -630,7 +596,7 @@ async def toggle_review_approval(review_id: UUID, current_user: User = Depends(g
 @router.post("/vendors")
 async def create_vendor(
     vendor_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a new vendor with user account."""
@@ -678,6 +644,7 @@ async def create_vendor(
     )
     db.add(vendor)
     await db.flush()
+    invalidate_on_commit(db, "vendors")
     
     return {"success": True, "data": {"id": str(vendor.id), "user_id": str(user.id), 
             "store_name": vendor.store_name, "status": vendor.status.value}}
@@ -687,7 +654,7 @@ async def create_vendor(
 async def delete_vendor(
     vendor_id: UUID,
     hard_delete: bool = Query(False),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Delete or soft-delete a vendor."""
@@ -698,11 +665,13 @@ async def delete_vendor(
     
     if hard_delete:
         await db.delete(vendor)
+        invalidate_principal(db, vendor.user_id)
     else:
         vendor.is_active = False
         vendor.status = VendorStatus.REJECTED
     
     await db.flush()
+    invalidate_on_commit(db, "vendors")
     return {"success": True, "message": "Vendor deleted" if hard_delete else "Vendor deactivated"}
 
 
@@ -711,7 +680,7 @@ async def delete_vendor(
 @router.post("/categories")
 async def create_category(
     category_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a new product category."""
@@ -736,6 +705,7 @@ async def create_category(
     )
     db.add(category)
     await db.flush()
+    invalidate_on_commit(db, "catalog", "categories")
     
     return {"success": True, "data": {
         "id": str(category.id), "name": category.name, "slug": category.slug,
@@ -747,8 +717,8 @@ async def create_category(
 @router.put("/categories/{category_id}")
 async def update_category(
     category_id: UUID,
-    category_data: dict,
-    current_user: User = Depends(get_current_user),
+    category_data: CategoryUpdate,
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Update a product category."""
@@ -756,12 +726,19 @@ async def update_category(
     result = await db.execute(select(ProductCategory).where(ProductCategory.id == category_id))
     category = result.scalar_one_or_none()
     if not category: raise HTTPException(status_code=404, detail="Category not found")
+    if category_data.parent_id:
+        tree = await category_tree.get(db)
+        if tree.get(category_data.parent_id) is None:
+            raise HTTPException(status_code=400, detail="Parent category not found")
+        if category_data.parent_id in tree.subtree_ids(category_id):
+            raise HTTPException(status_code=400, detail="Category cannot be moved under its own subtree")
     
-    for key, value in category_data.items():
-        if value is not None and hasattr(category, key):
+    for key, value in category_data.model_dump(exclude_unset=True).items():
+        if value is not None:
             setattr(category, key, value)
     
     await db.flush()
+    invalidate_on_commit(db, "catalog", "categories")
     return {"success": True, "data": {
         "id": str(category.id), "name": category.name, "slug": category.slug,
         "is_active": category.is_active,
@@ -772,7 +749,7 @@ async def update_category(
 async def delete_category(
     category_id: UUID,
     move_products_to: Optional[UUID] = Query(None),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Delete a category, optionally moving products to another category."""
@@ -802,6 +779,7 @@ async def delete_category(
     
     await db.delete(category)
     await db.flush()
+    invalidate_on_commit(db, "catalog", "categories")
     return {"success": True, "message": "Category deleted"}
 
 
@@ -810,7 +788,7 @@ async def delete_category(
 @router.post("/products")
 async def create_product(
     product_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a new product."""
@@ -839,6 +817,8 @@ async def create_product(
     )
     db.add(product)
     await db.flush()
+    index_product_on_commit(db, product)
+    invalidate_on_commit(db, "catalog")
     
     return {"success": True, "data": {
         "id": str(product.id), "name": product.name, "sku": product.sku,
@@ -850,7 +830,7 @@ async def create_product(
 async def update_product(
     product_id: UUID,
     product_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Update a product."""
@@ -867,6 +847,8 @@ async def update_product(
                 setattr(product, key, value)
     
     await db.flush()
+    index_product_on_commit(db, product)
+    invalidate_on_commit(db, "catalog")
     return {"success": True, "data": {
         "id": str(product.id), "name": product.name, "price": float(product.price),
         "status": product.status.value,
@@ -876,7 +858,7 @@ async def update_product(
 @router.delete("/products/{product_id}")
 async def delete_product(
     product_id: UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Delete a product."""
@@ -887,6 +869,8 @@ async def delete_product(
     
     await db.delete(product)
     await db.flush()
+    unindex_product_on_commit(db, product_id)
+    invalidate_on_commit(db, "catalog")
     return {"success": True, "message": "Product deleted"}
 
 
@@ -895,7 +879,7 @@ async def delete_product(
 @router.post("/customers")
 async def create_customer(
     customer_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a new customer account."""
@@ -929,7 +913,7 @@ async def create_customer(
 async def update_customer(
     user_id: UUID,
     customer_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Update a customer account."""
@@ -946,6 +930,7 @@ async def update_customer(
         from app.core.security import get_password_hash
         user.password_hash = get_password_hash(customer_data["password"])
     
+    invalidate_principal(db, user.id)
     await db.flush()
     return {"success": True, "data": {
         "id": str(user.id), "email": user.email, "full_name": user.full_name,
@@ -957,7 +942,7 @@ async def update_customer(
 async def delete_customer(
     user_id: UUID,
     anonymize: bool = Query(False),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Delete or anonymize a customer account."""
@@ -965,6 +950,7 @@ async def delete_customer(
     result = await db.execute(select(User).where(User.id == user_id, User.role == UserRole.CUSTOMER))
     user = result.scalar_one_or_none()
     if not user: raise HTTPException(status_code=404, detail="Customer not found")
+    invalidate_principal(db, user.id)
     
     if anonymize:
         # GDPR-compliant anonymization
@@ -988,7 +974,7 @@ async def delete_customer(
 async def upload_file(
     file: UploadFile = File(...),
     folder: str = Query("general", description="Subfolder: categories, products, vendors, etc."),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Upload image file and return URL."""
     _require_admin(current_user)
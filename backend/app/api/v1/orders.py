@@ -3,27 +3,85 @@ import uuid as uuid_mod
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, insert, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from sqlalchemy.orm import selectinload
 from uuid import UUID
 from typing import Optional
 
 from app.database import get_db
-from app.api.deps import get_current_user
-from app.models.user import User, UserRole, Address
+from app.api.deps import get_current_principal
+from app.core.principal import Principal
+from app.core.load_plans import ORDER_DETAIL, ORDER_ITEMS
+from app.core.fieldsets import Fieldset
+from app.core.exceptions import InsufficientStockException
+from app.core.counting import count_total
+from app.core.query_stats import query_budget
+from app.core.responses import render
+from app.models.user import UserRole, Address
 from app.models.vendor import Vendor
-from app.models.product import Product, ProductVariant
+from app.models.product import Product, ProductVariant, ProductImage
 from app.models.order import Order, OrderItem, OrderStatusHistory, OrderStatus, PaymentStatus
 from app.models.promotion import Coupon
 from app.schemas.order import (
-    CreateOrderRequest, OrderResponse, UpdateOrderStatusRequest,
+    CartItem, CreateOrderRequest, OrderResponse, UpdateOrderStatusRequest,
     OrderFilter, OrderItemResponse,
 )
-from app.schemas.base import ResponseBase, PaginatedResponse
+from app.schemas.base import ResponseBase, PaginatedResponse, Keyset, page_count
+from app.services.inventory import (
+    StockLine, reserve_stock, release_stock, place_holds, drop_holds,
+)
+from app.services.rollups import record_status_change
+from app.services.outbox import record_order_event, ORDER_PLACED
 from app.config import get_settings
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 settings = get_settings()
 
+_UUID_ARRAY = ARRAY(PG_UUID(as_uuid=True))
+
+# ``fields=`` for order lists
+_ORDER_FIELDS = Fieldset(Order, OrderResponse, {
+    "items": (selectinload(Order.items),),
+    "status_history": (selectinload(Order.status_history),),
+}, default=ORDER_DETAIL)
+
+
+async def _load_cart_products(
+    db: AsyncSession, vendor_id: UUID, items: list[CartItem]
+) -> dict[UUID, tuple[Product, str | None]]:
+    """Fetch every product in the cart, with its primary image URL, in one query."""
+    primary_image = (
+        select(ProductImage.image_url)
+        .where(ProductImage.product_id == Product.id)
+        .order_by(ProductImage.is_primary.desc(), ProductImage.sort_order)
+        .limit(1)
+        .scalar_subquery()
+    )
+    ids = list({item.product_id for item in items})
+    result = await db.execute(
+        select(Product, primary_image).where(
+            Product.id == any_(bindparam("product_ids", ids, type_=_UUID_ARRAY)),
+            Product.vendor_id == vendor_id,
+        )
+    )
+    return {product.id: (product, image) for product, image in result.all()}
+
+
+async def _load_cart_variants(
+    db: AsyncSession, items: list[CartItem]
+) -> dict[UUID, ProductVariant]:
+    """Fetch every variant referenced by the cart in one query."""
+    ids = list({item.variant_id for item in items if item.variant_id})
+    if not ids:
+        return {}
+    result = await db.execute(
+        select(ProductVariant).where(
+            ProductVariant.id == any_(bindparam("variant_ids", ids, type_=_UUID_ARRAY))
+        )
+    )
+    return {variant.id: variant for variant in result.scalars().all()}
+
 
 def _generate_order_number() -> str:
     """Generate a unique order number."""
@@ -34,9 +92,10 @@ def _generate_order_number() -> str:
 
 
 @router.post("/", response_model=ResponseBase[OrderResponse], status_code=201)
+@query_budget(17)  # outbox event; online payments also write an inventory hold
 async def create_order(
     data: CreateOrderRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a new order (multi-vendor splitting handled by client sending per-vendor orders)."""
@@ -71,47 +130,30 @@ async def create_order(
     subtotal = 0.0
     order_items = []
 
+    products = await _load_cart_products(db, data.vendor_id, data.items)
+    variants = await _load_cart_variants(db, data.items)
+
     for cart_item in data.items:
-        product_result = await db.execute(
-            select(Product).where(
-                Product.id == cart_item.product_id,
-                Product.vendor_id == data.vendor_id,
-            )
-        )
-        product = product_result.scalar_one_or_none()
-        if not product:
+        row = products.get(cart_item.product_id)
+        if not row:
             raise HTTPException(
                 status_code=400, detail=f"Product {cart_item.product_id} not found"
             )
-
-        if product.track_inventory and product.stock_quantity < cart_item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock for {product.name}",
-            )
+        product, primary_image = row
 
         unit_price = product.price
-        variant = None
         if cart_item.variant_id:
-            variant_result = await db.execute(
-                select(ProductVariant).where(ProductVariant.id == cart_item.variant_id)
-            )
-            variant = variant_result.scalar_one_or_none()
-            if variant:
-                unit_price = variant.price
+            variant = variants.get(cart_item.variant_id)
+            if not variant or variant.product_id != product.id:
+                raise HTTPException(
+                    status_code=400, detail=f"Variant {cart_item.variant_id} not found"
+                )
+            unit_price = variant.price
 
         item_total = unit_price * cart_item.quantity
         subtotal += item_total
 
-        # Get primary image
-        primary_image = None
-        if product.images:
-            primary_image = next(
-                (img.image_url for img in product.images if img.is_primary),
-                product.images[0].image_url if product.images else None,
-            )
-
-        order_items.append(OrderItem(
+        order_items.append(dict(
             product_id=product.id,
             variant_id=cart_item.variant_id,
             product_name=product.name,
@@ -123,11 +165,25 @@ async def create_order(
             unit_value=product.unit_value,
         ))
 
-        # Reduce stock
-        if product.track_inventory:
-            product.stock_quantity -= cart_item.quantity
-            if variant:
-                variant.stock_quantity -= cart_item.quantity
+    # Reserve stock for the whole cart atomically (all lines or none)
+    stock_lines = [
+        StockLine(item.product_id, item.quantity, item.variant_id) for item in data.items
+    ]
+    shortages = await reserve_stock(db, stock_lines)
+    if shortages:
+        raise InsufficientStockException(
+            ", ".join(s.name for s in shortages),
+            details=[
+                {
+                    "product_id": str(s.product_id),
+                    "variant_id": str(s.variant_id) if s.variant_id else None,
+                    "name": s.name,
+                    "requested": s.requested,
+                    "available": s.available,
+                }
+                for s in shortages
+            ],
+        )
 
     # Calculate delivery fee
     delivery_fee = 0.0
@@ -188,10 +244,14 @@ async def create_order(
     db.add(order)
     await db.flush()
 
-    # Add items
-    for item in order_items:
-        item.order_id = order.id
-        db.add(item)
+    # Add items (single multi-row INSERT)
+    await db.execute(
+        insert(OrderItem).values([{**item, "order_id": order.id} for item in order_items])
+    )
+
+    # Online payments: stock is only held until the payment is confirmed
+    if payment_status == PaymentStatus.PENDING:
+        await place_holds(db, order.id, stock_lines)
 
     # Status history
     history = OrderStatusHistory(
@@ -205,9 +265,13 @@ async def create_order(
     # Update vendor total orders
     vendor.total_orders += 1
     await db.flush()
+    await record_status_change(db, order, None, OrderStatus.PENDING)
+    record_order_event(db, order, OrderStatus.PENDING, "Order placed", event_type=ORDER_PLACED)
 
     # Re-query to load relationships
-    result = await db.execute(select(Order).where(Order.id == order.id))
+    result = await db.execute(
+        select(Order).options(*ORDER_DETAIL).where(Order.id == order.id)
+    )
     order = result.scalar_one()
 
     return ResponseBase(
@@ -219,21 +283,21 @@ async def create_order(
 @router.get("/", response_model=PaginatedResponse[OrderResponse])
 async def list_orders(
     status: Optional[OrderStatus] = None,
+    cursor: Optional[str] = None,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
+    include_total: bool = True,
+    fields: Optional[str] = Query(None, description="Comma-separated response fields to return (default: all)"),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """List orders for current user (customer or vendor)."""
-    query = select(Order)
+    selection = _ORDER_FIELDS.select(fields, Order.created_at)
+    query = select(Order).options(*selection.options)
 
     if current_user.role == UserRole.VENDOR:
-        vendor_result = await db.execute(
-            select(Vendor).where(Vendor.user_id == current_user.id)
-        )
-        vendor = vendor_result.scalar_one_or_none()
-        if vendor:
-            query = query.where(Order.vendor_id == vendor.id)
+        if current_user.vendor_id:
+            query = query.where(Order.vendor_id == current_user.vendor_id)
     elif current_user.role == UserRole.CUSTOMER:
         query = query.where(Order.customer_id == current_user.id)
     elif current_user.role != UserRole.ADMIN:
@@ -242,33 +306,32 @@ async def list_orders(
     if status:
         query = query.where(Order.status == status)
 
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
+    total = await count_total(db, query, include_total)
 
-    query = query.order_by(Order.created_at.desc()).offset(
-        (page - 1) * page_size
-    ).limit(page_size)
+    keyset = Keyset(Order.created_at, Order.id, cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    orders = keyset.page(result.scalars().all())
 
-    result = await db.execute(query)
-    orders = result.scalars().all()
-
-    return PaginatedResponse(
-        data=[OrderResponse.model_validate(o) for o in orders],
+    return render(PaginatedResponse[selection.schema], dict(
+        data=orders,
         total=total,
         page=page,
         page_size=page_size,
-        total_pages=(total + page_size - 1) // page_size,
-    )
+        total_pages=page_count(total, page_size),
+        **keyset.meta(),
+    ))
 
 
 @router.get("/{order_id}", response_model=ResponseBase[OrderResponse])
 async def get_order(
     order_id: UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Get order details."""
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    result = await db.execute(
+        select(Order).options(*ORDER_DETAIL).where(Order.id == order_id)
+    )
     order = result.scalar_one_or_none()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -284,24 +347,25 @@ async def get_order(
 async def update_order_status(
     order_id: UUID,
     data: UpdateOrderStatusRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Update order status (vendor/admin/delivery partner)."""
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    # Row lock: concurrent changes must each see the status the other left,
+    # or both count a move out of the same old status in the rollups
+    result = await db.execute(
+        select(Order).options(*ORDER_DETAIL).where(Order.id == order_id).with_for_update()
+    )
     order = result.scalar_one_or_none()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
     # Permission: vendor can update their own orders, admin can update any
     if current_user.role == UserRole.VENDOR:
-        vendor_result = await db.execute(
-            select(Vendor).where(Vendor.user_id == current_user.id)
-        )
-        vendor = vendor_result.scalar_one_or_none()
-        if not vendor or order.vendor_id != vendor.id:
+        if order.vendor_id != current_user.vendor_id:
             raise HTTPException(status_code=403, detail="Access denied")
 
+    await record_status_change(db, order, order.status, data.status)
     order.status = data.status
     if data.status == OrderStatus.DELIVERED:
         order.actual_delivery_time = datetime.utcnow()
@@ -315,6 +379,7 @@ async def update_order_status(
         changed_by=current_user.id,
     )
     db.add(history)
+    record_order_event(db, order, data.status, data.note)
     await db.flush()
 
     return ResponseBase(data=OrderResponse.model_validate(order))
@@ -324,11 +389,15 @@ async def update_order_status(
 async def cancel_order(
     order_id: UUID,
     reason: str = "",
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Cancel an order (customer can cancel before shipped)."""
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    # Row lock: a concurrent cancel waits and then sees CANCELLED, so stock
+    # is returned once
+    result = await db.execute(
+        select(Order).options(*ORDER_DETAIL).where(Order.id == order_id).with_for_update()
+    )
     order = result.scalar_one_or_none()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -342,17 +411,16 @@ async def cancel_order(
             status_code=400, detail="Order cannot be cancelled at this stage"
         )
 
+    await record_status_change(db, order, order.status, OrderStatus.CANCELLED)
     order.status = OrderStatus.CANCELLED
     order.cancellation_reason = reason
 
-    # Restore stock
-    for item in order.items:
-        product_result = await db.execute(
-            select(Product).where(Product.id == item.product_id)
-        )
-        product = product_result.scalar_one_or_none()
-        if product and product.track_inventory:
-            product.stock_quantity += item.quantity
+    # Restore stock (products and variants); close any unpaid hold so the
+    # sweeper does not restore it again
+    await drop_holds(db, order.id)
+    await release_stock(db, [
+        StockLine(item.product_id, item.quantity, item.variant_id) for item in order.items
+    ])
 
     history = OrderStatusHistory(
         order_id=order.id,
@@ -361,6 +429,7 @@ async def cancel_order(
         changed_by=current_user.id,
     )
     db.add(history)
+    record_order_event(db, order, OrderStatus.CANCELLED, history.note)
     await db.flush()
 
     return ResponseBase(data=OrderResponse.model_validate(order))
@@ -369,12 +438,12 @@ async def cancel_order(
 @router.post("/{order_id}/reorder", response_model=ResponseBase)
 async def reorder(
     order_id: UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Get cart items to reorder from a previous order."""
     result = await db.execute(
-        select(Order).where(
+        select(Order).options(*ORDER_ITEMS).where(
             Order.id == order_id, Order.customer_id == current_user.id
         )
     )
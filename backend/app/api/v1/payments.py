@@ -1,13 +1,20 @@
 """Payment endpoints: create payment, wallet, payouts."""
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+import hmac
+import json
+import logging
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from uuid import UUID
+import stripe
 
 from app.database import get_db
-from app.api.deps import get_current_user
-from app.models.user import User, UserRole
-from app.models.order import Order, PaymentStatus
+from app.api.deps import get_current_principal
+from app.core.principal import Principal
+from app.models.user import UserRole
+from app.models.order import Order, OrderStatus, PaymentStatus
 from app.models.payment import (
     Payment, Wallet, WalletTransaction, VendorPayout,
     PaymentMethod, TransactionType,
@@ -19,21 +26,77 @@ from app.schemas.payment import (
     VendorPayoutResponse,
 )
 from app.schemas.base import ResponseBase
+from app.services.inventory import commit_holds
+from app.config import get_settings
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def _mark_order_paid(db: AsyncSession, order: Order) -> None:
+    """Mark an order paid and make its inventory holds permanent."""
+    order.payment_status = PaymentStatus.PAID
+    if not await commit_holds(db, order.id):
+        logger.warning(
+            "Order %s was paid after its inventory hold expired; stock is no longer reserved",
+            order.order_number,
+        )
+
+
+async def _confirm_gateway_payment(
+    db: AsyncSession, order_id: str | None, method: PaymentMethod,
+    transaction_id: str | None, amount: float, event: dict,
+) -> None:
+    """Apply a verified gateway success event to its order."""
+    try:
+        order_uuid = UUID(order_id)
+    except (TypeError, ValueError):
+        logger.warning("%s webhook without a valid order_id", method.value)
+        return
+
+    # Row lock: the hold sweeper cannot cancel the order between the
+    # CANCELLED check and committing its holds
+    result = await db.execute(select(Order).where(Order.id == order_uuid).with_for_update())
+    order = result.scalar_one_or_none()
+    if not order or order.payment_status == PaymentStatus.PAID:
+        return
+    if order.status == OrderStatus.CANCELLED:
+        logger.warning(
+            "Payment %s received for cancelled order %s; refund required",
+            transaction_id, order.order_number,
+        )
+        return
+
+    payment_result = await db.execute(
+        select(Payment)
+        .where(Payment.order_id == order.id, Payment.status == "initiated")
+        .order_by(Payment.created_at.desc())
+        .limit(1)
+    )
+    payment = payment_result.scalar_one_or_none()
+    if not payment:
+        payment = Payment(order_id=order.id, amount=amount, payment_method=method)
+        db.add(payment)
+    payment.status = "completed"
+    payment.transaction_id = transaction_id
+    payment.gateway_response = event
+    payment.paid_at = datetime.utcnow()
+
+    await _mark_order_paid(db, order)
 
 
 @router.post("/initiate", response_model=ResponseBase[PaymentResponse])
 async def initiate_payment(
     data: CreatePaymentRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Initiate a payment for an order."""
     result = await db.execute(
         select(Order).where(
             Order.id == data.order_id, Order.customer_id == current_user.id
-        )
+        ).with_for_update()  # as in _confirm_gateway_payment
     )
     order = result.scalar_one_or_none()
     if not order:
@@ -41,6 +104,8 @@ async def initiate_payment(
 
     if order.payment_status == PaymentStatus.PAID:
         raise HTTPException(status_code=400, detail="Order already paid")
+    if order.status == OrderStatus.CANCELLED:
+        raise HTTPException(status_code=400, detail="Order has been cancelled")
 
     payment = Payment(
         order_id=order.id,
@@ -61,7 +126,8 @@ async def initiate_payment(
 
         wallet.balance -= data.amount
         payment.status = "completed"
-        order.payment_status = PaymentStatus.PAID
+        payment.paid_at = datetime.utcnow()
+        await _mark_order_paid(db, order)
 
         txn = WalletTransaction(
             wallet_id=wallet.id,
@@ -77,22 +143,65 @@ async def initiate_payment(
 
 
 @router.post("/webhook/stripe")
-async def stripe_webhook(db: AsyncSession = Depends(get_db)):
-    """Handle Stripe payment webhooks (placeholder)."""
-    # In production, verify stripe signature and process event
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
+    """Handle Stripe payment webhooks.
+
+    ``payment_intent.succeeded`` confirms the order named in the intent's
+    ``metadata.order_id``.
+    """
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Stripe webhooks not configured")
+
+    payload = await request.body()
+    try:
+        event = stripe.Webhook.construct_event(
+            payload, request.headers.get("stripe-signature", ""),
+            settings.STRIPE_WEBHOOK_SECRET,
+        )
+    except (ValueError, stripe.error.SignatureVerificationError):
+        raise HTTPException(status_code=400, detail="Invalid signature")
+
+    if event["type"] == "payment_intent.succeeded":
+        intent = event["data"]["object"]
+        await _confirm_gateway_payment(
+            db, intent.get("metadata", {}).get("order_id"), PaymentMethod.STRIPE,
+            intent.get("id"), intent.get("amount_received", 0) / 100,
+            json.loads(payload),
+        )
     return {"status": "received"}
 
 
 @router.post("/webhook/razorpay")
-async def razorpay_webhook(db: AsyncSession = Depends(get_db)):
-    """Handle Razorpay payment webhooks (placeholder)."""
+async def razorpay_webhook(request: Request, db: AsyncSession = Depends(get_db)):
+    """Handle Razorpay payment webhooks.
+
+    ``payment.captured`` confirms the order named in the payment's
+    ``notes.order_id``.
+    """
+    if not settings.RAZORPAY_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Razorpay webhooks not configured")
+
+    payload = await request.body()
+    expected = hmac.new(
+        settings.RAZORPAY_WEBHOOK_SECRET.encode(), payload, hashlib.sha256
+    ).hexdigest()
+    if not hmac.compare_digest(expected, request.headers.get("x-razorpay-signature", "")):
+        raise HTTPException(status_code=400, detail="Invalid signature")
+
+    event = json.loads(payload)
+    if event.get("event") == "payment.captured":
+        entity = event.get("payload", {}).get("payment", {}).get("entity", {})
+        await _confirm_gateway_payment(
+            db, (entity.get("notes") or {}).get("order_id"), PaymentMethod.RAZORPAY,
+            entity.get("id"), entity.get("amount", 0) / 100, event,
+        )
     return {"status": "received"}
 
 
 # --- Wallet ---
 @router.get("/wallet", response_model=ResponseBase[WalletResponse])
 async def get_wallet(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Get wallet balance."""
@@ -110,7 +219,7 @@ async def get_wallet(
 
 @router.get("/wallet/transactions", response_model=ResponseBase[list[WalletTransactionResponse]])
 async def get_wallet_transactions(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Get wallet transaction history."""
@@ -136,7 +245,7 @@ async def get_wallet_transactions(
 @router.post("/wallet/add-money", response_model=ResponseBase[WalletResponse])
 async def add_money_to_wallet(
     data: AddMoneyRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Add money to wallet (mock - in production would integrate with payment gateway)."""
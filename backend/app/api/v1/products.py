@@ -1,14 +1,20 @@
 """Product endpoints: CRUD, search, filter, image upload."""
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_, text
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 from uuid import UUID
 from typing import Optional
 
+from app.config import get_settings
 from app.database import get_db
-from app.api.deps import get_current_user, get_optional_user
-from app.models.user import User
-from app.models.vendor import Vendor
+from app.api.deps import get_current_principal, get_optional_user
+from app.core.principal import Principal
+from app.core.load_plans import PRODUCT_CARD
+from app.core.fieldsets import Fieldset
+from app.core.counting import count_total
+from app.core.cache import cached, invalidate_on_commit
+from app.core.responses import render
 from app.models.product import Product, ProductCategory, ProductVariant, ProductImage, ProductStatus
 from app.schemas.product import (
     ProductCreate, ProductUpdate, ProductResponse,
@@ -16,36 +22,51 @@ from app.schemas.product import (
     ProductVariantCreate, ProductVariantResponse,
     ProductImageResponse, ProductFilter,
 )
-from app.schemas.base import ResponseBase, PaginatedResponse
+from app.schemas.base import ResponseBase, PaginatedResponse, Keyset, page_count
+from app.services.search import search_filter, search_rank
+from app.services.autocomplete import suggest
+from app.services.prefix_index import index_product_on_commit, unindex_product_on_commit
+from app.services.categories import category_tree, subtree_filter
 
 router = APIRouter(prefix="/products", tags=["Products"])
+settings = get_settings()
+
+# Columns list_products can sort by; anything else falls back to created_at
+_SORT_COLUMNS = {
+    "created_at": Product.created_at,
+    "price": Product.price,
+    "name": Product.name,
+    "total_sold": Product.total_sold,
+    "avg_rating": Product.avg_rating,
+    "stock_quantity": Product.stock_quantity,
+}
+
+# ``fields=`` for product lists
+_PRODUCT_FIELDS = Fieldset(Product, ProductResponse, {
+    "images": (selectinload(Product.images),),
+    "variants": (selectinload(Product.variants),),
+}, default=PRODUCT_CARD)
+_FIELDS_DOC = "Comma-separated response fields to return (default: all)"
 
 
 # --- Categories ---
 @router.get("/categories", response_model=ResponseBase[list[CategoryResponse]])
+@cached("catalog", ttl=settings.CACHE_CATALOG_TTL_SECONDS, cache_control="public, max-age=60")
 async def list_categories(
     parent_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db),
 ):
     """List product categories."""
-    query = select(ProductCategory).where(ProductCategory.is_active == True)
-    if parent_id:
-        query = query.where(ProductCategory.parent_id == parent_id)
-    else:
-        query = query.where(ProductCategory.parent_id.is_(None))
-    query = query.order_by(ProductCategory.sort_order)
-
-    result = await db.execute(query)
-    categories = result.scalars().all()
-    return ResponseBase(
-        data=[CategoryResponse.model_validate(c) for c in categories]
-    )
+    tree = await category_tree.get(db)
+    return render(ResponseBase[list[CategoryResponse]], dict(
+        data=[c for c in tree.children(parent_id) if c.is_active]
+    ))
 
 
 @router.post("/categories", response_model=ResponseBase[CategoryResponse], status_code=201)
 async def create_category(
     data: CategoryCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a product category (admin only)."""
@@ -56,13 +77,16 @@ async def create_category(
     category = ProductCategory(**data.model_dump())
     db.add(category)
     await db.flush()
+    invalidate_on_commit(db, "catalog", "categories")
     return ResponseBase(data=CategoryResponse.model_validate(category))
 
 
 # --- Products ---
 @router.get("/", response_model=PaginatedResponse[ProductResponse])
+@cached("catalog", ttl=settings.CACHE_CATALOG_TTL_SECONDS)
 async def list_products(
     category_id: Optional[UUID] = None,
+    include_descendants: bool = False,
     vendor_id: Optional[UUID] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
@@ -71,14 +95,31 @@ async def list_products(
     search: Optional[str] = None,
     sort_by: str = "created_at",
     sort_order: str = "desc",
+    cursor: Optional[str] = None,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
+    fields: Optional[str] = Query(None, description=_FIELDS_DOC),
     db: AsyncSession = Depends(get_db),
 ):
-    """List products with filtering, sorting, and pagination."""
-    query = select(Product).where(Product.status == ProductStatus.ACTIVE)
+    """List products with filtering, sorting, and pagination.
+
+    With ``include_descendants``, ``category_id`` matches its whole subtree.
+    """
+    sort_column = _SORT_COLUMNS.get(sort_by, Product.created_at)
+    selection = _PRODUCT_FIELDS.select(fields, sort_column)
+    query = select(Product).options(*selection.options).where(
+        Product.status == ProductStatus.ACTIVE
+    )
 
-    if category_id:
+    if category_id and include_descendants:
+        node = (await category_tree.get(db)).get(category_id)
+        if node is None or node.path is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        query = query.where(Product.category_id.in_(
+            select(ProductCategory.id).where(subtree_filter(node.path))
+        ))
+    elif category_id:
         query = query.where(Product.category_id == category_id)
     if vendor_id:
         query = query.where(Product.vendor_id == vendor_id)
@@ -91,123 +132,117 @@ async def list_products(
     if is_organic is not None:
         query = query.where(Product.is_organic == is_organic)
     if search:
-        search_filter = or_(
-            Product.name.ilike(f"%{search}%"),
-            Product.description.ilike(f"%{search}%"),
-        )
-        query = query.where(search_filter)
-
-    # Count
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
+        query = query.where(search_filter(search))
 
-    # Sort
-    sort_column = getattr(Product, sort_by, Product.created_at)
-    if sort_order == "asc":
-        query = query.order_by(sort_column.asc())
-    else:
-        query = query.order_by(sort_column.desc())
+    # Count (catalog totals may trail writes by the count cache TTL)
+    total = await count_total(db, query, include_total, mode="cached")
 
-    # Paginate
-    query = query.offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    products = result.scalars().all()
+    # Sort + paginate
+    keyset = Keyset(
+        sort_column, Product.id,
+        descending=sort_order != "asc", cursor=cursor, page=page, page_size=page_size,
+    )
+    result = await db.execute(keyset.apply(query))
+    products = keyset.page(result.scalars().all())
 
-    return PaginatedResponse(
-        data=[ProductResponse.model_validate(p) for p in products],
+    return render(PaginatedResponse[selection.schema], dict(
+        data=products,
         total=total,
         page=page,
         page_size=page_size,
-        total_pages=(total + page_size - 1) // page_size,
-    )
+        total_pages=page_count(total, page_size),
+        **keyset.meta(),
+    ))
 
 
 @router.get("/search", response_model=PaginatedResponse[ProductResponse])
+@cached("catalog", ttl=settings.CACHE_CATALOG_TTL_SECONDS)
 async def search_products(
     q: str = Query(..., min_length=1),
+    cursor: Optional[str] = None,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
+    fields: Optional[str] = Query(None, description=_FIELDS_DOC),
     db: AsyncSession = Depends(get_db),
 ):
-    """Full-text search products with autocomplete."""
-    query = select(Product).where(
+    """Full-text search products, best matches (weighted by sales) first."""
+    selection = _PRODUCT_FIELDS.select(fields)
+    query = select(Product).options(*selection.options).where(
         Product.status == ProductStatus.ACTIVE,
-        or_(
-            Product.name.ilike(f"%{q}%"),
-            Product.description.ilike(f"%{q}%"),
-            Product.short_description.ilike(f"%{q}%"),
-        ),
+        search_filter(q),
     )
 
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
-
-    query = query.order_by(Product.total_sold.desc()).offset(
-        (page - 1) * page_size
-    ).limit(page_size)
+    total = await count_total(db, query, include_total, mode="cached")
 
+    rank = search_rank(q)
+    keyset = Keyset(
+        rank, Product.id, cursor=cursor, page=page, page_size=page_size, name="rank"
+    )
+    query = keyset.apply(query.add_columns(rank.label("rank")))
     result = await db.execute(query)
-    products = result.scalars().all()
+    rows = keyset.page(result.all(), key=lambda row: (row.rank, row.Product.id))
 
-    return PaginatedResponse(
-        data=[ProductResponse.model_validate(p) for p in products],
+    return render(PaginatedResponse[selection.schema], dict(
+        data=[row.Product for row in rows],
         total=total,
         page=page,
         page_size=page_size,
-        total_pages=(total + page_size - 1) // page_size,
-    )
+        total_pages=page_count(total, page_size),
+        **keyset.meta(),
+    ))
 
 
 @router.get("/autocomplete")
+@cached("catalog", ttl=settings.CACHE_CATALOG_TTL_SECONDS, cache_control="public, max-age=30")
 async def autocomplete_products(
     q: str = Query(..., min_length=1),
     limit: int = Query(10, ge=1, le=20),
     db: AsyncSession = Depends(get_db),
 ):
     """Return product name suggestions for autocomplete."""
-    result = await db.execute(
-        select(Product.id, Product.name, Product.price, Product.unit_type)
-        .where(
-            Product.status == ProductStatus.ACTIVE,
-            Product.name.ilike(f"%{q}%"),
-        )
-        .order_by(Product.total_sold.desc())
-        .limit(limit)
-    )
+    rows = await suggest(db, q, limit)
     suggestions = [
         {"id": str(r.id), "name": r.name, "price": r.price, "unit_type": r.unit_type.value}
-        for r in result.all()
+        for r in rows
     ]
     return {"success": True, "data": suggestions}
 
 
 @router.get("/{product_id}", response_model=ResponseBase[ProductResponse])
+@cached("catalog", ttl=settings.CACHE_CATALOG_TTL_SECONDS)
 async def get_product(product_id: UUID, db: AsyncSession = Depends(get_db)):
     """Get product details."""
-    result = await db.execute(select(Product).where(Product.id == product_id))
+    result = await db.execute(
+        select(Product).options(*PRODUCT_CARD).where(Product.id == product_id)
+    )
     product = result.scalar_one_or_none()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return ResponseBase(data=ProductResponse.model_validate(product))
+    return render(ResponseBase[ProductResponse], dict(data=product))
 
 
 @router.post("/", response_model=ResponseBase[ProductResponse], status_code=201)
 async def create_product(
     data: ProductCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a new product (vendor only)."""
-    vendor_result = await db.execute(
-        select(Vendor).where(Vendor.user_id == current_user.id)
-    )
-    vendor = vendor_result.scalar_one_or_none()
-    if not vendor:
+    if not current_user.vendor_id:
         raise HTTPException(status_code=403, detail="Only vendors can create products")
 
-    product = Product(vendor_id=vendor.id, **data.model_dump())
+    product = Product(vendor_id=current_user.vendor_id, **data.model_dump())
     db.add(product)
     await db.flush()
+    index_product_on_commit(db, product)
+    invalidate_on_commit(db, "catalog")
+
+    # Re-query to load relationships
+    result = await db.execute(
+        select(Product).options(*PRODUCT_CARD).where(Product.id == product.id)
+    )
+    product = result.scalar_one()
     return ResponseBase(data=ProductResponse.model_validate(product))
 
 
@@ -215,20 +250,16 @@ async def create_product(
 async def update_product(
     product_id: UUID,
     data: ProductUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Update a product (vendor owner only)."""
-    vendor_result = await db.execute(
-        select(Vendor).where(Vendor.user_id == current_user.id)
-    )
-    vendor = vendor_result.scalar_one_or_none()
-    if not vendor:
+    if not current_user.vendor_id:
         raise HTTPException(status_code=403, detail="Vendor access required")
 
     result = await db.execute(
-        select(Product).where(
-            Product.id == product_id, Product.vendor_id == vendor.id
+        select(Product).options(*PRODUCT_CARD).where(
+            Product.id == product_id, Product.vendor_id == current_user.vendor_id
         )
     )
     product = result.scalar_one_or_none()
@@ -239,26 +270,24 @@ async def update_product(
     for key, value in update_data.items():
         setattr(product, key, value)
     await db.flush()
+    index_product_on_commit(db, product)
+    invalidate_on_commit(db, "catalog")
     return ResponseBase(data=ProductResponse.model_validate(product))
 
 
 @router.delete("/{product_id}", response_model=ResponseBase)
 async def delete_product(
     product_id: UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Delete a product (vendor owner only)."""
-    vendor_result = await db.execute(
-        select(Vendor).where(Vendor.user_id == current_user.id)
-    )
-    vendor = vendor_result.scalar_one_or_none()
-    if not vendor:
+    if not current_user.vendor_id:
         raise HTTPException(status_code=403, detail="Vendor access required")
 
     result = await db.execute(
         select(Product).where(
-            Product.id == product_id, Product.vendor_id == vendor.id
+            Product.id == product_id, Product.vendor_id == current_user.vendor_id
         )
     )
     product = result.scalar_one_or_none()
@@ -267,6 +296,8 @@ async def delete_product(
 
     await db.delete(product)
     await db.flush()
+    unindex_product_on_commit(db, product_id)
+    invalidate_on_commit(db, "catalog")
     return ResponseBase(message="Product deleted")
 
 
@@ -275,20 +306,16 @@ async def delete_product(
 async def add_variant(
     product_id: UUID,
     data: ProductVariantCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Add a variant to a product."""
-    vendor_result = await db.execute(
-        select(Vendor).where(Vendor.user_id == current_user.id)
-    )
-    vendor = vendor_result.scalar_one_or_none()
-    if not vendor:
+    if not current_user.vendor_id:
         raise HTTPException(status_code=403, detail="Vendor access required")
 
     result = await db.execute(
         select(Product).where(
-            Product.id == product_id, Product.vendor_id == vendor.id
+            Product.id == product_id, Product.vendor_id == current_user.vendor_id
         )
     )
     product = result.scalar_one_or_none()
@@ -298,4 +325,5 @@ async def add_variant(
     variant = ProductVariant(product_id=product_id, **data.model_dump())
     db.add(variant)
     await db.flush()
+    invalidate_on_commit(db, "catalog")
     return ResponseBase(data=ProductVariantResponse.model_validate(variant))
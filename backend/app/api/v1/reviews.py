@@ -5,13 +5,15 @@ from sqlalchemy import select, func
 from uuid import UUID
 
 from app.database import get_db
-from app.api.deps import get_current_user
-from app.models.user import User
+from app.api.deps import get_current_principal
+from app.core.principal import Principal
+from app.core.counting import count_total
+from app.core.responses import render
 from app.models.product import Product
 from app.models.review import Review
 from app.models.order import Order, OrderStatus
 from app.schemas.review import ReviewCreate, ReviewUpdate, ReviewResponse
-from app.schemas.base import ResponseBase, PaginatedResponse
+from app.schemas.base import ResponseBase, PaginatedResponse, Keyset, page_count
 
 router = APIRouter(prefix="/reviews", tags=["Reviews"])
 
@@ -19,7 +21,7 @@ router = APIRouter(prefix="/reviews", tags=["Reviews"])
 @router.post("/", response_model=ResponseBase[ReviewResponse], status_code=201)
 async def create_review(
     data: ReviewCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Create a product review."""
@@ -84,8 +86,10 @@ async def create_review(
 @router.get("/product/{product_id}", response_model=PaginatedResponse[ReviewResponse])
 async def get_product_reviews(
     product_id: UUID,
+    cursor: str | None = None,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    include_total: bool = True,
     db: AsyncSession = Depends(get_db),
 ):
     """Get reviews for a product."""
@@ -93,20 +97,17 @@ async def get_product_reviews(
         Review.product_id == product_id, Review.is_approved == True
     )
 
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
+    total = await count_total(db, query, include_total)
 
-    query = query.order_by(Review.created_at.desc()).offset(
-        (page - 1) * page_size
-    ).limit(page_size)
+    keyset = Keyset(Review.created_at, Review.id, cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    reviews = keyset.page(result.scalars().all())
 
-    result = await db.execute(query)
-    reviews = result.scalars().all()
-
-    return PaginatedResponse(
-        data=[ReviewResponse.model_validate(r) for r in reviews],
+    return render(PaginatedResponse[ReviewResponse], dict(
+        data=reviews,
         total=total,
         page=page,
         page_size=page_size,
-        total_pages=(total + page_size - 1) // page_size,
-    )
+        total_pages=page_count(total, page_size),
+        **keyset.meta(),
+    ))
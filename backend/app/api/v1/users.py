@@ -5,7 +5,8 @@ from sqlalchemy import select
 from uuid import UUID
 
 from app.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_principal
+from app.core.principal import Principal
 from app.models.user import User, Address
 from app.core.security import hash_password, verify_password
 from app.schemas.user import (
@@ -57,7 +58,7 @@ async def change_password(
 # --- Addresses ---
 @router.get("/me/addresses", response_model=ResponseBase[list[AddressResponse]])
 async def get_addresses(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Get all addresses for current user."""
@@ -73,7 +74,7 @@ async def get_addresses(
 @router.post("/me/addresses", response_model=ResponseBase[AddressResponse], status_code=201)
 async def create_address(
     data: AddressCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Add a new delivery address."""
@@ -97,7 +98,7 @@ async def create_address(
 async def update_address(
     address_id: UUID,
     data: AddressUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Update existing address."""
@@ -130,7 +131,7 @@ async def update_address(
 @router.delete("/me/addresses/{address_id}", response_model=ResponseBase)
 async def delete_address(
     address_id: UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Delete an address."""
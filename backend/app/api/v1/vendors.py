@@ -1,11 +1,16 @@
 """Vendor endpoints: registration, profile, dashboard, store timings."""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from uuid import UUID
 
 from app.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_principal
+from app.core.principal import Principal, invalidate_principal
+from app.core.counting import count_total
+from app.core.cache import cached, invalidate_on_commit
+from app.core.responses import render
+from app.core.fieldsets import Fieldset
 from app.models.user import User, UserRole
 from app.models.vendor import Vendor, StoreTimings, VendorStatus
 from app.models.product import Product
@@ -14,12 +19,15 @@ from app.schemas.vendor import (
     VendorRegisterRequest, VendorUpdate, VendorResponse,
     StoreTimingsCreate, StoreTimingsResponse, VendorDashboardStats,
 )
-from app.schemas.base import ResponseBase, PaginatedResponse
+from app.schemas.base import ResponseBase, PaginatedResponse, Keyset, page_count
 from app.config import get_settings
 
 router = APIRouter(prefix="/vendors", tags=["Vendors"])
 settings = get_settings()
 
+# ``fields=`` for the vendor list
+_VENDOR_FIELDS = Fieldset(Vendor, VendorResponse, {})
+
 
 @router.post("/register", response_model=ResponseBase[VendorResponse], status_code=201)
 async def register_vendor(
@@ -44,6 +52,7 @@ async def register_vendor(
 
     # Update user role
     current_user.role = UserRole.VENDOR
+    invalidate_principal(db, current_user.id)
     await db.flush()
 
     return ResponseBase(data=VendorResponse.model_validate(vendor))
@@ -51,7 +60,7 @@ async def register_vendor(
 
 @router.get("/me", response_model=ResponseBase[VendorResponse])
 async def get_vendor_profile(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Get vendor profile for current user."""
@@ -67,7 +76,7 @@ async def get_vendor_profile(
 @router.put("/me", response_model=ResponseBase[VendorResponse])
 async def update_vendor_profile(
     data: VendorUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Update vendor profile."""
@@ -82,12 +91,13 @@ async def update_vendor_profile(
     for key, value in update_data.items():
         setattr(vendor, key, value)
     await db.flush()
+    invalidate_on_commit(db, "vendors")
     return ResponseBase(data=VendorResponse.model_validate(vendor))
 
 
 @router.get("/me/dashboard", response_model=ResponseBase[VendorDashboardStats])
 async def get_vendor_dashboard(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Get vendor dashboard stats."""
@@ -143,7 +153,7 @@ async def get_vendor_dashboard(
 @router.put("/me/timings", response_model=ResponseBase[list[StoreTimingsResponse]])
 async def set_store_timings(
     timings: list[StoreTimingsCreate],
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db),
 ):
     """Set or update store timings (replaces all existing)."""
@@ -176,15 +186,20 @@ async def set_store_timings(
 
 # --- Public vendor listing ---
 @router.get("/", response_model=PaginatedResponse[VendorResponse])
+@cached("vendors", cache_control="public, max-age=60")
 async def list_vendors(
     city: str | None = None,
     is_active: bool = True,
+    cursor: str | None = None,
     page: int = 1,
     page_size: int = 20,
+    include_total: bool = True,
+    fields: str | None = Query(None, description="Comma-separated response fields to return (default: all)"),
     db: AsyncSession = Depends(get_db),
 ):
     """List all approved and active vendors."""
-    query = select(Vendor).where(
+    selection = _VENDOR_FIELDS.select(fields, Vendor.created_at)
+    query = select(Vendor).options(*selection.options).where(
         Vendor.status == VendorStatus.APPROVED,
         Vendor.is_active == is_active,
     )
@@ -192,28 +207,29 @@ async def list_vendors(
         query = query.where(Vendor.city.ilike(f"%{city}%"))
 
     # Count
-    count_q = select(func.count()).select_from(query.subquery())
-    total = (await db.execute(count_q)).scalar() or 0
+    total = await count_total(db, query, include_total)
 
     # Paginate
-    query = query.offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(query)
-    vendors = result.scalars().all()
+    keyset = Keyset(Vendor.created_at, Vendor.id, cursor=cursor, page=page, page_size=page_size)
+    result = await db.execute(keyset.apply(query))
+    vendors = keyset.page(result.scalars().all())
 
-    return PaginatedResponse(
-        data=[VendorResponse.model_validate(v) for v in vendors],
+    return render(PaginatedResponse[selection.schema], dict(
+        data=vendors,
         total=total,
         page=page,
         page_size=page_size,
-        total_pages=(total + page_size - 1) // page_size,
-    )
+        total_pages=page_count(total, page_size),
+        **keyset.meta(),
+    ))
 
 
 @router.get("/{vendor_id}", response_model=ResponseBase[VendorResponse])
+@cached("vendors", cache_control="public, max-age=60")
 async def get_vendor(vendor_id: UUID, db: AsyncSession = Depends(get_db)):
     """Get vendor details by ID."""
     result = await db.execute(select(Vendor).where(Vendor.id == vendor_id))
     vendor = result.scalar_one_or_none()
     if not vendor:
         raise HTTPException(status_code=404, detail="Vendor not found")
-    return ResponseBase(data=VendorResponse.model_validate(vendor))
+    return render(ResponseBase[VendorResponse], dict(data=vendor))
@@ -1,67 +1,215 @@
 """WebSocket endpoints for real-time order tracking."""
+import asyncio
 import json
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from typing import Dict
+import logging
+from collections import deque
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends
+from sqlalchemy import select
+from typing import Dict, Optional
 from uuid import UUID
 
+import orjson
+
+from app.api.deps import principal_for_token
+from app.config import get_settings
+from app.core.broker import Broker, broker
+from app.database import AsyncSessionLocal
+from app.models.order import Order
+from app.services.tracking import location_tracker
+
 router = APIRouter(tags=["WebSocket"])
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Close code for a token that may not report this order's location
+_CLOSE_POLICY_VIOLATION = 1008
+# Close code for clients that cannot keep up ("try again later")
+_CLOSE_TOO_SLOW = 1013
+
+
+class Connection:
+    """A socket with a bounded send queue, drained by its own writer task.
+
+    ``offer`` never waits on the network. When the queue is full the
+    oldest droppable message (e.g. a superseded location update) makes
+    room; if nothing queued is droppable, a new droppable message is
+    discarded and anything else reports overflow so the caller can
+    disconnect the client, which resyncs when it reconnects.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int, on_error):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.queue: deque[tuple[str, bool]] = deque()  # (text, droppable)
+        self.dropped = 0
+        self.peak_depth = 0
+        self._ready = asyncio.Event()
+        self._on_error = on_error
+        self._writer = asyncio.create_task(self._write())
+
+    def offer(self, text: str, droppable: bool) -> bool:
+        """Queue ``text``; False when the queue overflowed with undroppable messages."""
+        if len(self.queue) >= self.max_queue:
+            oldest = next((i for i, (_, d) in enumerate(self.queue) if d), None)
+            if oldest is not None:
+                del self.queue[oldest]
+            elif droppable:
+                self.dropped += 1
+                return True
+            else:
+                return False
+            self.dropped += 1
+        self.queue.append((text, droppable))
+        self.peak_depth = max(self.peak_depth, len(self.queue))
+        self._ready.set()
+        return True
+
+    async def _write(self):
+        try:
+            while True:
+                while not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                text, _ = self.queue.popleft()
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self._on_error(self)
+
+    def close(self):
+        # A failed writer closes its own connection; it is already finishing
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
 
 
 class ConnectionManager:
-    """Manage active WebSocket connections per order."""
+    """Manage this worker's WebSocket connections per channel.
 
-    def __init__(self):
-        self.active_connections: Dict[str, list[WebSocket]] = {}
+    Broadcasts go through the broker so they reach sockets held by every
+    worker; the broker hands them back to ``deliver`` for local sockets.
+    ``deliver`` encodes each message once and only queues it per socket,
+    so a slow client never holds up the rest of its channel.
+    """
+
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        self.active_connections: Dict[str, dict[WebSocket, Connection]] = {}
+        self.slow_disconnects = 0
+        self._dropped_closed = 0  # drops counted by connections already gone
+        broker.bind(self.deliver)
 
     async def connect(self, websocket: WebSocket, channel: str):
         await websocket.accept()
-        if channel not in self.active_connections:
-            self.active_connections[channel] = []
-        self.active_connections[channel].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, channel: str):
-        if channel in self.active_connections:
-            self.active_connections[channel].remove(websocket)
-            if not self.active_connections[channel]:
-                del self.active_connections[channel]
 
-    async def broadcast(self, channel: str, message: dict):
-        if channel in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[channel]:
-                try:
-                    await connection.send_json(message)
-                except Exception:
-                    disconnected.append(connection)
-            for conn in disconnected:
-                self.disconnect(conn, channel)
-
-
-manager = ConnectionManager()
+        async def on_error(connection: Connection):
+            await self.disconnect(connection.websocket, channel)
+
+        connection = Connection(websocket, settings.WS_SEND_QUEUE_SIZE, on_error)
+        self.active_connections.setdefault(channel, {})[websocket] = connection
+        await self.broker.subscribe(channel)
+
+    async def disconnect(self, websocket: WebSocket, channel: str):
+        connections = self.active_connections.get(channel)
+        connection = connections.pop(websocket, None) if connections is not None else None
+        if connection is None:
+            return  # already dropped after a failed send
+        connection.close()
+        self._dropped_closed += connection.dropped
+        if not connections:
+            del self.active_connections[channel]
+        await self.broker.unsubscribe(channel)
+
+    async def broadcast(self, channel: str, message: dict, strict: bool = False):
+        await self.broker.publish(channel, message, strict=strict)
+
+    async def deliver(self, channel: str, message: dict):
+        connections = self.active_connections.get(channel)
+        if not connections:
+            return
+        text = orjson.dumps(message).decode()
+        droppable = message.get("type") in settings.WS_DROPPABLE_MESSAGE_TYPES
+        overflowed = [c for c in list(connections.values()) if not c.offer(text, droppable)]
+        for connection in overflowed:
+            logger.warning("Disconnecting slow WebSocket client on %s", channel)
+            self.slow_disconnects += 1
+            await self.disconnect(connection.websocket, channel)
+            try:
+                await connection.websocket.close(code=_CLOSE_TOO_SLOW)
+            except Exception:
+                pass  # already gone
+
+    def stats(self) -> dict:
+        connections = [c for conns in self.active_connections.values() for c in conns.values()]
+        depths = [len(c.queue) for c in connections]
+        return {
+            "channels": len(self.active_connections),
+            "connections": len(connections),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "peak_queue_depth": max((c.peak_depth for c in connections), default=0),
+            "queue_size": settings.WS_SEND_QUEUE_SIZE,
+            "dropped_messages": self._dropped_closed + sum(c.dropped for c in connections),
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+
+manager = ConnectionManager(broker)
+
+
+async def _is_delivery_partner(order_id: str, token: str) -> bool:
+    """Whether ``token`` belongs to the delivery partner assigned to the order."""
+    try:
+        order_uuid = UUID(order_id)
+    except ValueError:
+        return False
+    async with AsyncSessionLocal() as db:
+        try:
+            principal = await principal_for_token(token, db)
+        except HTTPException:
+            return False
+        if not principal.is_active:
+            return False
+        partner_id = (await db.execute(
+            select(Order.delivery_partner_id).where(Order.id == order_uuid)
+        )).scalar()
+    return partner_id is not None and partner_id == principal.id
 
 
 @router.websocket("/ws/orders/{order_id}")
-async def order_tracking(websocket: WebSocket, order_id: str):
-    """WebSocket for real-time order status updates."""
+async def order_tracking(websocket: WebSocket, order_id: str, token: Optional[str] = None):
+    """WebSocket for real-time order status updates.
+
+    Anyone may watch. Location updates are only taken from the order's
+    assigned delivery partner, who connects with ``?token=<access token>``.
+    """
+    reports_location = False
+    if token is not None:
+        reports_location = await _is_delivery_partner(order_id, token)
+        if not reports_location:
+            await websocket.close(code=_CLOSE_POLICY_VIOLATION)
+            return
     channel = f"order:{order_id}"
     await manager.connect(websocket, channel)
     try:
         while True:
             data = await websocket.receive_text()
-            # Client can send location updates (delivery partner)
+            if not reports_location:
+                continue
+            # Location updates from the partner are coalesced and broadcast
+            # on the tracker's tick
             try:
                 msg = json.loads(data)
-                if msg.get("type") == "location_update":
-                    await manager.broadcast(channel, {
-                        "type": "location_update",
-                        "latitude": msg.get("latitude"),
-                        "longitude": msg.get("longitude"),
-                        "timestamp": msg.get("timestamp"),
-                    })
+                if isinstance(msg, dict) and msg.get("type") == "location_update":
+                    location_tracker.offer(
+                        order_id, msg.get("latitude"), msg.get("longitude"), msg.get("timestamp"),
+                    )
             except json.JSONDecodeError:
                 pass
     except WebSocketDisconnect:
-        manager.disconnect(websocket, channel)
+        pass
+    finally:
+        await manager.disconnect(websocket, channel)
 
 
 @router.websocket("/ws/vendor/{vendor_id}")
@@ -73,25 +221,27 @@ async def vendor_notifications(websocket: WebSocket, vendor_id: str):
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        manager.disconnect(websocket, channel)
+        pass
+    finally:
+        await manager.disconnect(websocket, channel)
 
 
 # Helper to notify from order service
-async def notify_order_update(order_id: str, status: str, data: dict = None):
-    """Send order status update to connected clients."""
+async def notify_order_update(order_id: str, status: str, data: dict = None, strict: bool = False):
+    """Send order status update to connected clients; ``strict`` raises if the broker is down."""
     message = {
         "type": "order_status",
         "order_id": order_id,
         "status": status,
         **(data or {}),
     }
-    await manager.broadcast(f"order:{order_id}", message)
+    await manager.broadcast(f"order:{order_id}", message, strict=strict)
 
 
-async def notify_vendor_new_order(vendor_id: str, order_data: dict):
-    """Notify vendor of a new order."""
+async def notify_vendor_new_order(vendor_id: str, order_data: dict, strict: bool = False):
+    """Notify vendor of a new order; ``strict`` raises if the broker is down."""
     message = {
         "type": "new_order",
         **order_data,
     }
-    await manager.broadcast(f"vendor:{vendor_id}", message)
+    await manager.broadcast(f"vendor:{vendor_id}", message, strict=strict)
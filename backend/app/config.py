@@ -16,14 +16,74 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "postgresql+asyncpg://postgres:postgres@db:5432/grocery_ecommerce"
     DATABASE_ECHO: bool = False
 
+    # Per-request query accounting (see app.core.query_stats)
+    DB_QUERY_STATS_HEADERS: bool = True
+    DB_QUERY_BUDGET: int = 15  # statements per request
+    DB_TIME_BUDGET_MS: int = 250
+    DB_N_PLUS_ONE_THRESHOLD: int = 5  # repeats of one statement shape
+
+    # Product autocomplete (see app.services.autocomplete)
+    AUTOCOMPLETE_BACKEND: str = "trigram"  # trigram | ilike | memory
+    AUTOCOMPLETE_FALLBACK_BACKEND: str = "trigram"  # when a capped memory index misses
+    AUTOCOMPLETE_TRGM_THRESHOLD: float = 0.4  # pg_trgm.word_similarity_threshold
+    AUTOCOMPLETE_INDEX_MAX_ENTRIES: int = 250_000  # products per worker (~650 B each)
+    AUTOCOMPLETE_INDEX_REFRESH_SECONDS: int = 300
+
+    # Pagination totals: exact | estimated | cached (see app.core.counting);
+    # the default for routes that do not pick a mode
+    PAGINATION_COUNT_MODE: str = "exact"
+    COUNT_CACHE_TTL_SECONDS: int = 30
+    # Below this many estimated rows, "estimated" counts exactly
+    COUNT_ESTIMATE_MIN_ROWS: int = 10_000
+
+    # Admin dashboard snapshot: fresh for TTL, then served stale while refreshing
+    DASHBOARD_SNAPSHOT_TTL_SECONDS: int = 30
+    DASHBOARD_SNAPSHOT_STALE_SECONDS: int = 300
+
+    # Admin customer stats: "orders" (grouped on read) | "table" (customer_stats,
+    # after running backfill_rollups.py)
+    CUSTOMER_STATS_SOURCE: str = "orders"
+
     # Redis
     REDIS_URL: str = "redis://redis:6379/0"
 
+    # Response cache (app.core.cache): Redis, or in-process while it is down
+    CACHE_ENABLED: bool = True
+    CACHE_DEFAULT_TTL_SECONDS: int = 60
+    # Catalog reads also show stock, which orders change without invalidating
+    CACHE_CATALOG_TTL_SECONDS: int = 30
+    CACHE_LOCK_SECONDS: int = 5
+    CACHE_REDIS_TIMEOUT_SECONDS: float = 0.25
+    CACHE_REDIS_RETRY_SECONDS: int = 10
+    CACHE_MEMORY_MAX_ENTRIES: int = 10_000
+    # Per-worker near-cache in front of Redis
+    CACHE_NEAR_MAX_BYTES: int = 32 * 1024 * 1024
+    CACHE_NEAR_TTL_SECONDS: int = 30
+    # Per-worker category tree (app.services.categories); also reloaded on
+    # category writes
+    CATEGORY_TREE_MAX_AGE_SECONDS: int = 300
+
+    # WebSocket fan-out across workers (app.core.broker): redis | memory
+    WS_BROKER_BACKEND: str = "redis"
+    WS_BROKER_RECONNECT_SECONDS: float = 1.0
+    # Per-socket send queue; when full, the oldest message of a droppable
+    # type is discarded, and a queue with none to discard disconnects the
+    # client
+    WS_SEND_QUEUE_SIZE: int = 64
+    WS_DROPPABLE_MESSAGE_TYPES: list[str] = ["location_update"]
+    # Delivery partner locations (app.services.tracking): latest position per
+    # order broadcast once per tick if it moved at least the minimum distance
+    WS_LOCATION_TICK_SECONDS: float = 1.0
+    WS_LOCATION_MIN_DISTANCE_METRES: float = 10.0
+    WS_LOCATION_PERSIST_INTERVAL_SECONDS: float = 15.0
+
     # Auth / JWT
     SECRET_KEY: str = "change-this-to-a-super-secret-key-in-production"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10_000
 
     # CORS
     CORS_ORIGINS: list[str] = ["*"]
@@ -37,6 +97,12 @@ class Settings(BaseSettings):
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
     RAZORPAY_KEY_ID: Optional[str] = None
     RAZORPAY_KEY_SECRET: Optional[str] = None
+    RAZORPAY_WEBHOOK_SECRET: Optional[str] = None
+
+    # Inventory holds for online payments (see app.services.inventory)
+    INVENTORY_HOLD_TTL_MINUTES: int = 15
+    INVENTORY_HOLD_SWEEP_INTERVAL_SECONDS: int = 30
+    INVENTORY_HOLD_SWEEP_BATCH_SIZE: int = 500
 
     # Email / Notifications
     SMTP_HOST: Optional[str] = None
@@ -48,6 +114,18 @@ class Settings(BaseSettings):
     # Firebase (push notifications)
     FIREBASE_CREDENTIALS_PATH: Optional[str] = None
 
+    # Order event outbox (app.services.outbox): relayed to WebSockets, push
+    # and email; failed sinks retried with exponential backoff
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_RETRY_BASE_SECONDS: float = 2.0
+    OUTBOX_RETRY_MAX_SECONDS: float = 300.0
+    OUTBOX_RETENTION_HOURS: int = 72
+    # Claimed events are hidden from other workers this long while being
+    # delivered; a worker that dies mid-batch has them retried after it
+    OUTBOX_LEASE_SECONDS: float = 120.0
+
     # Commission
     DEFAULT_COMMISSION_RATE: float = 10.0  # percentage
 
@@ -0,0 +1,207 @@
+"""Pub/sub fan-out for WebSocket channels.
+
+Each worker holds only its own sockets (``ConnectionManager`` in
+``app.api.v1.websockets``). The broker carries broadcasts between workers
+and hosts. ``publish(channel, message)`` reaches every worker subscribed
+to ``channel``, and each hands the message to the callback registered
+with ``bind``, which writes it to the local sockets.
+
+Subscriptions are reference counted per channel. A worker subscribes
+when its first local socket joins a channel and unsubscribes when the
+last one leaves, so idle channels hold no Redis subscription.
+
+``WS_BROKER_BACKEND`` picks the implementation:
+
+- ``redis``: ``RedisBroker``, for production. If Redis cannot be reached,
+  ``publish`` delivers to the local sockets only, and ``run`` keeps
+  reconnecting. ``publish(..., strict=True)`` raises instead, for callers
+  that retry (the order event outbox).
+- ``memory``: ``MemoryBroker``, a single worker with no fan-out, for
+  tests and local runs.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+import orjson
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, dict], Awaitable[None]]
+
+
+class Broker:
+    """Reference-counted channel subscriptions; subclasses move the messages."""
+
+    def __init__(self):
+        self._refs: dict[str, int] = {}
+        self._deliver: Deliver | None = None
+
+    def bind(self, deliver: Deliver) -> None:
+        """Register the callback that writes a message to this worker's sockets."""
+        self._deliver = deliver
+
+    def subscribers(self, channel: str) -> int:
+        return self._refs.get(channel, 0)
+
+    async def subscribe(self, channel: str) -> None:
+        self._refs[channel] = self._refs.get(channel, 0) + 1
+        if self._refs[channel] == 1:
+            await self._channels_changed()
+
+    async def unsubscribe(self, channel: str) -> None:
+        count = self._refs.get(channel, 0) - 1
+        if count > 0:
+            self._refs[channel] = count
+        elif self._refs.pop(channel, None) is not None:
+            await self._channels_changed()
+
+    async def publish(self, channel: str, message: dict, strict: bool = False) -> None:
+        """Send ``message`` to every worker on ``channel``.
+
+        With ``strict`` a message that cannot reach the other workers raises
+        instead of falling back to this worker's sockets.
+        """
+        raise NotImplementedError
+
+    async def run(self) -> None:
+        """Background loop receiving messages from other workers, if any."""
+
+    async def close(self) -> None:
+        pass
+
+    async def _channels_changed(self) -> None:
+        pass
+
+    async def _dispatch(self, channel: str, message: dict) -> None:
+        if self._deliver is None or channel not in self._refs:
+            return
+        try:
+            await self._deliver(channel, message)
+        except Exception:
+            logger.exception("WebSocket delivery on %s failed", channel)
+
+
+class MemoryBroker(Broker):
+    """In-process only: a publish reaches this worker's sockets."""
+
+    async def publish(self, channel: str, message: dict, strict: bool = False) -> None:
+        await self._dispatch(channel, message)
+
+
+class RedisBroker(Broker):
+    """Redis pub/sub: one subscriber connection per worker, shared by all channels."""
+
+    prefix = "ws:"
+    # Always subscribed, so the connection (and its health checks) stays up
+    # while no channel is wanted
+    control_channel = "ws-broker:control"
+
+    def __init__(self, redis_url: str):
+        super().__init__()
+        self.redis_url = redis_url
+        self._publisher = None
+        self._pubsub = None
+        self._active: set[str] = set()  # channels subscribed on Redis
+        self._lock = asyncio.Lock()
+
+    @property
+    def publisher(self):
+        if self._publisher is None:
+            self._publisher = aioredis.Redis.from_url(
+                self.redis_url,
+                socket_connect_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+                socket_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+            )
+        return self._publisher
+
+    def _subscriber(self):
+        # No socket_timeout: the subscription idles between messages
+        return aioredis.Redis.from_url(
+            self.redis_url,
+            socket_connect_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+            health_check_interval=30,
+        )
+
+    async def publish(self, channel: str, message: dict, strict: bool = False) -> None:
+        try:
+            await self.publisher.publish(self.prefix + channel, orjson.dumps(message))
+            return
+        except (RedisError, OSError) as exc:
+            if strict:
+                raise
+            logger.warning("WebSocket broker unavailable, delivering locally only: %s", exc)
+        await self._dispatch(channel, message)
+
+    async def _channels_changed(self) -> None:
+        """Bring the Redis subscriptions in line with the wanted channels."""
+        async with self._lock:
+            pubsub = self._pubsub
+            if pubsub is None:
+                return  # run() subscribes everything wanted once connected
+            wanted = set(self._refs)
+            add, drop = wanted - self._active, self._active - wanted
+            try:
+                if add:
+                    await pubsub.subscribe(*(self.prefix + c for c in add))
+                    self._active |= add
+                if drop:
+                    await pubsub.unsubscribe(*(self.prefix + c for c in drop))
+                    self._active -= drop
+            except (RedisError, OSError) as exc:
+                # Retried from run() while idle, or on reconnect
+                logger.warning("WebSocket broker subscription update failed: %s", exc)
+
+    async def run(self) -> None:
+        while True:
+            client = self._subscriber()
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                async with self._lock:
+                    await pubsub.subscribe(
+                        self.control_channel, *(self.prefix + c for c in self._refs)
+                    )
+                    self._active = set(self._refs)
+                    self._pubsub = pubsub
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        if self._active != set(self._refs):
+                            await self._channels_changed()
+                        continue
+                    channel = message["channel"].decode()
+                    if channel.startswith(self.prefix):
+                        await self._dispatch(
+                            channel.removeprefix(self.prefix), orjson.loads(message["data"])
+                        )
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as exc:
+                logger.warning("WebSocket broker disconnected: %s", exc)
+            finally:
+                self._pubsub = None
+                self._active = set()
+                await pubsub.aclose()
+                await client.aclose()
+            await asyncio.sleep(settings.WS_BROKER_RECONNECT_SECONDS)
+
+    async def close(self) -> None:
+        if self._publisher is not None:
+            await self._publisher.aclose()
+            self._publisher = None
+
+
+def create_broker(backend: str) -> Broker:
+    if backend == "memory":
+        return MemoryBroker()
+    if backend == "redis":
+        return RedisBroker(settings.REDIS_URL)
+    raise ValueError(f"Unknown WS_BROKER_BACKEND: {backend!r}")
+
+
+broker = create_broker(settings.WS_BROKER_BACKEND)
@@ -0,0 +1,445 @@
+"""Response cache: Redis when reachable, a per-worker store otherwise.
+
+``@cached(namespace)`` wraps a GET route handler. The key is built from the
+route and its plain query/path parameters (dependencies such as the DB
+session are ignored), and the serialized JSON body is what gets stored.
+
+Keys embed a per-namespace generation: ``invalidate("catalog")`` bumps it,
+orphaning every key of the namespace at once (they expire on their TTL).
+A recomputation racing an invalidation therefore writes under the old
+generation, where nothing reads it.
+
+Concurrent misses on one key share a single computation: inside a worker
+they await the same future; across workers the first to ``SET NX`` the
+key's lock computes while the others poll for the result.
+
+In front of Redis each worker keeps a near-cache: an LRU bounded by
+``CACHE_NEAR_MAX_BYTES``. Invalidations are published on
+``INVALIDATION_CHANNEL``; every worker's ``run_invalidation_listener``
+applies the new generation and drops the namespace's near entries. While
+the listener is connected, generations are read from memory too, so a
+near hit costs no network round trip at all.
+
+When Redis is unreachable the cache degrades to a bounded in-process
+store and retries Redis after ``CACHE_REDIS_RETRY_SECONDS``.
+
+Cached responses are conditional: each entry stores its ETag (a hash of
+the body) and the time it was computed, sent as ``Last-Modified``, so a
+request with a matching ``If-None-Match`` gets an empty 304 straight from
+the entry. ``Last-Modified`` only has whole seconds, and an entry
+recomputed within the second it is dated would look unchanged; so
+``If-Modified-Since`` only gets a 304 when the entry predates the header's
+second.
+"""
+import asyncio
+import enum
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_KEY_TYPES = (str, int, float, bool, UUID, enum.Enum, type(None))
+
+INVALIDATION_CHANNEL = "cache:invalidations"
+
+# Part of every @cached key; bump when the stored entry layout changes so
+# entries written by older code are never parsed
+_ENTRY_FORMAT = 3
+
+
+class MemoryStore:
+    """Per-worker stand-in for the Redis commands the cache uses."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ex: int | None = None, nx: bool = False) -> bool:
+        if nx and await self.get(key) is not None:
+            return False
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            self._evict()
+        expires = time.monotonic() + ex if ex else float("inf")
+        self._entries[key] = (expires, value)
+        return True
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._entries[key] = (float("inf"), str(value).encode())
+        return value
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (exp, _) in self._entries.items() if exp < now]:
+            del self._entries[key]
+        # Still full: drop the oldest insertions
+        overflow = len(self._entries) - self.max_entries + 1
+        for key in list(self._entries)[:max(overflow, 0)]:
+            del self._entries[key]
+
+
+class NearCache:
+    """Per-worker LRU of cached bodies, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes // 4:
+            return  # one huge body would flush everything else
+        self._discard(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def drop_prefix(self, prefix: str) -> None:
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            self._discard(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class Cache:
+    """Namespaced get-or-compute: near-cache, then Redis (or its fallback)."""
+
+    def __init__(self, redis_url: str, memory_max_entries: int, near_max_bytes: int):
+        self.redis_url = redis_url
+        self.memory = MemoryStore(memory_max_entries)
+        self.near = NearCache(near_max_bytes)
+        self._redis = None
+        # Namespace generations as last published; trusted only while the
+        # invalidation listener is subscribed
+        self._generations: dict[str, int] = {}
+        self._bus_live = False
+        self._down_until = 0.0
+        self._missed_invalidations: set[str] = set()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = aioredis.Redis.from_url(
+                self.redis_url,
+                socket_connect_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+                socket_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+            )
+        return self._redis
+
+    async def _call(self, command: str, *args, **kwargs):
+        """Run a command on Redis, or on the in-process store while it is down."""
+        if time.monotonic() >= self._down_until:
+            try:
+                if self._missed_invalidations:
+                    await self._replay_invalidations()
+                return await getattr(self.redis, command)(*args, **kwargs)
+            except (RedisError, OSError) as exc:
+                self._mark_down(exc)
+        return await getattr(self.memory, command)(*args, **kwargs)
+
+    def _mark_down(self, exc: Exception) -> None:
+        logger.warning("Redis cache unavailable, using in-process store: %s", exc)
+        self._down_until = time.monotonic() + settings.CACHE_REDIS_RETRY_SECONDS
+        # Near keys embed Redis generations; the fallback store counts its own
+        self.near.clear()
+
+    async def _replay_invalidations(self) -> None:
+        # Namespaces invalidated while Redis was down may hold stale entries there
+        missed, self._missed_invalidations = self._missed_invalidations, set()
+        self.near.clear()
+        for namespace in missed:
+            generation = await self.redis.incr(self._generation_key(namespace))
+            await self.redis.publish(INVALIDATION_CHANNEL, f"{namespace}:{generation}")
+
+    @staticmethod
+    def _generation_key(namespace: str) -> str:
+        return f"cache:{namespace}:generation"
+
+    async def generation(self, namespace: str) -> int:
+        """Current generation of ``namespace``; changes on every invalidation."""
+        if self._bus_live and namespace in self._generations:
+            return self._generations[namespace]
+        generation = int(await self._call("get", self._generation_key(namespace)) or 0)
+        if self._bus_live:
+            self._apply_generation(namespace, generation)
+        return generation
+
+    def _apply_generation(self, namespace: str, generation: int) -> None:
+        # Never step back: a slow read must not undo a newer published bump
+        current = self._generations.get(namespace)
+        if current is None or generation > current:
+            self._generations[namespace] = generation
+            if current is not None:
+                self.near.drop_prefix(f"cache:{namespace}:")
+
+    async def _key(self, namespace: str, key: str) -> str:
+        return f"cache:{namespace}:{await self.generation(namespace)}:{key}"
+
+    async def get_or_compute(
+        self, namespace: str, key: str, ttl: int, compute: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        full_key = await self._key(namespace, key)
+        near_ttl = min(ttl, settings.CACHE_NEAR_TTL_SECONDS)
+        value = self.near.get(full_key)
+        if value is not None:
+            return value
+        value = await self._call("get", full_key)
+        if value is not None:
+            self.near.set(full_key, value, near_ttl)
+            return value
+
+        inflight = self._inflight.get(full_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await self._fill(full_key, ttl, compute)
+            self.near.set(full_key, value, near_ttl)
+            future.set_result(value)
+            return value
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[full_key]
+
+    async def _fill(self, key: str, ttl: int, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        lock_key = f"{key}:lock"
+        lock_seconds = settings.CACHE_LOCK_SECONDS
+        locked = await self._call("set", lock_key, b"1", ex=lock_seconds, nx=True)
+        if not locked:
+            # Another worker is computing: wait for its result, then give up
+            # and compute here rather than fail the request
+            deadline = time.monotonic() + lock_seconds
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.025)
+                value = await self._call("get", key)
+                if value is not None:
+                    return value
+        try:
+            value = await compute()
+            await self._call("set", key, value, ex=int(ttl))
+            return value
+        finally:
+            if locked:
+                await self._call("delete", lock_key)
+
+    async def invalidate(self, *namespaces: str) -> None:
+        for namespace in namespaces:
+            generation_key = self._generation_key(namespace)
+            self.near.drop_prefix(f"cache:{namespace}:")
+            await self.memory.incr(generation_key)
+            if time.monotonic() >= self._down_until:
+                try:
+                    generation = await self.redis.incr(generation_key)
+                    self._apply_generation(namespace, generation)
+                    await self.redis.publish(INVALIDATION_CHANNEL, f"{namespace}:{generation}")
+                    continue
+                except (RedisError, OSError) as exc:
+                    self._mark_down(exc)
+            self._generations.pop(namespace, None)
+            self._missed_invalidations.add(namespace)
+
+    def _subscriber(self):
+        # No socket_timeout: the subscription idles between messages
+        return aioredis.Redis.from_url(
+            self.redis_url,
+            socket_connect_timeout=settings.CACHE_REDIS_TIMEOUT_SECONDS,
+            health_check_interval=30,
+        )
+
+    async def run_invalidation_listener(self) -> None:
+        """Background loop: apply invalidations published by other workers."""
+        while True:
+            client = self._subscriber()
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything cached locally may have missed messages while
+                # we were unsubscribed
+                self._generations.clear()
+                self.near.clear()
+                self._bus_live = True
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    namespace, _, generation = message["data"].decode().rpartition(":")
+                    self._apply_generation(namespace, int(generation))
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as exc:
+                logger.warning("Cache invalidation bus disconnected: %s", exc)
+            finally:
+                self._bus_live = False
+                await pubsub.aclose()
+                await client.aclose()
+            await asyncio.sleep(settings.CACHE_REDIS_RETRY_SECONDS)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+cache = Cache(
+    settings.REDIS_URL,
+    memory_max_entries=settings.CACHE_MEMORY_MAX_ENTRIES,
+    near_max_bytes=settings.CACHE_NEAR_MAX_BYTES,
+)
+
+
+def invalidate_on_commit(db: AsyncSession, *namespaces: str) -> None:
+    """Invalidate ``namespaces`` once the request's transaction commits.
+
+    ``get_db`` runs these after ``commit()``, before the response is sent,
+    so the writer's next read already misses the cache.
+    """
+    db.info.setdefault("after_commit_async", []).append(
+        lambda: cache.invalidate(*namespaces)
+    )
+
+
+def _default_key(params: dict) -> str:
+    plain = {
+        name: value for name, value in params.items()
+        if isinstance(value, _KEY_TYPES)
+        or (isinstance(value, (list, tuple)) and all(isinstance(v, _KEY_TYPES) for v in value))
+    }
+    encoded = json.dumps(jsonable_encoder(plain), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def _etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _not_modified(request: Request, etag: str, last_modified: float | None) -> bool:
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # Strictly earlier: an entry from within that second may be a newer one
+    return last_modified < since.timestamp()
+
+
+def cached(
+    namespace: str, ttl: int | None = None, key: Callable[..., str] | None = None,
+    cache_control: str = "no-cache",
+):
+    """Cache a GET route handler's JSON response under ``namespace``.
+
+    ``key`` receives the handler's keyword arguments and returns the cache
+    key suffix; by default it hashes every plain-valued parameter. Only
+    successful responses are stored; raised HTTP errors pass through.
+
+    Responses carry ``ETag``, ``Last-Modified`` (cached entries only) and
+    ``cache_control``; the default makes clients revalidate every time,
+    which costs them a 304 while the entry is unchanged.
+    """
+    def decorator(endpoint):
+        route = f"{endpoint.__module__}.{endpoint.__qualname__}"
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, _cached_request: Request, **kwargs):
+            async def render() -> bytes:
+                result = await endpoint(*args, **kwargs)
+                if isinstance(result, Response):  # e.g. app.core.responses.render
+                    return result.body
+                return ORJSONResponse(jsonable_encoder(result)).body
+
+            if settings.CACHE_ENABLED:
+                async def compute() -> bytes:
+                    body = await render()
+                    return b"%s %.6f\n%s" % (_etag(body).encode(), time.time(), body)
+
+                suffix = key(**kwargs) if key else _default_key(kwargs)
+                entry = await cache.get_or_compute(
+                    namespace, f"{route}:{_ENTRY_FORMAT}:{suffix}",
+                    ttl or settings.CACHE_DEFAULT_TTL_SECONDS, compute,
+                )
+                header, _, body = entry.partition(b"\n")
+                etag, last_modified = header.decode().split(" ")
+                last_modified = float(last_modified)
+            else:
+                body = await render()
+                etag, last_modified = _etag(body), None
+
+            headers = {"ETag": etag, "Cache-Control": cache_control}
+            if last_modified is not None:
+                headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+            if _not_modified(_cached_request, etag, last_modified):
+                return Response(status_code=304, headers=headers)
+            return Response(content=body, media_type="application/json", headers=headers)
+
+        # FastAPI reads the endpoint's parameters through __wrapped__; add
+        # the request so conditional headers can be checked
+        signature = inspect.signature(endpoint)
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("_cached_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ])
+        return wrapper
+    return decorator
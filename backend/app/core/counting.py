@@ -0,0 +1,140 @@
+"""Count strategies for paginated totals.
+
+``count_total`` replaces the per-page ``SELECT count(*) FROM (query)``:
+
+- ``exact``: the full count, every request (the default).
+- ``estimated``: ``pg_class.reltuples`` for unfiltered single-table
+  queries, otherwise the planner's row estimate from ``EXPLAIN``. Small
+  estimates (below ``COUNT_ESTIMATE_MIN_ROWS``) are cheap to count and are
+  counted exactly instead.
+- ``cached``: the exact count, memoised per worker for
+  ``COUNT_CACHE_TTL_SECONDS`` under the statement and its parameters, so
+  paging through one listing counts once. Totals may then lag writes by
+  up to the TTL.
+
+``PAGINATION_COUNT_MODE`` sets the default; routes that can live with an
+approximate total opt in with ``mode=``.
+
+Clients that do not display totals pass ``include_total=false`` and skip
+counting altogether.
+"""
+import hashlib
+import json
+import time
+
+from sqlalchemy import Select, func, literal_column, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.config import get_settings
+
+settings = get_settings()
+
+COUNT_MODES = ("exact", "estimated", "cached")
+
+_pg_dialect = postgresql.dialect()
+
+
+class _CountCache:
+    """Per-worker TTL cache of exact counts."""
+
+    def __init__(self, max_size: int = 5_000):
+        self.max_size = max_size
+        self._entries: dict[str, tuple[float, int]] = {}
+
+    def get(self, key: str) -> int | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key: str, value: int, ttl: float) -> None:
+        if len(self._entries) >= self.max_size:
+            now = time.monotonic()
+            self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+            if len(self._entries) >= self.max_size:
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+count_cache = _CountCache()
+
+
+def _rows_query(query: Select) -> Select:
+    """The query's FROM/WHERE with a constant select list and no ordering."""
+    return (
+        query.with_only_columns(literal_column("1"), maintain_column_froms=True)
+        .order_by(None).limit(None).offset(None)
+    )
+
+
+class _Explain(Executable, ClauseElement):
+    """``EXPLAIN (FORMAT JSON) <query>``, with the query's own bound parameters."""
+    inherit_cache = False
+
+    def __init__(self, query: Select):
+        self.query = query
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.query, **kw)
+
+
+def _cache_key(query: Select) -> str:
+    compiled = query.compile(dialect=_pg_dialect)
+    params = sorted((name, repr(value)) for name, value in compiled.params.items())
+    return hashlib.sha1(f"{compiled}\n{params}".encode()).hexdigest()
+
+
+async def _exact(db: AsyncSession, query: Select) -> int:
+    count_q = select(func.count()).select_from(_rows_query(query).subquery())
+    return (await db.execute(count_q)).scalar() or 0
+
+
+async def _estimated(db: AsyncSession, query: Select) -> int:
+    froms = query.get_final_froms()
+    if query.whereclause is None and len(froms) == 1 and hasattr(froms[0], "name"):
+        reltuples = (await db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:t AS regclass)"),
+            {"t": froms[0].name},
+        )).scalar()
+        estimate = reltuples if reltuples is not None and reltuples >= 0 else None
+    else:
+        plan = (await db.execute(_Explain(_rows_query(query)))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+    if estimate is None or estimate < settings.COUNT_ESTIMATE_MIN_ROWS:
+        return await _exact(db, query)
+    return estimate
+
+
+async def _cached(db: AsyncSession, query: Select) -> int:
+    key = _cache_key(_rows_query(query))
+    total = count_cache.get(key)
+    if total is None:
+        total = await _exact(db, query)
+        count_cache.set(key, total, settings.COUNT_CACHE_TTL_SECONDS)
+    return total
+
+
+_STRATEGIES = {"exact": _exact, "estimated": _estimated, "cached": _cached}
+
+
+async def count_total(
+    db: AsyncSession, query: Select, include_total: bool = True, mode: str | None = None,
+) -> int | None:
+    """Total rows matched by ``query`` under the configured count strategy.
+
+    Returns None when the client opted out with ``include_total=false``.
+    """
+    if not include_total:
+        return None
+    return await _STRATEGIES[mode or settings.PAGINATION_COUNT_MODE](db, query)
@@ -5,10 +5,11 @@ from fastapi.responses import JSONResponse
 
 class AppException(Exception):
     """Base application exception."""
-    def __init__(self, status_code: int, detail: str, error_code: str = None):
+    def __init__(self, status_code: int, detail: str, error_code: str = None, details: list = None):
         self.status_code = status_code
         self.detail = detail
         self.error_code = error_code
+        self.details = details
 
 
 class NotFoundException(AppException):
@@ -37,23 +38,28 @@ class PaymentException(AppException):
 
 
 class InsufficientStockException(AppException):
-    def __init__(self, product_name: str):
+    """One or more cart lines could not be reserved; ``details`` lists each."""
+    def __init__(self, product_name: str, details: list = None):
         super().__init__(
             status_code=400,
             detail=f"Insufficient stock for {product_name}",
             error_code="INSUFFICIENT_STOCK",
+            details=details,
         )
 
 
 async def app_exception_handler(request: Request, exc: AppException) -> JSONResponse:
+    error = {
+        "code": exc.error_code,
+        "message": exc.detail,
+    }
+    if exc.details:
+        error["details"] = exc.details
     return JSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
-            "error": {
-                "code": exc.error_code,
-                "message": exc.detail,
-            },
+            "error": error,
         },
     )
 
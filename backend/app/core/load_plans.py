@@ -0,0 +1,63 @@
+"""Named relationship load plans.
+
+Every relationship in ``app.models`` is declared ``lazy="raise"``, so a bare
+``select(Model)`` never pulls in related rows.  Endpoints that need related
+data apply one of the profiles below explicitly:
+
+    select(Order).options(*ORDER_DETAIL)
+
+Touching a relationship that the chosen profile does not load raises
+``InvalidRequestError`` instead of silently issuing extra queries.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models.order import Order
+from app.models.payment import Payment, VendorPayout
+from app.models.product import Product
+from app.models.review import Review
+from app.models.vendor import Vendor
+
+# --- Orders ---
+# OrderResponse: line items + status timeline
+ORDER_DETAIL = (
+    selectinload(Order.items),
+    selectinload(Order.status_history),
+)
+# Line items only (cancel / reorder)
+ORDER_ITEMS = (selectinload(Order.items),)
+# Admin order tables: customer + vendor names and line items
+ADMIN_ORDER_ROW = (
+    joinedload(Order.customer),
+    joinedload(Order.vendor),
+    selectinload(Order.items),
+)
+ADMIN_ORDER_DETAIL = ADMIN_ORDER_ROW + (selectinload(Order.status_history),)
+
+# --- Products ---
+# ProductResponse: images + variants
+PRODUCT_CARD = (
+    selectinload(Product.images),
+    selectinload(Product.variants),
+)
+# Admin product table: vendor + category names and thumbnail
+ADMIN_PRODUCT_ROW = (
+    joinedload(Product.vendor),
+    joinedload(Product.category),
+    selectinload(Product.images),
+)
+
+# --- Vendors ---
+ADMIN_VENDOR_DETAIL = (
+    joinedload(Vendor.user),
+    selectinload(Vendor.documents),
+)
+
+# --- Payments ---
+ADMIN_PAYMENT_ROW = (joinedload(Payment.order),)
+ADMIN_PAYOUT_ROW = (joinedload(VendorPayout.vendor),)
+
+# --- Reviews ---
+ADMIN_REVIEW_ROW = (
+    joinedload(Review.user),
+    joinedload(Review.product),
+)
@@ -0,0 +1,92 @@
+"""Lightweight authenticated principal and its per-worker cache."""
+import time
+from dataclasses import dataclass
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.user import UserRole
+
+settings = get_settings()
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """What most endpoints need to know about the caller.
+
+    Built from the token subject plus a narrow column lookup, never from an
+    ORM ``User``. Endpoints that need the full row depend on
+    ``get_current_user`` instead.
+    """
+    id: UUID
+    role: UserRole
+    is_active: bool
+    vendor_id: UUID | None = None
+
+
+class PrincipalCache:
+    """In-process TTL cache of principals keyed by user id.
+
+    Each uvicorn worker holds its own copy, so writes that change a user's
+    role, active flag or vendor must call ``invalidate``; other workers pick
+    the change up once their entry expires.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: dict[UUID, tuple[float, Principal]] = {}
+
+    def get(self, user_id: UUID) -> Principal | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(user_id, None)
+            return None
+        return principal
+
+    def set(self, principal: Principal) -> None:
+        if len(self._entries) >= self.max_size:
+            self._evict()
+        self._entries[principal.id] = (
+            time.monotonic() + self.ttl_seconds, principal
+        )
+
+    def invalidate(self, user_id: UUID) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [k for k, (exp, _) in self._entries.items() if exp < now]
+        for key in expired:
+            del self._entries[key]
+        # Still full: drop the oldest insertions (dicts keep insertion order)
+        overflow = len(self._entries) - self.max_size + 1
+        for key in list(self._entries)[:max(overflow, 0)]:
+            del self._entries[key]
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+)
+
+
+def invalidate_principal(db: AsyncSession, user_id: UUID) -> None:
+    """Drop a cached principal now and again once ``db`` commits.
+
+    The second pass stops a concurrent request from re-caching the old row
+    between the write and the commit.
+    """
+    principal_cache.invalidate(user_id)
+    event.listen(
+        db.sync_session, "after_commit",
+        lambda session: principal_cache.invalidate(user_id), once=True,
+    )
@@ -0,0 +1,134 @@
+"""Per-request SQL statement accounting and N+1 detection.
+
+Engine events record every statement executed while a request is in
+flight; ``QueryStatsMiddleware`` reports the totals as ``X-DB-Queries`` /
+``X-DB-Time`` response headers and logs a warning when a route exceeds its
+statement or time budget, or repeats the same statement shape often enough
+to look like an N+1 loop.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryStats:
+    """Statements executed during one request."""
+
+    __slots__ = ("count", "total_time", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(s, n) for s, n in self.shapes.most_common() if n >= threshold]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Normalise a statement so repeats with different parameters collide."""
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _PLACEHOLDER_LIST.sub("?...", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def current_stats() -> QueryStats | None:
+    return _current.get()
+
+
+def query_budget(max_queries: int):
+    """Override ``DB_QUERY_BUDGET`` for a single route handler."""
+    def decorator(endpoint):
+        endpoint.__query_budget__ = max_queries
+        return endpoint
+    return decorator
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach the statement timing hooks to a (sync) engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is None:
+            return
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        stats.record(statement, time.perf_counter() - starts.pop())
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware that scopes a ``QueryStats`` to each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and settings.DB_QUERY_STATS_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                headers.append((b"x-db-time", f"{stats.total_time * 1000:.2f}".encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            self._check_budget(scope, stats)
+
+    @staticmethod
+    def _check_budget(scope, stats: QueryStats) -> None:
+        route = scope.get("route")
+        path = getattr(route, "path", scope.get("path", ""))
+        endpoint = scope.get("endpoint")
+        budget = getattr(endpoint, "__query_budget__", settings.DB_QUERY_BUDGET)
+        elapsed_ms = stats.total_time * 1000
+
+        if stats.count > budget or elapsed_ms > settings.DB_TIME_BUDGET_MS:
+            logger.warning(
+                "DB budget exceeded on %s %s: %d statements (budget %d), %.1f ms (budget %d ms)",
+                scope.get("method"), path, stats.count, budget,
+                elapsed_ms, settings.DB_TIME_BUDGET_MS,
+            )
+        for shape, count in stats.repeated(settings.DB_N_PLUS_ONE_THRESHOLD):
+            logger.warning(
+                "Possible N+1 on %s %s: %d x %s",
+                scope.get("method"), path, count, shape[:300],
+            )
@@ -0,0 +1,40 @@
+"""JSON response fast paths.
+
+The app's default response class is ``ORJSONResponse``. Handlers that
+return plain dicts still go through ``jsonable_encoder``, but encoding
+itself is done by orjson.
+
+Handlers returning a pydantic model pay twice: once in
+``Model.model_validate(row)`` per ORM row, and again when FastAPI
+validates and serializes that model against ``response_model``.
+``render(schema, content)`` does it once: it validates the trusted
+content (ORM rows may sit anywhere inside it) through a cached
+``TypeAdapter`` and serializes it in pydantic-core. The result is a
+ready ``Response``, so FastAPI skips its own pass.
+
+Keep ``response_model`` on the route for the OpenAPI schema.
+``bench_serialization.py`` measures both paths.
+"""
+import functools
+from typing import Any
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+
+class PrerenderedJSONResponse(Response):
+    """JSON body that has already been serialized."""
+    media_type = "application/json"
+
+
+@functools.lru_cache(maxsize=512)
+def adapter(schema: Any) -> TypeAdapter:
+    """Shared ``TypeAdapter`` per schema; building one compiles its validator."""
+    return TypeAdapter(schema)
+
+
+def render(schema: Any, content: Any, status_code: int = 200) -> PrerenderedJSONResponse:
+    """Validate ``content`` as ``schema`` (reading ORM attributes) and serialize it."""
+    schema_adapter = adapter(schema)
+    value = schema_adapter.validate_python(content, from_attributes=True)
+    return PrerenderedJSONResponse(schema_adapter.dump_json(value), status_code=status_code)
@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm import DeclarativeBase
 from app.config import get_settings
+from app.core.query_stats import instrument_engine
 
 settings = get_settings()
 
@@ -15,7 +16,11 @@ engine = create_async_engine(
     pool_size=20,
     max_overflow=10,
     pool_pre_ping=True,
+    connect_args={"server_settings": {
+        "pg_trgm.word_similarity_threshold": str(settings.AUTOCOMPLETE_TRGM_THRESHOLD),
+    }},
 )
+instrument_engine(engine.sync_engine)
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -33,6 +38,9 @@ async def get_db() -> AsyncSession:
         try:
             yield session
             await session.commit()
+            # e.g. cache invalidations that must not run before the commit
+            for callback in session.info.pop("after_commit_async", ()):
+                await callback()
         except Exception:
             await session.rollback()
             raise
@@ -41,5 +49,12 @@ async def get_db() -> AsyncSession:
 
 
 async def init_db():
+    from app.services.search import install_search_trigger
+    from app.services.autocomplete import install_autocomplete_index
+    from app.services.categories import install_category_paths
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await install_search_trigger(conn)
+        await install_autocomplete_index(conn)
+        await install_category_paths(conn)
@@ -1,14 +1,24 @@
 """FastAPI application entry point."""
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 import os
 
 from app.config import get_settings
-from app.database import init_db
+from app.database import init_db, AsyncSessionLocal
 from app.core.exceptions import AppException, app_exception_handler, generic_exception_handler
+from app.core.query_stats import QueryStatsMiddleware
+from app.core.cache import cache
+from app.core.broker import broker
+from app.services.inventory import run_hold_sweeper
+from app.services.tracking import location_tracker
+from app.services.outbox import outbox_dispatcher
+from app.services.notifications import push_sender
+from app.services.prefix_index import load_prefix_index, run_prefix_index_refresher
 
 from app.api.v1.auth import router as auth_router
 from app.api.v1.users import router as users_router
@@ -40,8 +50,37 @@ async def lifespan(app: FastAPI):
     # Ensure upload directory exists
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
+    # Release stock held for abandoned online payments
+    tasks = [asyncio.create_task(run_hold_sweeper(AsyncSessionLocal))]
+
+    # Response cache invalidations from other workers
+    if settings.CACHE_ENABLED:
+        tasks.append(asyncio.create_task(cache.run_invalidation_listener()))
+
+    # WebSocket broadcasts from other workers
+    tasks.append(asyncio.create_task(broker.run()))
+
+    # Coalesced delivery partner locations
+    tasks.append(asyncio.create_task(location_tracker.run(AsyncSessionLocal)))
+
+    # Order events: WebSockets, push and email
+    tasks.append(asyncio.create_task(outbox_dispatcher.run(AsyncSessionLocal)))
+
+    # In-process autocomplete index
+    if settings.AUTOCOMPLETE_BACKEND == "memory":
+        async with AsyncSessionLocal() as db:
+            await load_prefix_index(db)
+        tasks.append(asyncio.create_task(run_prefix_index_refresher(AsyncSessionLocal)))
+
     yield
 
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await location_tracker.close(AsyncSessionLocal)
+    await cache.close()
+    await broker.close()
+    await push_sender.close()
     logger.info("Shutting down GroceryeCommerce API...")
 
 
@@ -52,6 +91,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS
@@ -61,8 +101,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Queries", "X-DB-Time", "ETag", "Last-Modified"],
 )
 
+# Per-request SQL statement counts and budget warnings
+app.add_middleware(QueryStatsMiddleware)
+
 # Exception handlers
 app.add_exception_handler(AppException, app_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
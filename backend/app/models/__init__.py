@@ -1,17 +1,20 @@
 from app.models.user import User, Address
 from app.models.vendor import Vendor, VendorDocument, StoreTimings
 from app.models.product import Product, ProductCategory, ProductVariant, ProductImage
-from app.models.order import Order, OrderItem, OrderStatusHistory
+from app.models.order import Order, OrderItem, OrderStatusHistory, InventoryHold, DailySalesRollup, CustomerStats
 from app.models.payment import Payment, Wallet, WalletTransaction, VendorPayout
 from app.models.review import Review
 from app.models.promotion import Promotion, Coupon
+from app.models.outbox import OutboxEvent
 
 __all__ = [
     "User", "Address",
     "Vendor", "VendorDocument", "StoreTimings",
     "Product", "ProductCategory", "ProductVariant", "ProductImage",
-    "Order", "OrderItem", "OrderStatusHistory",
+    "Order", "OrderItem", "OrderStatusHistory", "InventoryHold",
+    "DailySalesRollup", "CustomerStats",
     "Payment", "Wallet", "WalletTransaction", "VendorPayout",
     "Review",
     "Promotion", "Coupon",
+    "OutboxEvent",
 ]
@@ -1,8 +1,8 @@
-"""Order, OrderItem, OrderStatusHistory models."""
+"""Order, OrderItem, OrderStatusHistory, InventoryHold, DailySalesRollup, CustomerStats models."""
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from sqlalchemy import (
-    String, DateTime, Float, Text, Integer,
+    String, Date, DateTime, Float, Text, Integer,
     ForeignKey, Index, Enum as SAEnum,
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
@@ -31,6 +31,12 @@ class PaymentStatus(str, enum.Enum):
     COD = "cod"
 
 
+class HoldStatus(str, enum.Enum):
+    HELD = "held"
+    COMMITTED = "committed"
+    RELEASED = "released"
+
+
 class Order(Base):
     __tablename__ = "orders"
     __table_args__ = (
@@ -107,17 +113,19 @@ class Order(Base):
 
     # Relationships
     customer: Mapped["User"] = relationship(  # noqa: F821
-        back_populates="orders", foreign_keys=[customer_id]
+        back_populates="orders", foreign_keys=[customer_id], lazy="raise"
     )
-    vendor: Mapped["Vendor"] = relationship(lazy="selectin")  # noqa: F821
+    vendor: Mapped["Vendor"] = relationship(lazy="raise")  # noqa: F821
     items: Mapped[list["OrderItem"]] = relationship(
-        back_populates="order", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="order", cascade="all, delete-orphan",
+        passive_deletes=True, lazy="raise",
     )
     status_history: Mapped[list["OrderStatusHistory"]] = relationship(
-        back_populates="order", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="order", cascade="all, delete-orphan",
+        passive_deletes=True, lazy="raise",
     )
     payment: Mapped["Payment | None"] = relationship(  # noqa: F821
-        back_populates="order", uselist=False, lazy="selectin"
+        back_populates="order", uselist=False, passive_deletes=True, lazy="raise"
     )
 
 
@@ -155,8 +163,8 @@ class OrderItem(Base):
     )
 
     # Relationships
-    order: Mapped["Order"] = relationship(back_populates="items")
-    product: Mapped["Product"] = relationship(lazy="selectin")  # noqa: F821
+    order: Mapped["Order"] = relationship(back_populates="items", lazy="raise")
+    product: Mapped["Product"] = relationship(lazy="raise")  # noqa: F821
 
 
 class OrderStatusHistory(Base):
@@ -182,4 +190,80 @@ class OrderStatusHistory(Base):
         DateTime(timezone=True), default=datetime.utcnow
     )
 
-    order: Mapped["Order"] = relationship(back_populates="status_history")
+    order: Mapped["Order"] = relationship(back_populates="status_history", lazy="raise")
+
+
+class InventoryHold(Base):
+    """Stock reserved for an order that is still awaiting online payment.
+
+    The stock itself is already decremented; the hold records how much to
+    give back if payment does not arrive before ``expires_at``.
+    """
+    __tablename__ = "inventory_holds"
+    __table_args__ = (
+        Index("ix_inventory_holds_order_id", "order_id"),
+        Index("ix_inventory_holds_status_expires_at", "status", "expires_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    order_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("orders.id", ondelete="CASCADE"), nullable=False
+    )
+    product_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("products.id"), nullable=False
+    )
+    variant_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("product_variants.id"), nullable=True
+    )
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    status: Mapped[HoldStatus] = mapped_column(
+        SAEnum(HoldStatus), default=HoldStatus.HELD, nullable=False
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    resolved_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow
+    )
+
+
+class DailySalesRollup(Base):
+    """Order totals per creation day, vendor and current order status.
+
+    Kept in step with ``orders`` by ``app.services.rollups`` whenever an
+    order is placed or changes status; ``backfill_rollups.py`` rebuilds it.
+    """
+    __tablename__ = "daily_sales_rollup"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    vendor_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("vendors.id", ondelete="CASCADE"), primary_key=True
+    )
+    status: Mapped[OrderStatus] = mapped_column(SAEnum(OrderStatus), primary_key=True)
+    order_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    revenue: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    commission: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    discount: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+
+
+class CustomerStats(Base):
+    """Per-customer order count and delivered spend.
+
+    Maintained alongside ``DailySalesRollup`` by ``app.services.rollups``;
+    read by the admin customer list when ``CUSTOMER_STATS_SOURCE`` is
+    ``table``.
+    """
+    __tablename__ = "customer_stats"
+    __table_args__ = (
+        Index("ix_customer_stats_order_count", "order_count", "user_id"),
+        Index("ix_customer_stats_total_spent", "total_spent", "user_id"),
+    )
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    order_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    total_spent: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
@@ -0,0 +1,46 @@
+"""OutboxEvent model."""
+import uuid
+from datetime import datetime
+from sqlalchemy import String, DateTime, Integer, Text, Index, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class OutboxEvent(Base):
+    """An event written in the same transaction as the change it reports.
+
+    ``app.services.outbox`` relays pending events to their sinks
+    (WebSockets, push, email). ``id`` goes out with every delivery, so
+    consumers can drop the duplicates that at-least-once delivery allows.
+    """
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # The dispatcher only ever scans undispatched events
+        Index(
+            "ix_outbox_events_pending", "available_at",
+            postgresql_where=text("dispatched_at IS NULL"),
+        ),
+        Index("ix_outbox_events_dispatched_at", "dispatched_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    event_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    # No foreign key: events outlive the rows they describe
+    aggregate_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    # Sinks that already have this event, so a retry skips them
+    delivered: Mapped[list] = mapped_column(JSONB, nullable=False, default=list)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    available_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+    )
+    dispatched_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow
+    )
@@ -59,7 +59,9 @@ class Payment(Base):
         DateTime(timezone=True), default=datetime.utcnow
     )
 
-    order: Mapped["Order"] = relationship(back_populates="payment")  # noqa: F821
+    order: Mapped["Order"] = relationship(  # noqa: F821
+        back_populates="payment", lazy="raise"
+    )
 
 
 class Wallet(Base):
@@ -84,9 +86,12 @@ class Wallet(Base):
         DateTime(timezone=True), default=datetime.utcnow
     )
 
-    user: Mapped["User"] = relationship(back_populates="wallet")  # noqa: F821
+    user: Mapped["User"] = relationship(  # noqa: F821
+        back_populates="wallet", lazy="raise"
+    )
     transactions: Mapped[list["WalletTransaction"]] = relationship(
-        back_populates="wallet", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="wallet", cascade="all, delete-orphan",
+        passive_deletes=True, lazy="raise",
     )
 
 
@@ -112,7 +117,9 @@ class WalletTransaction(Base):
         DateTime(timezone=True), default=datetime.utcnow
     )
 
-    wallet: Mapped["Wallet"] = relationship(back_populates="transactions")
+    wallet: Mapped["Wallet"] = relationship(
+        back_populates="transactions", lazy="raise"
+    )
 
 
 class VendorPayout(Base):
@@ -148,4 +155,4 @@ class VendorPayout(Base):
         DateTime(timezone=True), default=datetime.utcnow
     )
 
-    vendor: Mapped["Vendor"] = relationship(lazy="selectin")  # noqa: F821
+    vendor: Mapped["Vendor"] = relationship(lazy="raise")  # noqa: F821
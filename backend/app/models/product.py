@@ -3,7 +3,7 @@ import uuid
 from datetime import datetime
 from sqlalchemy import (
     String, Boolean, DateTime, Float, Text, Integer,
-    ForeignKey, Index, Enum as SAEnum,
+    ForeignKey, Index, FetchedValue, Enum as SAEnum,
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -33,6 +33,7 @@ class ProductCategory(Base):
     __table_args__ = (
         Index("ix_product_categories_parent_id", "parent_id"),
         Index("ix_product_categories_slug", "slug", unique=True),
+        Index("ix_product_categories_path", "path"),
     )
 
     id: Mapped[uuid.UUID] = mapped_column(
@@ -48,19 +49,25 @@ class ProductCategory(Base):
     )
     sort_order: Mapped[int] = mapped_column(Integer, default=0)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Materialized path "<root id>/.../<own id>/", kept by a trigger
+    # (app.services.categories); C collation so a subtree is a range scan
+    path: Mapped[str | None] = mapped_column(
+        Text(collation="C"), nullable=True,
+        server_default=FetchedValue(), server_onupdate=FetchedValue(),
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.utcnow
     )
 
     # Self-referential relationship
     children: Mapped[list["ProductCategory"]] = relationship(
-        back_populates="parent", lazy="selectin"
+        back_populates="parent", lazy="raise"
     )
     parent: Mapped["ProductCategory | None"] = relationship(
-        back_populates="children", remote_side="ProductCategory.id", lazy="selectin"
+        back_populates="children", remote_side="ProductCategory.id", lazy="raise"
     )
     products: Mapped[list["Product"]] = relationship(
-        back_populates="category", lazy="selectin"
+        back_populates="category", lazy="raise"
     )
 
 
@@ -73,6 +80,8 @@ class Product(Base):
         Index("ix_products_slug", "slug"),
         Index("ix_products_price", "price"),
         Index("ix_products_search", "search_vector", postgresql_using="gin"),
+        # ix_products_name_trgm (GIN on lower(name)) needs pg_trgm and is
+        # created by app.services.autocomplete.install_autocomplete_index
     )
 
     id: Mapped[uuid.UUID] = mapped_column(
@@ -133,16 +142,22 @@ class Product(Base):
     )
 
     # Relationships
-    vendor: Mapped["Vendor"] = relationship(back_populates="products")  # noqa: F821
-    category: Mapped["ProductCategory"] = relationship(back_populates="products")
+    vendor: Mapped["Vendor"] = relationship(  # noqa: F821
+        back_populates="products", lazy="raise"
+    )
+    category: Mapped["ProductCategory"] = relationship(
+        back_populates="products", lazy="raise"
+    )
     variants: Mapped[list["ProductVariant"]] = relationship(
-        back_populates="product", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="product", cascade="all, delete-orphan",
+        passive_deletes=True, lazy="raise",
     )
     images: Mapped[list["ProductImage"]] = relationship(
-        back_populates="product", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="product", cascade="all, delete-orphan",
+        passive_deletes=True, lazy="raise",
     )
     reviews: Mapped[list["Review"]] = relationship(  # noqa: F821
-        back_populates="product", lazy="selectin"
+        back_populates="product", passive_deletes=True, lazy="raise"
     )
 
 
@@ -173,7 +188,7 @@ class ProductVariant(Base):
         DateTime(timezone=True), default=datetime.utcnow
     )
 
-    product: Mapped["Product"] = relationship(back_populates="variants")
+    product: Mapped["Product"] = relationship(back_populates="variants", lazy="raise")
 
 
 class ProductImage(Base):
@@ -196,4 +211,4 @@ class ProductImage(Base):
         DateTime(timezone=True), default=datetime.utcnow
     )
 
-    product: Mapped["Product"] = relationship(back_populates="images")
+    product: Mapped["Product"] = relationship(back_populates="images", lazy="raise")
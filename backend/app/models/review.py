@@ -46,5 +46,9 @@ class Review(Base):
         DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
-    user: Mapped["User"] = relationship(back_populates="reviews")  # noqa: F821
-    product: Mapped["Product"] = relationship(back_populates="reviews")  # noqa: F821
+    user: Mapped["User"] = relationship(  # noqa: F821
+        back_populates="reviews", lazy="raise"
+    )
+    product: Mapped["Product"] = relationship(  # noqa: F821
+        back_populates="reviews", lazy="raise"
+    )
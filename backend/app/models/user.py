@@ -47,16 +47,17 @@ class User(Base):
 
     # Relationships
     addresses: Mapped[list["Address"]] = relationship(
-        back_populates="user", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="user", cascade="all, delete-orphan",
+        passive_deletes=True, lazy="raise",
     )
     orders: Mapped[list["Order"]] = relationship(  # noqa: F821
-        back_populates="customer", foreign_keys="[Order.customer_id]", lazy="selectin"
+        back_populates="customer", foreign_keys="[Order.customer_id]", lazy="raise",
     )
     reviews: Mapped[list["Review"]] = relationship(  # noqa: F821
-        back_populates="user", lazy="selectin"
+        back_populates="user", lazy="raise"
     )
     wallet: Mapped["Wallet | None"] = relationship(  # noqa: F821
-        back_populates="user", uselist=False, lazy="selectin"
+        back_populates="user", uselist=False, passive_deletes=True, lazy="raise"
     )
 
 
@@ -85,4 +86,4 @@ class Address(Base):
     )
 
     # Relationships
-    user: Mapped["User"] = relationship(back_populates="addresses")
+    user: Mapped["User"] = relationship(back_populates="addresses", lazy="raise")
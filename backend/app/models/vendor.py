@@ -75,15 +75,17 @@ class Vendor(Base):
     )
 
     # Relationships
-    user: Mapped["User"] = relationship(lazy="selectin")  # noqa: F821
+    user: Mapped["User"] = relationship(lazy="raise")  # noqa: F821
     documents: Mapped[list["VendorDocument"]] = relationship(
-        back_populates="vendor", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="vendor", cascade="all, delete-orphan",
+        passive_deletes=True, lazy="raise",
     )
     store_timings: Mapped[list["StoreTimings"]] = relationship(
-        back_populates="vendor", cascade="all, delete-orphan", lazy="selectin"
+        back_populates="vendor", cascade="all, delete-orphan",
+        passive_deletes=True, lazy="raise",
     )
     products: Mapped[list["Product"]] = relationship(  # noqa: F821
-        back_populates="vendor", lazy="selectin"
+        back_populates="vendor", passive_deletes=True, lazy="raise"
     )
 
 
@@ -109,7 +111,7 @@ class VendorDocument(Base):
         DateTime(timezone=True), default=datetime.utcnow
     )
 
-    vendor: Mapped["Vendor"] = relationship(back_populates="documents")
+    vendor: Mapped["Vendor"] = relationship(back_populates="documents", lazy="raise")
 
 
 class StoreTimings(Base):
@@ -129,4 +131,4 @@ class StoreTimings(Base):
     close_time: Mapped[time] = mapped_column(Time, nullable=False)
     is_closed: Mapped[bool] = mapped_column(Boolean, default=False)
 
-    vendor: Mapped["Vendor"] = relationship(back_populates="store_timings")
+    vendor: Mapped["Vendor"] = relationship(back_populates="store_timings", lazy="raise")
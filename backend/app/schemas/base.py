@@ -1,9 +1,14 @@
 """Shared base schemas."""
+import base64
+import json
 from pydantic import BaseModel
-from typing import Optional, Generic, TypeVar
+from typing import Any, Callable, Optional, Generic, TypeVar
 from uuid import UUID
 from datetime import datetime
 
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+
 T = TypeVar("T")
 
 
@@ -16,10 +21,125 @@ class ResponseBase(BaseModel, Generic[T]):
 class PaginatedResponse(BaseModel, Generic[T]):
     success: bool = True
     data: list[T] = []
-    total: int = 0
+    total: Optional[int] = 0  # None when requested with include_total=false
     page: int = 1
     page_size: int = 20
-    total_pages: int = 0
+    total_pages: Optional[int] = 0
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+
+def page_count(total: Optional[int], page_size: int) -> Optional[int]:
+    return None if total is None else (total + page_size - 1) // page_size
+
+
+class Keyset:
+    """Keyset (cursor) pagination over ``ORDER BY sort_column, id_column``.
+
+    With a ``cursor`` the page starts strictly after the row it encodes, so
+    deep pages cost the same as the first and concurrent inserts cannot
+    shift rows between pages. Without one it falls back to ``page``/OFFSET
+    for existing clients; either way the response carries ``next_cursor``.
+
+    Usage::
+
+        keyset = Keyset(Order.created_at, Order.id, cursor=cursor, page=page, page_size=page_size)
+        rows = keyset.page((await db.execute(keyset.apply(query))).scalars().all())
+        PaginatedResponse(data=..., **keyset.meta())
+
+    Sort columns must be NOT NULL; ``id_column`` breaks ties. ``name``
+    labels a computed sort expression inside the cursor.
+    """
+
+    def __init__(
+        self, sort_column, id_column, descending: bool = True,
+        cursor: Optional[str] = None, page: int = 1, page_size: int = 20,
+        name: Optional[str] = None,
+    ):
+        self.sort_column = sort_column
+        self.id_column = id_column
+        self.descending = descending
+        self.page_number = page
+        self.page_size = page_size
+        self.next_cursor: Optional[str] = None
+        self.has_more = False
+        self._signature = [name or sort_column.key, descending]
+        self._after = self._decode(cursor) if cursor else None
+
+    def apply(self, query: Select) -> Select:
+        """Add the cursor predicate, ordering and limit (one extra row)."""
+        key = tuple_(self.sort_column, self.id_column)
+        if self._after is not None:
+            after = tuple_(*self._after)
+            query = query.where(key < after if self.descending else key > after)
+        elif self.page_number > 1:
+            query = query.offset((self.page_number - 1) * self.page_size)
+        if self.descending:
+            query = query.order_by(self.sort_column.desc(), self.id_column.desc())
+        else:
+            query = query.order_by(self.sort_column.asc(), self.id_column.asc())
+        return query.limit(self.page_size + 1)
+
+    def page(self, rows: list, key: Optional[Callable[[Any], tuple]] = None) -> list:
+        """Trim the look-ahead row and record ``next_cursor`` / ``has_more``.
+
+        ``key`` maps a row to its ``(sort value, id)``; by default both are
+        read as attributes named after the columns.
+        """
+        rows = list(rows)
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.has_more:
+            if key is None:
+                key = lambda row: (
+                    getattr(row, self.sort_column.key), getattr(row, self.id_column.key)
+                )
+            self.next_cursor = self._encode(key(rows[-1]))
+        return rows
+
+    def meta(self) -> dict:
+        return {"next_cursor": self.next_cursor, "has_more": self.has_more}
+
+    def _encode(self, values: tuple) -> str:
+        payload = json.dumps(
+            {"s": self._signature, "v": [_to_json(v) for v in values]},
+            separators=(",", ":"),
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def _decode(self, cursor: str) -> tuple:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded))
+            if payload["s"] != self._signature:
+                raise ValueError("cursor was issued for a different sort")
+            sort_value, id_value = payload["v"]
+            return (
+                _from_json(sort_value, self.sort_column),
+                _from_json(id_value, self.id_column),
+            )
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _from_json(value, column):
+    try:
+        python_type = column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is UUID:
+        return UUID(value)
+    return value
 
 
 class TimestampMixin(BaseModel):
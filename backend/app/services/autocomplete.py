@@ -0,0 +1,114 @@
+"""Product name autocomplete.
+
+The ``trigram`` backend matches normalized (lower-cased) names through a
+``pg_trgm`` GIN index, so both infix matches and typos ("tomoto" ->
+"tomato") are found without a table scan. Results are ranked:
+
+1. names starting with the query,
+2. names with a word starting with the query,
+3. everything else by ``word_similarity``,
+
+with ``total_sold`` breaking ties inside each group. The ``ilike`` backend
+is the plain substring search, for databases without ``pg_trgm``. The
+``memory`` backend answers word-prefix queries from the per-worker
+``app.services.prefix_index``.
+"""
+import re
+
+from sqlalchemy import select, func, literal, or_, text
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncConnection
+
+from app.config import get_settings
+from app.models.product import Product, ProductStatus
+
+settings = get_settings()
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Not declared on the model: it needs pg_trgm, which create_all cannot assume.
+_TRGM_INDEX_DDL = """
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+            CREATE INDEX IF NOT EXISTS ix_products_name_trgm
+                ON products USING gin (lower(name) gin_trgm_ops);
+        END IF;
+    END
+    $$
+"""
+
+
+def normalize_name(value: str) -> str:
+    """Lower-case and collapse whitespace; must match ``lower(name)`` in SQL."""
+    return _WHITESPACE.sub(" ", value).strip().lower()
+
+
+async def install_autocomplete_index(conn: AsyncConnection) -> None:
+    """Create the trigram index on ``lower(name)`` if pg_trgm is available."""
+    await conn.execute(text(_TRGM_INDEX_DDL))
+
+
+def _suggestion_columns():
+    return (Product.id, Product.name, Product.price, Product.unit_type)
+
+
+async def trigram_suggestions(db: AsyncSession, q: str, limit: int) -> list:
+    """Typo-tolerant suggestions; prefix matches rank above infix matches.
+
+    The ``<%`` operator uses ``pg_trgm.word_similarity_threshold``, which
+    the engine sets per connection from ``AUTOCOMPLETE_TRGM_THRESHOLD``.
+    """
+    term = normalize_name(q)
+    name = func.lower(Product.name)
+    is_prefix = name.startswith(term, autoescape=True)
+    has_word_prefix = (literal(" ") + name).contains(" " + term, autoescape=True)
+    similarity = func.word_similarity(term, name)
+
+    result = await db.execute(
+        select(*_suggestion_columns())
+        .where(
+            Product.status == ProductStatus.ACTIVE,
+            or_(
+                name.contains(term, autoescape=True),
+                literal(term).op("<%")(name),
+            ),
+        )
+        .order_by(
+            is_prefix.desc(),
+            has_word_prefix.desc(),
+            similarity.desc(),
+            Product.total_sold.desc(),
+        )
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def ilike_suggestions(db: AsyncSession, q: str, limit: int) -> list:
+    """Plain substring match, most sold first (no index; no typo tolerance)."""
+    result = await db.execute(
+        select(*_suggestion_columns())
+        .where(
+            Product.status == ProductStatus.ACTIVE,
+            Product.name.ilike(f"%{q}%"),
+        )
+        .order_by(Product.total_sold.desc())
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def suggest(db: AsyncSession, q: str, limit: int) -> list:
+    """Autocomplete rows (id, name, price, unit_type) from the configured backend."""
+    backend = settings.AUTOCOMPLETE_BACKEND
+    if backend == "memory":
+        from app.services.prefix_index import prefix_index
+
+        rows = prefix_index.search(q, limit)
+        # A capped index may be missing the long tail: fall back to SQL
+        if len(rows) == limit or not prefix_index.truncated:
+            return rows
+        backend = settings.AUTOCOMPLETE_FALLBACK_BACKEND
+    if backend == "ilike":
+        return await ilike_suggestions(db, q, limit)
+    return await trigram_suggestions(db, q, limit)
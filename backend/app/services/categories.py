@@ -0,0 +1,202 @@
+"""Category tree: materialized paths in Postgres, an immutable copy per worker.
+
+Every category stores ``path``, the ids from its root down to itself
+(``"<root>/<child>/<id>/"``). Triggers keep it current: inserts and
+``parent_id`` changes recompute the row's path, and a move rewrites the
+paths of the whole subtree. The column uses the C collation, so a subtree
+is the index range ``[path, path[:-1] + "0")`` and filtering products by
+it is a single indexed predicate.
+
+Reads of the tree itself are served from ``category_tree``: the full tree,
+loaded in one query into frozen nodes and reloaded when the
+``categories`` cache namespace is invalidated (category writes do this on
+commit) or after ``CATEGORY_TREE_MAX_AGE_SECONDS``.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping
+from uuid import UUID
+
+from sqlalchemy import and_, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import get_settings
+from app.core.cache import cache
+from app.models.product import ProductCategory
+
+settings = get_settings()
+
+_PATH_DDL = [
+    # Databases created before the column existed
+    'ALTER TABLE product_categories ADD COLUMN IF NOT EXISTS path text COLLATE "C"',
+    "CREATE INDEX IF NOT EXISTS ix_product_categories_path ON product_categories (path)",
+    """
+    CREATE OR REPLACE FUNCTION product_categories_path_set() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        parent_path text;
+    BEGIN
+        IF NEW.parent_id IS NULL THEN
+            NEW.path := NEW.id::text || '/';
+        ELSE
+            SELECT path INTO parent_path FROM product_categories WHERE id = NEW.parent_id;
+            IF position(NEW.id::text || '/' IN parent_path) > 0 THEN
+                RAISE EXCEPTION 'category % cannot be moved under its own subtree', NEW.id;
+            END IF;
+            NEW.path := parent_path || NEW.id::text || '/';
+        END IF;
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION product_categories_path_cascade() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF OLD.path IS NOT NULL AND NEW.path IS DISTINCT FROM OLD.path THEN
+            -- Only path is set here, so this does not re-fire the row trigger
+            UPDATE product_categories
+            SET path = NEW.path || substr(path, length(OLD.path) + 1)
+            WHERE path >= OLD.path AND path < left(OLD.path, -1) || '0'
+              AND id <> NEW.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE TRIGGER product_categories_path_set
+    BEFORE INSERT OR UPDATE OF parent_id ON product_categories
+    FOR EACH ROW EXECUTE FUNCTION product_categories_path_set()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER product_categories_path_cascade
+    AFTER UPDATE OF parent_id ON product_categories
+    FOR EACH ROW EXECUTE FUNCTION product_categories_path_cascade()
+    """,
+    # Fill rows written before the trigger (categories are few: one statement)
+    """
+    WITH RECURSIVE tree AS (
+        SELECT id, id::text || '/' AS path
+        FROM product_categories WHERE parent_id IS NULL
+        UNION ALL
+        SELECT c.id, tree.path || c.id::text || '/'
+        FROM product_categories c JOIN tree ON c.parent_id = tree.id
+    )
+    UPDATE product_categories AS c SET path = tree.path
+    FROM tree
+    WHERE c.id = tree.id AND c.path IS DISTINCT FROM tree.path
+    """,
+]
+
+
+async def install_category_paths(conn: AsyncConnection) -> None:
+    """Create (or replace) the path column, index and triggers; repair paths."""
+    for statement in _PATH_DDL:
+        await conn.execute(text(statement))
+
+
+def subtree_filter(path: str):
+    """Categories at or below the one whose path is ``path`` (an index range)."""
+    # "/" sorts right before "0" in the C collation
+    return and_(ProductCategory.path >= path, ProductCategory.path < path[:-1] + "0")
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryNode:
+    id: UUID
+    name: str
+    slug: str
+    description: str | None
+    icon_url: str | None
+    image_url: str | None
+    parent_id: UUID | None
+    sort_order: int
+    is_active: bool
+    created_at: datetime
+    path: str | None
+    children: tuple["CategoryNode", ...]
+
+
+class CategoryTree:
+    """Immutable snapshot of every category, children in ``sort_order``."""
+
+    def __init__(self, rows, generation: int):
+        self.generation = generation
+        self.loaded_at = time.monotonic()
+        by_parent: dict[UUID | None, list] = {}
+        for row in rows:
+            by_parent.setdefault(row.parent_id, []).append(row)
+        nodes: dict[UUID, CategoryNode] = {}
+
+        def build(row) -> CategoryNode:
+            node = CategoryNode(
+                id=row.id, name=row.name, slug=row.slug, description=row.description,
+                icon_url=row.icon_url, image_url=row.image_url, parent_id=row.parent_id,
+                sort_order=row.sort_order, is_active=row.is_active,
+                created_at=row.created_at, path=row.path,
+                children=tuple(build(child) for child in by_parent.get(row.id, ())),
+            )
+            nodes[node.id] = node
+            return node
+
+        # Rows unreachable from a root (a broken parent chain) are left out
+        self.roots: tuple[CategoryNode, ...] = tuple(build(row) for row in by_parent.get(None, ()))
+        self.nodes: Mapping[UUID, CategoryNode] = MappingProxyType(nodes)
+
+    def get(self, category_id: UUID) -> CategoryNode | None:
+        return self.nodes.get(category_id)
+
+    def children(self, parent_id: UUID | None) -> tuple[CategoryNode, ...]:
+        if parent_id is None:
+            return self.roots
+        node = self.nodes.get(parent_id)
+        return node.children if node else ()
+
+    def subtree_ids(self, category_id: UUID) -> set[UUID]:
+        """``category_id`` and all its descendants (empty if unknown)."""
+        node = self.nodes.get(category_id)
+        ids, stack = set(), [node] if node else []
+        while stack:
+            node = stack.pop()
+            ids.add(node.id)
+            stack.extend(node.children)
+        return ids
+
+
+class CategoryTreeCache:
+    """Per-worker ``CategoryTree``, reloaded when its generation moves on."""
+
+    namespace = "categories"
+
+    def __init__(self):
+        self._tree: CategoryTree | None = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self, generation: int) -> bool:
+        return (
+            self._tree is not None and self._tree.generation == generation
+            and time.monotonic() - self._tree.loaded_at < settings.CATEGORY_TREE_MAX_AGE_SECONDS
+        )
+
+    async def get(self, db: AsyncSession) -> CategoryTree:
+        generation = await cache.generation(self.namespace)
+        if self._fresh(generation):
+            return self._tree
+        async with self._lock:
+            # Another request may have reloaded while we waited
+            if not self._fresh(generation):
+                # The generation is read before loading, so an invalidation
+                # racing the load triggers another reload
+                result = await db.execute(
+                    select(ProductCategory.__table__)
+                    .order_by(ProductCategory.sort_order, ProductCategory.name)
+                )
+                self._tree = CategoryTree(result.all(), generation)
+        return self._tree
+
+
+category_tree = CategoryTreeCache()
@@ -0,0 +1,127 @@
+"""Admin dashboard figures.
+
+All headline numbers come from one aggregate query per table, using
+``FILTER (WHERE ...)`` clauses instead of a separate count/sum per figure;
+order figures read ``daily_sales_rollup`` rather than scanning ``orders``.
+The result is kept as a per-worker snapshot: fresh for
+``DASHBOARD_SNAPSHOT_TTL_SECONDS``, then served stale for up to
+``DASHBOARD_SNAPSHOT_STALE_SECONDS`` while one background task recomputes
+it, so admins refreshing the dashboard share a single computation.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.user import User, UserRole
+from app.models.vendor import Vendor, VendorStatus
+from app.models.order import DailySalesRollup, OrderStatus
+from app.models.product import Product, ProductStatus
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def compute_dashboard(db: AsyncSession) -> dict:
+    now = datetime.utcnow()
+    thirty_days_ago = now - timedelta(days=30)
+    seven_days_ago = now - timedelta(days=7)
+    is_customer = User.role == UserRole.CUSTOMER
+
+    users = (await db.execute(select(
+        func.count().label("total"),
+        func.count().filter(is_customer).label("customers"),
+        func.count().filter(is_customer, User.created_at >= thirty_days_ago).label("new_customers"),
+    ))).one()
+    vendors = (await db.execute(select(
+        func.count().label("total"),
+        func.count().filter(Vendor.status == VendorStatus.PENDING).label("pending"),
+        func.count().filter(Vendor.is_active == True).label("active"),
+    ))).one()
+    # Order figures come from the daily rollup, whole UTC days
+    month_start, week_start = thirty_days_ago.date(), seven_days_ago.date()
+    delivered = DailySalesRollup.status == OrderStatus.DELIVERED
+    order_count, revenue = DailySalesRollup.order_count, DailySalesRollup.revenue
+    orders = (await db.execute(select(
+        func.sum(order_count).label("total"),
+        func.sum(order_count).filter(DailySalesRollup.status == OrderStatus.PENDING).label("pending"),
+        func.sum(revenue).filter(delivered).label("revenue"),
+        func.sum(DailySalesRollup.commission).filter(delivered).label("commission"),
+        func.sum(revenue).filter(delivered, DailySalesRollup.day >= month_start).label("monthly_revenue"),
+        func.sum(order_count).filter(DailySalesRollup.day >= month_start).label("monthly_orders"),
+        func.sum(revenue).filter(delivered, DailySalesRollup.day >= week_start).label("weekly_revenue"),
+        func.sum(order_count).filter(DailySalesRollup.day >= week_start).label("weekly_orders"),
+    ))).one()
+    products = (await db.execute(select(
+        func.count().label("total"),
+        func.count().filter(
+            Product.stock_quantity <= Product.low_stock_threshold,
+            Product.status == ProductStatus.ACTIVE,
+        ).label("low_stock"),
+    ))).one()
+
+    return {
+        "total_users": users.total, "total_customers": users.customers,
+        "total_vendors": vendors.total, "active_vendors": vendors.active,
+        "pending_vendors": vendors.pending, "total_orders": orders.total or 0,
+        "pending_orders": orders.pending or 0, "total_revenue": float(orders.revenue or 0),
+        "total_commission": float(orders.commission or 0),
+        "monthly_revenue": float(orders.monthly_revenue or 0),
+        "monthly_orders": orders.monthly_orders or 0,
+        "weekly_revenue": float(orders.weekly_revenue or 0),
+        "weekly_orders": orders.weekly_orders or 0, "new_customers_30d": users.new_customers,
+        "total_products": products.total, "low_stock_count": products.low_stock,
+    }
+
+
+class DashboardSnapshot:
+    """Stale-while-revalidate holder for the dashboard figures."""
+
+    def __init__(self):
+        self.data: dict | None = None
+        self.computed_at: datetime | None = None
+        self._computed_mono = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh: asyncio.Task | None = None
+
+    def _age(self) -> float:
+        return time.monotonic() - self._computed_mono
+
+    async def get(self, db: AsyncSession) -> dict:
+        if self.data is not None:
+            age = self._age()
+            if age < settings.DASHBOARD_SNAPSHOT_TTL_SECONDS:
+                return self.data
+            if age < settings.DASHBOARD_SNAPSHOT_STALE_SECONDS:
+                if self._refresh is None or self._refresh.done():
+                    self._refresh = asyncio.create_task(self._revalidate())
+                return self.data
+        async with self._lock:
+            # Another request may have recomputed while we waited
+            if self.data is None or self._age() >= settings.DASHBOARD_SNAPSHOT_STALE_SECONDS:
+                self._store(await compute_dashboard(db))
+        return self.data
+
+    async def _revalidate(self) -> None:
+        from app.database import AsyncSessionLocal
+
+        try:
+            async with self._lock:
+                if self._age() < settings.DASHBOARD_SNAPSHOT_TTL_SECONDS:
+                    return
+                async with AsyncSessionLocal() as db:
+                    self._store(await compute_dashboard(db))
+        except Exception:
+            logger.exception("Dashboard snapshot refresh failed")
+
+    def _store(self, data: dict) -> None:
+        self.data = data
+        self.computed_at = datetime.utcnow()
+        self._computed_mono = time.monotonic()
+
+
+dashboard_snapshot = DashboardSnapshot()
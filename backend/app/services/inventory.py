@@ -0,0 +1,361 @@
+"""Stock reservation primitives and the inventory hold ledger.
+
+Stock is moved with conditional, set-based UPDATEs instead of
+read-check-write in Python, so concurrent checkouts on the same SKU cannot
+oversell. Rows are locked in primary-key order to keep multi-item carts
+from deadlocking one another.
+
+Orders paid online keep their stock under an ``InventoryHold`` until the
+payment is confirmed; ``run_hold_sweeper`` gives back stock from holds
+whose payment never arrived.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import text, select, update, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.order import (
+    Order, OrderStatus, OrderStatusHistory, PaymentStatus,
+    InventoryHold, HoldStatus,
+)
+from app.models.product import Product, ProductVariant
+from app.services.rollups import record_status_changes
+from app.services.outbox import record_order_events
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class StockLine:
+    product_id: UUID
+    quantity: int
+    variant_id: UUID | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class StockShortage:
+    product_id: UUID
+    variant_id: UUID | None
+    name: str
+    requested: int
+    available: int
+
+
+_RESERVE_PRODUCTS = text("""
+    WITH wanted AS (
+        SELECT * FROM unnest(CAST(:ids AS uuid[]), CAST(:qtys AS integer[])) AS w(id, qty)
+    ), locked AS (
+        SELECT p.id FROM products p JOIN wanted w ON w.id = p.id
+        ORDER BY p.id FOR UPDATE OF p
+    )
+    UPDATE products AS p
+    SET stock_quantity = CASE WHEN p.track_inventory
+                              THEN p.stock_quantity - w.qty
+                              ELSE p.stock_quantity END
+    FROM wanted w JOIN locked l ON l.id = w.id
+    WHERE p.id = w.id
+      AND (NOT p.track_inventory OR p.stock_quantity >= w.qty)
+    RETURNING p.id
+""")
+
+_RESERVE_VARIANTS = text("""
+    WITH wanted AS (
+        SELECT * FROM unnest(CAST(:ids AS uuid[]), CAST(:qtys AS integer[])) AS w(id, qty)
+    ), locked AS (
+        SELECT v.id FROM product_variants v JOIN wanted w ON w.id = v.id
+        ORDER BY v.id FOR UPDATE OF v
+    )
+    UPDATE product_variants AS v
+    SET stock_quantity = CASE WHEN p.track_inventory
+                              THEN v.stock_quantity - w.qty
+                              ELSE v.stock_quantity END
+    FROM wanted w JOIN locked l ON l.id = w.id, products p
+    WHERE v.id = w.id AND p.id = v.product_id
+      AND (NOT p.track_inventory OR v.stock_quantity >= w.qty)
+    RETURNING v.id
+""")
+
+_RELEASE_PRODUCTS = text("""
+    UPDATE products AS p
+    SET stock_quantity = p.stock_quantity + w.qty
+    FROM unnest(CAST(:ids AS uuid[]), CAST(:qtys AS integer[])) AS w(id, qty)
+    WHERE p.id = w.id AND p.track_inventory
+""")
+
+_RELEASE_VARIANTS = text("""
+    UPDATE product_variants AS v
+    SET stock_quantity = v.stock_quantity + w.qty
+    FROM unnest(CAST(:ids AS uuid[]), CAST(:qtys AS integer[])) AS w(id, qty), products p
+    WHERE v.id = w.id AND p.id = v.product_id AND p.track_inventory
+""")
+
+
+def _totals(lines: list[StockLine]) -> tuple[dict[UUID, int], dict[UUID, int]]:
+    """Sum quantities per product and per variant (a cart may repeat a SKU)."""
+    products: dict[UUID, int] = {}
+    variants: dict[UUID, int] = {}
+    for line in lines:
+        products[line.product_id] = products.get(line.product_id, 0) + line.quantity
+        if line.variant_id:
+            variants[line.variant_id] = variants.get(line.variant_id, 0) + line.quantity
+    return products, variants
+
+
+def _params(totals: dict[UUID, int]) -> dict:
+    ids = sorted(totals)
+    return {"ids": ids, "qtys": [totals[i] for i in ids]}
+
+
+async def reserve_stock(db: AsyncSession, lines: list[StockLine]) -> list[StockShortage]:
+    """Atomically decrement stock for every line, or for none of them.
+
+    Runs inside a SAVEPOINT: if any product or variant is short the
+    savepoint is rolled back and the shortages are returned, leaving the
+    surrounding transaction untouched so the caller can retry or report.
+    An empty list means everything was reserved.
+    """
+    products, variants = _totals(lines)
+    if not products:
+        return []
+
+    savepoint = await db.begin_nested()
+    reserved_products = set(
+        (await db.execute(_RESERVE_PRODUCTS, _params(products))).scalars()
+    )
+    reserved_variants: set[UUID] = set()
+    if variants:
+        reserved_variants = set(
+            (await db.execute(_RESERVE_VARIANTS, _params(variants))).scalars()
+        )
+
+    short_products = [pid for pid in products if pid not in reserved_products]
+    short_variants = [vid for vid in variants if vid not in reserved_variants]
+    if not short_products and not short_variants:
+        await savepoint.commit()
+        return []
+
+    await savepoint.rollback()
+    return await _describe_shortages(
+        db, products, variants, short_products, short_variants
+    )
+
+
+async def release_stock(db: AsyncSession, lines: list[StockLine]) -> None:
+    """Return previously reserved stock (cancellations, expired holds)."""
+    products, variants = _totals(lines)
+    if products:
+        await db.execute(_RELEASE_PRODUCTS, _params(products))
+    if variants:
+        await db.execute(_RELEASE_VARIANTS, _params(variants))
+
+
+async def _describe_shortages(
+    db: AsyncSession,
+    products: dict[UUID, int],
+    variants: dict[UUID, int],
+    short_products: list[UUID],
+    short_variants: list[UUID],
+) -> list[StockShortage]:
+    shortages = []
+    if short_products:
+        result = await db.execute(
+            select(Product.id, Product.name, Product.stock_quantity)
+            .where(Product.id.in_(short_products))
+        )
+        found = {r.id: r for r in result.all()}
+        for pid in short_products:
+            row = found.get(pid)
+            shortages.append(StockShortage(
+                product_id=pid, variant_id=None,
+                name=row.name if row else str(pid),
+                requested=products[pid],
+                available=row.stock_quantity if row else 0,
+            ))
+    if short_variants:
+        result = await db.execute(
+            select(
+                ProductVariant.id, ProductVariant.product_id, Product.name.label("product_name"),
+                ProductVariant.name, ProductVariant.stock_quantity,
+            )
+            .join(Product, Product.id == ProductVariant.product_id)
+            .where(ProductVariant.id.in_(short_variants))
+        )
+        found = {r.id: r for r in result.all()}
+        for vid in short_variants:
+            row = found.get(vid)
+            shortages.append(StockShortage(
+                product_id=row.product_id if row else vid, variant_id=vid,
+                name=f"{row.product_name} ({row.name})" if row else str(vid),
+                requested=variants[vid],
+                available=row.stock_quantity if row else 0,
+            ))
+    return shortages
+
+
+# --- Holds ---
+
+async def place_holds(db: AsyncSession, order_id: UUID, lines: list[StockLine]) -> None:
+    """Record already-reserved stock as held for ``order_id`` until paid."""
+    expires_at = datetime.utcnow() + timedelta(minutes=settings.INVENTORY_HOLD_TTL_MINUTES)
+    await db.execute(insert(InventoryHold).values([
+        {
+            "order_id": order_id,
+            "product_id": line.product_id,
+            "variant_id": line.variant_id,
+            "quantity": line.quantity,
+            "status": HoldStatus.HELD,
+            "expires_at": expires_at,
+        }
+        for line in lines
+    ]))
+
+
+async def commit_holds(db: AsyncSession, order_id: UUID) -> bool:
+    """Turn an order's holds into a permanent deduction once it is paid.
+
+    Returns False if the order had holds but they were already released
+    (payment arrived after expiry); the stock is no longer reserved.
+    """
+    committed = await db.execute(
+        update(InventoryHold)
+        .where(InventoryHold.order_id == order_id, InventoryHold.status == HoldStatus.HELD)
+        .values(status=HoldStatus.COMMITTED, resolved_at=datetime.utcnow())
+        .returning(InventoryHold.id)
+    )
+    if committed.first() is not None:
+        return True
+    released = await db.execute(
+        select(InventoryHold.id).where(
+            InventoryHold.order_id == order_id,
+            InventoryHold.status == HoldStatus.RELEASED,
+        ).limit(1)
+    )
+    return released.first() is None
+
+
+async def drop_holds(db: AsyncSession, order_id: UUID) -> None:
+    """Mark an order's open holds released without touching stock.
+
+    For callers that return the stock themselves (order cancellation), so
+    the sweeper does not return it a second time.
+    """
+    await db.execute(
+        update(InventoryHold)
+        .where(InventoryHold.order_id == order_id, InventoryHold.status == HoldStatus.HELD)
+        .values(status=HoldStatus.RELEASED, resolved_at=datetime.utcnow())
+    )
+
+
+async def release_expired_holds(db: AsyncSession, batch_size: int) -> int:
+    """Resolve one batch of expired holds, cancelling their unpaid orders.
+
+    Stock goes back only for orders that are not going ahead: those
+    cancelled here (still pending and unpaid) and those already cancelled
+    elsewhere. Holds of orders that moved on (e.g. confirmed before the
+    payment arrived) are committed, so their stock stays deducted.
+
+    Holds and their orders are claimed with ``FOR UPDATE SKIP LOCKED``, so
+    sweepers in several workers split the backlog instead of contending
+    for it, and an order locked by a request (cancel, payment, status
+    change) is left for the next run rather than waited on. Requests lock
+    the order before its holds; never waiting here keeps the two from
+    deadlocking. Returns the number of holds claimed.
+    """
+    now = datetime.utcnow()
+    claimed = (await db.execute(
+        select(
+            InventoryHold.id, InventoryHold.order_id, InventoryHold.product_id,
+            InventoryHold.variant_id, InventoryHold.quantity, Order.status,
+        )
+        .join(Order, Order.id == InventoryHold.order_id)
+        .where(InventoryHold.status == HoldStatus.HELD, InventoryHold.expires_at < now)
+        .order_by(InventoryHold.expires_at)
+        .limit(batch_size)
+        .with_for_update(of=(InventoryHold, Order), skip_locked=True)
+    )).all()
+    if not claimed:
+        return 0
+
+    order_ids = list({r.order_id for r in claimed})
+    cancelled = await db.execute(
+        update(Order)
+        .where(
+            Order.id.in_(order_ids),
+            Order.status == OrderStatus.PENDING,
+            Order.payment_status == PaymentStatus.PENDING,
+        )
+        .values(
+            status=OrderStatus.CANCELLED,
+            payment_status=PaymentStatus.FAILED,
+            cancellation_reason="Payment not completed in time",
+        )
+        .returning(
+            Order.id, Order.order_number, Order.vendor_id, Order.customer_id, Order.created_at,
+            Order.total_amount, Order.commission_amount, Order.discount_amount,
+        )
+    )
+    cancelled_orders = cancelled.all()
+
+    stopped = {o.id for o in cancelled_orders}
+    stopped |= {r.order_id for r in claimed if r.status == OrderStatus.CANCELLED}
+    released = [r for r in claimed if r.order_id in stopped]
+    kept = [r.id for r in claimed if r.order_id not in stopped]
+    if released:
+        await db.execute(
+            update(InventoryHold)
+            .where(InventoryHold.id.in_([r.id for r in released]))
+            .values(status=HoldStatus.RELEASED, resolved_at=now)
+        )
+        await release_stock(db, [
+            StockLine(r.product_id, r.quantity, r.variant_id) for r in released
+        ])
+    if kept:
+        await db.execute(
+            update(InventoryHold)
+            .where(InventoryHold.id.in_(kept))
+            .values(status=HoldStatus.COMMITTED, resolved_at=now)
+        )
+
+    if cancelled_orders:
+        await db.execute(insert(OrderStatusHistory).values([
+            {
+                "order_id": o.id,
+                "status": OrderStatus.CANCELLED,
+                "note": "Payment not completed in time; stock released",
+            }
+            for o in cancelled_orders
+        ]))
+        await record_status_changes(
+            db, cancelled_orders, OrderStatus.PENDING, OrderStatus.CANCELLED,
+        )
+        await record_order_events(
+            db, cancelled_orders, OrderStatus.CANCELLED, "Payment not completed in time",
+        )
+    return len(claimed)
+
+
+async def run_hold_sweeper(session_factory) -> None:
+    """Background loop: resolve expired holds in batches until cancelled."""
+    interval = settings.INVENTORY_HOLD_SWEEP_INTERVAL_SECONDS
+    batch_size = settings.INVENTORY_HOLD_SWEEP_BATCH_SIZE
+    while True:
+        try:
+            while True:
+                async with session_factory() as db:
+                    async with db.begin():
+                        resolved = await release_expired_holds(db, batch_size)
+                if resolved:
+                    logger.info("Resolved %d expired inventory holds", resolved)
+                if resolved < batch_size:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Inventory hold sweep failed")
+        await asyncio.sleep(interval)
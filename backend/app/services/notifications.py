@@ -0,0 +1,120 @@
+"""Push (Firebase Cloud Messaging) and email transports.
+
+Both are off until configured: push needs ``FIREBASE_CREDENTIALS_PATH``
+(a service account JSON file), email needs ``SMTP_HOST``. Callers check
+``enabled`` and treat a disabled transport as delivered.
+
+Push uses the FCM HTTP v1 API directly: the service account signs a JWT
+that is exchanged for an OAuth access token, cached until shortly before
+it expires. Email goes through ``smtplib`` on a worker thread.
+"""
+import asyncio
+import json
+import smtplib
+import time
+from email.message import EmailMessage
+
+import httpx
+from jose import jwt
+
+from app.config import get_settings
+
+settings = get_settings()
+
+_FCM_SCOPE = "https://www.googleapis.com/auth/firebase.messaging"
+_TOKEN_URL = "https://oauth2.googleapis.com/token"
+_TIMEOUT_SECONDS = 10
+
+
+class PushSender:
+    def __init__(self, credentials_path: str | None):
+        self.credentials_path = credentials_path
+        self._account: dict | None = None
+        self._token: str | None = None
+        self._token_expires = 0.0
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.credentials_path)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=_TIMEOUT_SECONDS)
+        return self._client
+
+    async def _access_token(self) -> str:
+        if self._token and time.time() < self._token_expires - 60:
+            return self._token
+        if self._account is None:
+            with open(self.credentials_path) as f:
+                self._account = json.load(f)
+        now = int(time.time())
+        assertion = jwt.encode(
+            {
+                "iss": self._account["client_email"], "scope": _FCM_SCOPE,
+                "aud": _TOKEN_URL, "iat": now, "exp": now + 3600,
+            },
+            self._account["private_key"], algorithm="RS256",
+        )
+        response = await self.client.post(_TOKEN_URL, data={
+            "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+            "assertion": assertion,
+        })
+        response.raise_for_status()
+        body = response.json()
+        self._token, self._token_expires = body["access_token"], now + body["expires_in"]
+        return self._token
+
+    async def send(self, device_token: str, title: str, body: str, data: dict) -> None:
+        """Send one notification; ``data`` values must be strings."""
+        token = await self._access_token()
+        response = await self.client.post(
+            f"https://fcm.googleapis.com/v1/projects/{self._account['project_id']}/messages:send",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"message": {
+                "token": device_token,
+                "notification": {"title": title, "body": body},
+                "data": data,
+            }},
+        )
+        if response.status_code == 404:
+            return  # token no longer registered; a retry cannot succeed
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class EmailSender:
+    def __init__(self, host: str | None):
+        self.host = host
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.host)
+
+    def _send(self, message: EmailMessage) -> None:
+        with smtplib.SMTP(self.host, settings.SMTP_PORT, timeout=_TIMEOUT_SECONDS) as smtp:
+            smtp.starttls()
+            if settings.SMTP_USER:
+                smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD or "")
+            smtp.send_message(message)
+
+    async def send(self, to: str, subject: str, body: str, message_id: str | None = None) -> None:
+        """Send a plain-text email; a stable ``message_id`` lets mail clients drop resends."""
+        message = EmailMessage()
+        message["From"] = settings.FROM_EMAIL
+        message["To"] = to
+        message["Subject"] = subject
+        if message_id:
+            message["Message-ID"] = message_id
+        message.set_content(body)
+        await asyncio.to_thread(self._send, message)
+
+
+push_sender = PushSender(settings.FIREBASE_CREDENTIALS_PATH)
+email_sender = EmailSender(settings.SMTP_HOST)
@@ -0,0 +1,281 @@
+"""Transactional outbox for order events.
+
+Order status changes call ``record_order_event`` (``record_order_events``
+for set-based changes), which writes an ``OutboxEvent`` in the same
+transaction: the event exists exactly when the change committed. The
+request path sends nothing; a commit only wakes this worker's dispatcher.
+
+``outbox_dispatcher`` claims pending events in batches with ``FOR UPDATE
+SKIP LOCKED`` (workers share the backlog without double-claiming), leases
+them for ``OUTBOX_LEASE_SECONDS`` and commits, so no lock or connection
+is held while it hands each event to every sink: the WebSocket channels,
+a push notification and an email to the customer. A second short
+transaction records the outcome. Sinks that succeeded are recorded on the
+event, so a retry only repeats the failed ones, with exponential backoff
+up to ``OUTBOX_MAX_ATTEMPTS``. Delivery is at-least-once; every message carries
+``event_id`` for consumers to deduplicate. Events of one order are
+delivered in order within a batch.
+
+Dispatched events are purged after ``OUTBOX_RETENTION_HOURS``.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import bindparam, delete, event, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.websockets import notify_order_update, notify_vendor_new_order
+from app.config import get_settings
+from app.models.order import OrderStatus
+from app.models.outbox import OutboxEvent
+from app.models.user import User
+from app.services.notifications import email_sender, push_sender
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+ORDER_PLACED = "order_placed"
+ORDER_STATUS = "order_status"
+
+# Statuses the customer is told about by push and email: (title, body)
+_CUSTOMER_MESSAGES = {
+    OrderStatus.PENDING: ("Order placed", "We have received your order {order_number}."),
+    OrderStatus.CONFIRMED: ("Order confirmed", "Your order {order_number} has been confirmed."),
+    OrderStatus.OUT_FOR_DELIVERY: ("Out for delivery", "Your order {order_number} is on its way."),
+    OrderStatus.DELIVERED: ("Order delivered", "Your order {order_number} has been delivered."),
+    OrderStatus.CANCELLED: ("Order cancelled", "Your order {order_number} has been cancelled."),
+}
+
+
+def _order_event(order, status: OrderStatus, note: str | None, event_type: str) -> dict:
+    """Column values for an order's event; ``order`` may be a row with the same attributes."""
+    return {
+        "event_type": event_type,
+        "aggregate_id": order.id,
+        "payload": {
+            "order_id": str(order.id),
+            "order_number": order.order_number,
+            "vendor_id": str(order.vendor_id),
+            "customer_id": str(order.customer_id),
+            "status": status.value,
+            "note": note,
+            "total_amount": order.total_amount,
+            "occurred_at": datetime.utcnow().isoformat(),
+        },
+    }
+
+
+def record_order_event(
+    db: AsyncSession, order, status: OrderStatus, note: str | None = None,
+    event_type: str = ORDER_STATUS,
+) -> None:
+    db.add(OutboxEvent(**_order_event(order, status, note, event_type)))
+    outbox_dispatcher.wake_on_commit(db)
+
+
+async def record_order_events(
+    db: AsyncSession, orders: Iterable, status: OrderStatus, note: str | None = None,
+) -> None:
+    """One multi-row INSERT for a set-based status change."""
+    values = [_order_event(order, status, note, ORDER_STATUS) for order in orders]
+    if values:
+        await db.execute(insert(OutboxEvent).values(values))
+        outbox_dispatcher.wake_on_commit(db)
+
+
+class OutboxDispatcher:
+    sinks = ("websocket", "push", "email")
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+
+    def wake(self, session=None) -> None:
+        self._wakeup.set()
+
+    def wake_on_commit(self, db: AsyncSession) -> None:
+        if not event.contains(db.sync_session, "after_commit", self.wake):
+            event.listen(db.sync_session, "after_commit", self.wake, once=True)
+
+    async def _recipients(self, db: AsyncSession, events: list[OutboxEvent]) -> dict:
+        if not (push_sender.enabled or email_sender.enabled):
+            return {}
+        ids = {UUID(e.payload["customer_id"]) for e in events}
+        result = await db.execute(
+            select(User.id, User.email, User.full_name, User.firebase_token)
+            .where(User.id.in_(ids))
+        )
+        return {str(row.id): row for row in result.all()}
+
+    async def _to_websocket(self, outbox_event: OutboxEvent, recipient) -> None:
+        p = outbox_event.payload
+        event_id = str(outbox_event.id)
+        # strict: a broker outage fails the sink, so the event is retried
+        await notify_order_update(p["order_id"], p["status"], {
+            "event_id": event_id, "order_number": p["order_number"],
+            "note": p["note"], "occurred_at": p["occurred_at"],
+        }, strict=True)
+        if outbox_event.event_type == ORDER_PLACED:
+            await notify_vendor_new_order(p["vendor_id"], {
+                "event_id": event_id, "order_id": p["order_id"],
+                "order_number": p["order_number"], "total_amount": p["total_amount"],
+                "occurred_at": p["occurred_at"],
+            }, strict=True)
+
+    async def _to_push(self, outbox_event: OutboxEvent, recipient) -> None:
+        p = outbox_event.payload
+        message = _CUSTOMER_MESSAGES.get(OrderStatus(p["status"]))
+        if not (push_sender.enabled and message and recipient and recipient.firebase_token):
+            return
+        title, body = message
+        await push_sender.send(recipient.firebase_token, title, body.format(**p), {
+            "event_id": str(outbox_event.id), "order_id": p["order_id"], "status": p["status"],
+        })
+
+    async def _to_email(self, outbox_event: OutboxEvent, recipient) -> None:
+        p = outbox_event.payload
+        message = _CUSTOMER_MESSAGES.get(OrderStatus(p["status"]))
+        if not (email_sender.enabled and message and recipient):
+            return
+        title, body = message
+        domain = settings.FROM_EMAIL.rpartition("@")[2]
+        await email_sender.send(
+            recipient.email, f"{title}: {p['order_number']}",
+            f"Hi {recipient.full_name},\n\n{body.format(**p)}\n",
+            message_id=f"<{outbox_event.id}@{domain}>",
+        )
+
+    async def _deliver(self, outbox_event: OutboxEvent, recipient) -> None:
+        errors = []
+        for sink in self.sinks:
+            if sink in outbox_event.delivered:
+                continue
+            try:
+                await getattr(self, f"_to_{sink}")(outbox_event, recipient)
+            except Exception as exc:
+                errors.append(f"{sink}: {exc!r}")
+                continue
+            outbox_event.delivered = [*outbox_event.delivered, sink]
+
+        # attempts was counted when the event was claimed
+        now = datetime.utcnow()
+        outbox_event.last_error = "; ".join(errors) or None
+        if not errors:
+            outbox_event.dispatched_at = now
+        elif outbox_event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            outbox_event.dispatched_at = now
+            logger.error(
+                "Giving up on outbox event %s after %d attempts: %s",
+                outbox_event.id, outbox_event.attempts, outbox_event.last_error,
+            )
+        else:
+            delay = min(
+                settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** (outbox_event.attempts - 1),
+                settings.OUTBOX_RETRY_MAX_SECONDS,
+            )
+            outbox_event.available_at = now + timedelta(seconds=delay)
+            logger.warning(
+                "Outbox event %s failed (attempt %d), retrying in %.0fs: %s",
+                outbox_event.id, outbox_event.attempts, delay, outbox_event.last_error,
+            )
+
+    async def _deliver_in_order(self, events: list[OutboxEvent], recipients: dict) -> None:
+        for outbox_event in events:
+            await self._deliver(outbox_event, recipients.get(outbox_event.payload["customer_id"]))
+
+    async def _claim(self, session_factory) -> tuple[list[OutboxEvent], dict]:
+        """Lease due events to this worker; committed before any delivery."""
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            async with db.begin():
+                result = await db.execute(
+                    select(OutboxEvent)
+                    .where(
+                        OutboxEvent.dispatched_at.is_(None),
+                        OutboxEvent.available_at <= now,
+                    )
+                    .order_by(OutboxEvent.created_at)
+                    .limit(settings.OUTBOX_BATCH_SIZE)
+                    .with_for_update(skip_locked=True)
+                )
+                events = result.scalars().all()
+                if not events:
+                    return [], {}
+                # Counting the attempt here caps events that crash the worker
+                lease = now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+                for outbox_event in events:
+                    outbox_event.attempts += 1
+                    outbox_event.available_at = lease
+                recipients = await self._recipients(db, events)
+        return events, recipients
+
+    async def _record(self, session_factory, events: list[OutboxEvent]) -> None:
+        table = OutboxEvent.__table__
+        async with session_factory() as db:
+            async with db.begin():
+                await db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("event_id"))
+                    .values(
+                        delivered=bindparam("delivered"),
+                        last_error=bindparam("last_error"),
+                        available_at=bindparam("available_at"),
+                        dispatched_at=bindparam("dispatched_at"),
+                    ),
+                    [
+                        {
+                            "event_id": e.id, "delivered": e.delivered, "last_error": e.last_error,
+                            "available_at": e.available_at, "dispatched_at": e.dispatched_at,
+                        }
+                        for e in events
+                    ],
+                )
+
+    async def dispatch_batch(self, session_factory) -> int:
+        """Deliver up to ``OUTBOX_BATCH_SIZE`` due events; returns how many were claimed."""
+        events, recipients = await self._claim(session_factory)
+        if not events:
+            return 0
+        # Orders in parallel, each order's events one after another
+        by_order: dict[UUID, list[OutboxEvent]] = {}
+        for outbox_event in events:
+            by_order.setdefault(outbox_event.aggregate_id, []).append(outbox_event)
+        await asyncio.gather(*(
+            self._deliver_in_order(group, recipients) for group in by_order.values()
+        ))
+        await self._record(session_factory, events)
+        return len(events)
+
+    async def purge(self, session_factory) -> None:
+        cutoff = datetime.utcnow() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+        async with session_factory() as db:
+            async with db.begin():
+                await db.execute(delete(OutboxEvent).where(OutboxEvent.dispatched_at < cutoff))
+
+    async def run(self, session_factory) -> None:
+        """Background loop: dispatch when woken by a commit, or every poll interval."""
+        purged_at = 0.0
+        while True:
+            try:
+                while await self.dispatch_batch(session_factory) >= settings.OUTBOX_BATCH_SIZE:
+                    pass
+                if time.monotonic() - purged_at >= 3600:
+                    purged_at = time.monotonic()
+                    await self.purge(session_factory)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), settings.OUTBOX_POLL_INTERVAL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,261 @@
+"""In-process prefix index for product autocomplete.
+
+Each worker keeps a sorted array of normalized name keys (one per word
+start, so "apple" finds "green apple") alongside the product's popularity
+weight. A prefix query is two bisects plus a top-k over the matching
+slice (cached for prefixes that match many keys), so suggestions are
+served without touching Postgres.
+
+The index is built at startup, patched from product writes once their
+transaction commits, and rebuilt periodically to pick up writes handled
+by other workers and changes in ``total_sold``.
+"""
+import asyncio
+import bisect
+import heapq
+import logging
+import sys
+from typing import NamedTuple
+from uuid import UUID
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.product import Product, ProductStatus, UnitType
+from app.services.autocomplete import normalize_name
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Prefixes whose slice of the key array is longer than this have their
+# top-k cached; writes patch or drop the cached lists they affect.
+_SCAN_LIMIT = 256
+# Longest list kept per prefix; the endpoint caps ``limit`` at 20.
+_TOP_K = 20
+# Bound on cached prefixes (the cache is cleared when it overflows).
+_MAX_CACHED_PREFIXES = 50_000
+# Whole-name matches outrank mid-name word matches of any popularity.
+_WHOLE_NAME_BONUS = 1 << 48
+
+
+class Suggestion(NamedTuple):
+    id: UUID
+    name: str
+    price: float
+    unit_type: UnitType
+    weight: int
+
+
+class PrefixIndex:
+    """Sorted-array prefix index with popularity-ranked top-k lookups.
+
+    ``_entries`` holds one ``(key, rank, product_id)`` tuple per word start
+    of each name, sorted by key, so a prefix selects a contiguous slice via
+    bisect. ``rank`` folds "whole name starts here" and the popularity
+    weight into one int so the slice can be ranked without Python-level
+    key functions.
+
+    ``max_entries`` bounds memory: past it the least popular product is
+    evicted, and ``truncated`` tells callers the long tail may be missing.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.truncated = False
+        self._entries: list[tuple[str, int, UUID]] = []
+        self._items: dict[UUID, Suggestion] = {}
+        self._top: dict[str, list[UUID]] = {}  # prefix -> best ids first
+        self._by_weight: list[tuple[int, UUID]] = []  # eviction min-heap (lazy)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @staticmethod
+    def _item_entries(item: Suggestion) -> list[tuple[str, int, UUID]]:
+        """``"red ripe tomato"`` -> keys ``"red ripe tomato"``, ``"ripe tomato"``, ``"tomato"``."""
+        words = normalize_name(item.name).split(" ")
+        return [
+            (" ".join(words[i:]), item.weight + (_WHOLE_NAME_BONUS if i == 0 else 0), item.id)
+            for i in range(len(words)) if words[i]
+        ]
+
+    def build(self, items: list[Suggestion]) -> None:
+        """Replace the contents; keeps the ``max_entries`` most popular items."""
+        items = sorted(items, key=lambda s: s.weight, reverse=True)
+        self.truncated = len(items) > self.max_entries
+        items = items[:self.max_entries]
+        self._entries = sorted(e for item in items for e in self._item_entries(item))
+        self._items = {item.id: item for item in items}
+        self._by_weight = [(item.weight, item.id) for item in items]
+        heapq.heapify(self._by_weight)
+        self._top = {}
+
+    def upsert(self, item: Suggestion) -> None:
+        self.remove(item.id)
+        if len(self._items) >= self.max_entries:
+            weakest = self._weakest()
+            if weakest is None or weakest.weight >= item.weight:
+                self.truncated = True
+                return
+            self.remove(weakest.id)
+            self.truncated = True
+        self._items[item.id] = item
+        heapq.heappush(self._by_weight, (item.weight, item.id))
+        for entry in self._item_entries(item):
+            bisect.insort(self._entries, entry)
+            self._patch_top(entry)
+
+    def remove(self, product_id: UUID) -> None:
+        item = self._items.pop(product_id, None)
+        if item is None:
+            return
+        for entry in self._item_entries(item):
+            pos = bisect.bisect_left(self._entries, entry)
+            if pos < len(self._entries) and self._entries[pos] == entry:
+                del self._entries[pos]
+            key = entry[0]
+            for n in range(1, len(key) + 1):
+                ids = self._top.get(key[:n])
+                if ids is not None and product_id in ids:
+                    # The next-best id is unknown: rebuild on next lookup
+                    del self._top[key[:n]]
+
+    def _weakest(self) -> Suggestion | None:
+        while self._by_weight:
+            weight, product_id = self._by_weight[0]
+            item = self._items.get(product_id)
+            if item is not None and item.weight == weight:
+                return item
+            heapq.heappop(self._by_weight)  # stale: removed or re-weighted
+        return None
+
+    def _patch_top(self, entry: tuple[str, int, UUID]) -> None:
+        """Slot a new entry into every cached list for a prefix of its key."""
+        key, rank, product_id = entry
+        for n in range(1, len(key) + 1):
+            ids = self._top.get(key[:n])
+            if ids is None or product_id in ids:
+                continue
+            ranks = [self._best_rank(key[:n], i) for i in ids]
+            pos = len(ranks)
+            while pos > 0 and ranks[pos - 1] < rank:
+                pos -= 1
+            if pos < _TOP_K:
+                ids.insert(pos, product_id)
+                del ids[_TOP_K:]
+
+    def _best_rank(self, prefix: str, product_id: UUID) -> int:
+        item = self._items[product_id]
+        whole = normalize_name(item.name).startswith(prefix)
+        return item.weight + (_WHOLE_NAME_BONUS if whole else 0)
+
+    def _rank_slice(self, lo: int, hi: int, limit: int) -> list[UUID]:
+        # A product can match through several words; over-fetch, then dedupe
+        fetch = limit
+        while True:
+            best = heapq.nlargest(fetch, range(lo, hi), key=lambda pos: self._entries[pos][1])
+            ids = list(dict.fromkeys(self._entries[pos][2] for pos in best))
+            if len(ids) >= limit or fetch >= hi - lo:
+                return ids[:limit]
+            fetch *= 2
+
+    def search(self, prefix: str, limit: int) -> list[Suggestion]:
+        """Top ``limit`` products with a word starting with ``prefix``.
+
+        Names that start with the prefix rank above mid-name word matches;
+        within each group the most popular come first.
+        """
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        ids = self._top.get(prefix)
+        if ids is None or limit > _TOP_K:
+            lo = bisect.bisect_left(self._entries, (prefix,))
+            hi = bisect.bisect_left(self._entries, (prefix + "\uffff",), lo)
+            if hi - lo <= _SCAN_LIMIT or limit > _TOP_K:
+                ids = self._rank_slice(lo, hi, limit)
+            else:
+                if len(self._top) >= _MAX_CACHED_PREFIXES:
+                    self._top.clear()
+                ids = self._top[prefix] = self._rank_slice(lo, hi, _TOP_K)
+        return [self._items[product_id] for product_id in ids[:limit]]
+
+    def stats(self) -> dict:
+        approx_bytes = (
+            sys.getsizeof(self._entries) + sys.getsizeof(self._items)
+            + sum(sys.getsizeof(e) + sys.getsizeof(e[0]) for e in self._entries)
+            + sum(sys.getsizeof(i) + sys.getsizeof(i.name) + sys.getsizeof(i.id)
+                  for i in self._items.values())
+            + sys.getsizeof(self._top)
+            + sum(sys.getsizeof(ids) for ids in self._top.values())
+        )
+        return {
+            "products": len(self._items), "keys": len(self._entries),
+            "cached_prefixes": len(self._top), "truncated": self.truncated,
+            "approx_bytes": approx_bytes,
+        }
+
+
+prefix_index = PrefixIndex(max_entries=settings.AUTOCOMPLETE_INDEX_MAX_ENTRIES)
+
+
+def _suggestion(product: Product) -> Suggestion:
+    return Suggestion(
+        id=product.id, name=product.name, price=product.price,
+        unit_type=product.unit_type, weight=product.total_sold or 0,
+    )
+
+
+async def load_prefix_index(db: AsyncSession) -> None:
+    """(Re)build ``prefix_index`` from the active catalog."""
+    result = await db.execute(
+        select(
+            Product.id, Product.name, Product.price,
+            Product.unit_type, Product.total_sold,
+        )
+        .where(Product.status == ProductStatus.ACTIVE)
+        .order_by(Product.total_sold.desc())
+        .limit(settings.AUTOCOMPLETE_INDEX_MAX_ENTRIES + 1)
+    )
+    prefix_index.build([
+        Suggestion(r.id, r.name, r.price, r.unit_type, r.total_sold or 0)
+        for r in result.all()
+    ])
+    logger.info("Autocomplete prefix index built: %s", prefix_index.stats())
+
+
+async def run_prefix_index_refresher(session_factory) -> None:
+    """Background loop: full rebuild every ``AUTOCOMPLETE_INDEX_REFRESH_SECONDS``."""
+    while True:
+        await asyncio.sleep(settings.AUTOCOMPLETE_INDEX_REFRESH_SECONDS)
+        try:
+            async with session_factory() as db:
+                await load_prefix_index(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Autocomplete prefix index refresh failed")
+
+
+def index_product_on_commit(db: AsyncSession, product: Product) -> None:
+    """Apply a created/updated product to this worker's index after commit."""
+    if settings.AUTOCOMPLETE_BACKEND != "memory":
+        return
+    if product.status == ProductStatus.ACTIVE:
+        item = _suggestion(product)
+        apply = lambda session: prefix_index.upsert(item)
+    else:
+        product_id = product.id
+        apply = lambda session: prefix_index.remove(product_id)
+    event.listen(db.sync_session, "after_commit", apply, once=True)
+
+
+def unindex_product_on_commit(db: AsyncSession, product_id: UUID) -> None:
+    """Drop a deleted product from this worker's index after commit."""
+    if settings.AUTOCOMPLETE_BACKEND != "memory":
+        return
+    event.listen(
+        db.sync_session, "after_commit",
+        lambda session: prefix_index.remove(product_id), once=True,
+    )
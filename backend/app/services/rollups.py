@@ -0,0 +1,179 @@
+"""Incrementally maintained ``daily_sales_rollup`` and ``customer_stats``.
+
+Every order is counted once, under the UTC day it was placed, its vendor
+and its current status. Placing an order adds it to its ``PENDING`` row; a
+status change moves it from the old status row to the new one. The
+customer's row counts the order and adds its total to ``total_spent``
+while it is ``DELIVERED``. Deltas are upserted in the same transaction as
+the order change, so the projections commit or roll back with it.
+
+``rebuild_daily_rollup`` and ``rebuild_customer_stats`` recompute them from
+``orders``, for the initial backfill and for repairs.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import select, delete, func, text, values, column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.models.order import CustomerStats, DailySalesRollup, Order, OrderStatus
+
+_MEASURES = ("order_count", "revenue", "commission", "discount")
+
+
+def _utc_day(value: datetime) -> date:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def _order_day():
+    return func.date(func.timezone("UTC", Order.created_at))
+
+
+def _rollup_upsert(orders: list, old_status: OrderStatus | None, new_status: OrderStatus):
+    deltas = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for order in orders:
+        amounts = (1, order.total_amount or 0.0, order.commission_amount or 0.0,
+                   order.discount_amount or 0.0)
+        day = _utc_day(order.created_at)
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            if status is None:
+                continue
+            acc = deltas[(day, order.vendor_id, status)]
+            for i, v in enumerate(amounts):
+                acc[i] += sign * v
+    rows = [(*key, *totals) for key, totals in deltas.items() if any(totals)]
+    if not rows:
+        return None
+    # INSERT .. SELECT FROM (VALUES ..) rather than a multi-row VALUES clause,
+    # which SQLAlchemy cannot render inside a CTE
+    table = DailySalesRollup.__table__
+    source = values(*[column(c.name, c.type) for c in table.c], name="delta").data(rows)
+    stmt = pg_insert(DailySalesRollup).from_select([c.name for c in table.c], select(source))
+    return stmt.on_conflict_do_update(
+        index_elements=["day", "vendor_id", "status"],
+        set_={m: getattr(DailySalesRollup, m) + getattr(stmt.excluded, m) for m in _MEASURES},
+    )
+
+
+def _customer_upsert(orders: list, old_status: OrderStatus | None, new_status: OrderStatus):
+    deltas = defaultdict(lambda: [0, 0.0])
+    for order in orders:
+        acc = deltas[order.customer_id]
+        if old_status is None:
+            acc[0] += 1
+        if new_status == OrderStatus.DELIVERED:
+            acc[1] += order.total_amount or 0.0
+        elif old_status == OrderStatus.DELIVERED:
+            acc[1] -= order.total_amount or 0.0
+    rows = [
+        {"user_id": user_id, "order_count": count, "total_spent": spent}
+        for user_id, (count, spent) in deltas.items()
+        if count or spent
+    ]
+    if not rows:
+        return None
+    stmt = pg_insert(CustomerStats).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "order_count": CustomerStats.order_count + stmt.excluded.order_count,
+            "total_spent": CustomerStats.total_spent + stmt.excluded.total_spent,
+        },
+    )
+
+
+async def record_status_changes(
+    db: AsyncSession, orders: Iterable, old_status: OrderStatus | None, new_status: OrderStatus,
+) -> None:
+    """Move ``orders`` from ``old_status`` (None for new orders) to ``new_status``.
+
+    ``orders`` may be ``Order`` instances or rows with the same attributes
+    (``created_at``, ``vendor_id``, ``customer_id`` and the amount columns).
+    """
+    if old_status == new_status:
+        return
+    orders = list(orders)
+    rollup = _rollup_upsert(orders, old_status, new_status)
+    customers = _customer_upsert(orders, old_status, new_status)
+    if rollup is not None and customers is not None:
+        # Both upserts in one round trip: the rollup runs as a data-modifying CTE
+        await db.execute(customers.add_cte(rollup.cte("rollup_delta")))
+    elif rollup is not None or customers is not None:
+        await db.execute(rollup if rollup is not None else customers)
+
+
+async def record_status_change(
+    db: AsyncSession, order: Order, old_status: OrderStatus | None, new_status: OrderStatus,
+) -> None:
+    await record_status_changes(db, [order], old_status, new_status)
+
+
+async def rebuild_daily_rollup(
+    conn: AsyncConnection, start: date | None = None, end: date | None = None,
+) -> int:
+    """Recompute rollup rows for days in ``[start, end]`` (open-ended if None).
+
+    Takes a lock that blocks concurrent rollup upserts until commit, so
+    status changes racing the rebuild are applied on top of it rather than
+    lost. Returns the number of rows written.
+    """
+    await conn.execute(text("LOCK TABLE daily_sales_rollup IN SHARE ROW EXCLUSIVE MODE"))
+
+    day = _order_day()
+    cleared = delete(DailySalesRollup)
+    source = (
+        select(
+            day.label("day"), Order.vendor_id, Order.status,
+            func.count().label("order_count"),
+            func.coalesce(func.sum(Order.total_amount), 0.0).label("revenue"),
+            func.coalesce(func.sum(Order.commission_amount), 0.0).label("commission"),
+            func.coalesce(func.sum(Order.discount_amount), 0.0).label("discount"),
+        )
+        .group_by(day, Order.vendor_id, Order.status)
+    )
+    if start is not None:
+        cleared = cleared.where(DailySalesRollup.day >= start)
+        source = source.where(Order.created_at >= datetime.combine(start, time.min))
+    if end is not None:
+        cleared = cleared.where(DailySalesRollup.day <= end)
+        source = source.where(Order.created_at < datetime.combine(end + timedelta(days=1), time.min))
+
+    await conn.execute(cleared)
+    result = await conn.execute(
+        pg_insert(DailySalesRollup).from_select(
+            ["day", "vendor_id", "status", *_MEASURES], source,
+        )
+    )
+    return result.rowcount
+
+
+def customer_stats_projection():
+    """``customer_stats``-shaped subquery grouped straight from ``orders``."""
+    return (
+        select(
+            Order.customer_id.label("user_id"),
+            func.count().label("order_count"),
+            func.coalesce(
+                func.sum(Order.total_amount).filter(Order.status == OrderStatus.DELIVERED), 0.0
+            ).label("total_spent"),
+        )
+        .group_by(Order.customer_id)
+        .subquery("customer_stats_projection")
+    )
+
+
+async def rebuild_customer_stats(conn: AsyncConnection) -> int:
+    """Recompute every ``customer_stats`` row; locks like ``rebuild_daily_rollup``."""
+    await conn.execute(text("LOCK TABLE customer_stats IN SHARE ROW EXCLUSIVE MODE"))
+    await conn.execute(delete(CustomerStats))
+    projection = customer_stats_projection()
+    result = await conn.execute(
+        pg_insert(CustomerStats).from_select(
+            ["user_id", "order_count", "total_spent"], select(projection),
+        )
+    )
+    return result.rowcount
@@ -0,0 +1,100 @@
+"""Postgres full-text search over ``Product.search_vector``.
+
+A trigger keeps ``search_vector`` current on every insert and on updates to
+the searchable columns, weighting the product name (A) above brand and
+tags (B) and descriptions (C). Queries are parsed with
+``websearch_to_tsquery`` so users can type quotes, ``or`` and ``-term``,
+and matches are served from the ``ix_products_search`` GIN index.
+
+Rows written before the trigger existed are filled by ``backfill_search.py``.
+"""
+from uuid import UUID
+
+from sqlalchemy import func, cast, literal, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.models.product import Product
+
+SEARCH_CONFIG = "english"
+# How much a best seller is lifted over an equally relevant slow mover:
+# rank * (1 + POPULARITY_WEIGHT * ln(1 + total_sold))
+POPULARITY_WEIGHT = 0.1
+
+_SEARCH_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION product_search_vector(
+        name text, tags jsonb, description text, short_description text
+    ) RETURNS tsvector
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A')
+            || setweight(jsonb_to_tsvector('{SEARCH_CONFIG}', coalesce(tags, '{{}}'), '["string"]'), 'B')
+            || setweight(to_tsvector('{SEARCH_CONFIG}',
+                   coalesce(short_description, '') || ' ' || coalesce(description, '')), 'C')
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION products_search_vector_refresh() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := product_search_vector(
+            NEW.name, NEW.tags, NEW.description, NEW.short_description
+        );
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE TRIGGER products_search_vector_refresh
+    BEFORE INSERT OR UPDATE OF name, tags, description, short_description ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_refresh()
+    """,
+]
+
+_BACKFILL_BATCH = text("""
+    WITH batch AS (
+        SELECT id FROM products
+        WHERE (:rebuild OR search_vector IS NULL) AND id > :after
+        ORDER BY id LIMIT :batch_size
+    )
+    UPDATE products AS p
+    SET search_vector = product_search_vector(p.name, p.tags, p.description, p.short_description)
+    FROM batch
+    WHERE p.id = batch.id
+    RETURNING p.id
+""")
+
+
+async def install_search_trigger(conn: AsyncConnection) -> None:
+    """Create (or replace) the search_vector function and trigger."""
+    for statement in _SEARCH_DDL:
+        await conn.execute(text(statement))
+
+
+async def backfill_search_vectors(
+    conn: AsyncConnection, after: UUID, batch_size: int, rebuild: bool = False
+) -> list[UUID]:
+    """Fill one batch of rows after ``after`` (by id); returns their ids.
+
+    Only rows with a NULL search_vector are touched unless ``rebuild``.
+    """
+    result = await conn.execute(_BACKFILL_BATCH, {
+        "after": after, "batch_size": batch_size, "rebuild": rebuild,
+    })
+    return sorted(result.scalars().all())
+
+
+def search_query(q: str):
+    """The parsed ``tsquery`` for a user-supplied search string."""
+    return func.websearch_to_tsquery(cast(literal(SEARCH_CONFIG), REGCONFIG), q)
+
+
+def search_filter(q: str):
+    """WHERE clause matching products against ``q`` (GIN-indexed)."""
+    return Product.search_vector.bool_op("@@")(search_query(q))
+
+
+def search_rank(q: str):
+    """Relevance (cover density) scaled up by sales volume."""
+    relevance = func.ts_rank_cd(Product.search_vector, search_query(q), 32)
+    return relevance * (1 + POPULARITY_WEIGHT * func.ln(1 + Product.total_sold))
@@ -0,0 +1,166 @@
+"""Delivery partner locations: coalesced broadcasts, batched persistence.
+
+Partner apps send ``location_update`` frames as fast as GPS allows.
+``location_tracker.offer`` only records the newest position per order;
+once per ``WS_LOCATION_TICK_SECONDS`` the tracker broadcasts each order's
+latest position, skipping orders that moved less than
+``WS_LOCATION_MIN_DISTANCE_METRES`` since the last broadcast. Watchers so
+get at most one update per tick, however often the partner reports.
+
+Broadcast positions are also written to ``Order.delivery_latitude`` /
+``delivery_longitude``, one batched UPDATE per
+``WS_LOCATION_PERSIST_INTERVAL_SECONDS`` for all orders that moved, and
+once more on shutdown (``close``). Only the order's assigned delivery
+partner can report positions (see ``app.api.v1.websockets``).
+
+State is per worker; a partner's frames all arrive on the worker holding
+its socket.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from uuid import UUID
+
+from sqlalchemy import bindparam, update
+
+from app.config import get_settings
+from app.core.broker import broker
+from app.models.order import Order
+from app.utils.helpers import calculate_distance_km
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Position:
+    latitude: float
+    longitude: float
+    timestamp: object = None  # as sent by the client
+
+
+def _channel(order_id: str) -> str:
+    return f"order:{order_id}"
+
+
+class LocationTracker:
+    def __init__(self):
+        self._pending: dict[str, Position] = {}  # latest report since the last tick
+        self._sent: dict[str, Position] = {}  # last broadcast, per order
+        self._unsaved: dict[UUID, Position] = {}
+        self.received = 0
+        self.broadcast = 0
+
+    def offer(self, order_id: str, latitude, longitude, timestamp=None) -> bool:
+        """Record a reported position; False if the coordinates are unusable."""
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            return False
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return False
+        self.received += 1
+        self._pending[order_id] = Position(latitude, longitude, timestamp)
+        return True
+
+    def _moved(self, order_id: str, position: Position) -> bool:
+        last = self._sent.get(order_id)
+        if last is None:
+            return True
+        metres = 1000 * calculate_distance_km(
+            last.latitude, last.longitude, position.latitude, position.longitude
+        )
+        return metres >= settings.WS_LOCATION_MIN_DISTANCE_METRES
+
+    async def flush(self) -> int:
+        """Broadcast each order's latest position, if it moved far enough."""
+        pending, self._pending = self._pending, {}
+        sent = 0
+        for order_id, position in pending.items():
+            if not self._moved(order_id, position):
+                continue
+            self._sent[order_id] = position
+            await broker.publish(_channel(order_id), {
+                "type": "location_update",
+                "latitude": position.latitude,
+                "longitude": position.longitude,
+                "timestamp": position.timestamp,
+            })
+            sent += 1
+            try:
+                self._unsaved[UUID(order_id)] = position
+            except ValueError:
+                pass  # not an order id; nothing to persist
+        self.broadcast += sent
+        # Forget orders nobody on this worker is watching any more
+        for order_id in [o for o in self._sent if not broker.subscribers(_channel(o))]:
+            del self._sent[order_id]
+        return sent
+
+    async def persist(self, session_factory) -> int:
+        """Write the latest broadcast positions in one batched UPDATE."""
+        if not self._unsaved:
+            return 0
+        unsaved, self._unsaved = self._unsaved, {}
+        table = Order.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("order_id"))
+            # Keep updated_at: a position ping is not a change to the order
+            .values(delivery_latitude=bindparam("latitude"),
+                    delivery_longitude=bindparam("longitude"),
+                    updated_at=table.c.updated_at)
+        )
+        try:
+            async with session_factory() as db:
+                async with db.begin():
+                    await db.execute(statement, [
+                        {"order_id": order_id, "latitude": p.latitude, "longitude": p.longitude}
+                        for order_id, p in unsaved.items()
+                    ])
+        except BaseException:
+            # Newer positions reported meanwhile win over the failed batch
+            self._unsaved = {**unsaved, **self._unsaved}
+            raise
+        return len(unsaved)
+
+    async def close(self, session_factory) -> None:
+        """Persist every position still held, broadcast or not (on shutdown)."""
+        for order_id, position in self._pending.items():
+            try:
+                self._unsaved[UUID(order_id)] = position
+            except ValueError:
+                pass
+        self._pending = {}
+        try:
+            await self.persist(session_factory)
+        except Exception:
+            logger.exception("Could not persist locations on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "tracked_orders": len(self._sent),
+            "pending": len(self._pending),
+            "unsaved": len(self._unsaved),
+            "received": self.received,
+            "broadcast": self.broadcast,
+        }
+
+    async def run(self, session_factory) -> None:
+        """Background loop: flush every tick, persist every persist interval."""
+        persisted_at = time.monotonic()
+        while True:
+            await asyncio.sleep(settings.WS_LOCATION_TICK_SECONDS)
+            try:
+                await self.flush()
+                if time.monotonic() - persisted_at >= settings.WS_LOCATION_PERSIST_INTERVAL_SECONDS:
+                    persisted_at = time.monotonic()
+                    await self.persist(session_factory)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Location flush failed")
+
+
+location_tracker = LocationTracker()
@@ -0,0 +1,57 @@
+"""Rebuild daily_sales_rollup and customer_stats from orders (backfill or repair).
+
+Usage:
+    python backfill_rollups.py                          # every day with orders
+    python backfill_rollups.py --since 2024-01-01       # from a day onwards
+    python backfill_rollups.py --since 2024-03-01 --until 2024-03-31
+
+customer_stats is always rebuilt in full; it has no per-day breakdown.
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, func
+
+from app.database import engine
+from app.models.order import Order, DailySalesRollup, CustomerStats
+from app.services.rollups import rebuild_daily_rollup, rebuild_customer_stats
+
+# Days per transaction; each holds the rollup lock only while it runs
+CHUNK_DAYS = 31
+
+
+async def backfill(since: date | None = None, until: date | None = None):
+    async with engine.begin() as conn:
+        await conn.run_sync(DailySalesRollup.__table__.create, checkfirst=True)
+        await conn.run_sync(CustomerStats.__table__.create, checkfirst=True)
+        first, last = (await conn.execute(
+            select(func.min(Order.created_at), func.max(Order.created_at))
+        )).one()
+    if first is None:
+        print("No orders to roll up.")
+        await engine.dispose()
+        return
+
+    start = since or first.date()
+    end = until or max(last.date(), datetime.utcnow().date())
+    total = 0
+    while start <= end:
+        chunk_end = min(start + timedelta(days=CHUNK_DAYS - 1), end)
+        async with engine.begin() as conn:
+            total += await rebuild_daily_rollup(conn, start, chunk_end)
+        print(f"  {start} .. {chunk_end}: {total} rollup rows written...")
+        start = chunk_end + timedelta(days=1)
+
+    async with engine.begin() as conn:
+        customers = await rebuild_customer_stats(conn)
+    print(f"Done: {total} rollup rows, {customers} customer_stats rows written.")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--since", type=date.fromisoformat, help="first day (UTC), YYYY-MM-DD")
+    parser.add_argument("--until", type=date.fromisoformat, help="last day (UTC), YYYY-MM-DD")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.since, args.until))
@@ -0,0 +1,41 @@
+"""Backfill Product.search_vector for rows written before the search trigger.
+
+Usage:
+    python backfill_search.py             # only rows with no search_vector
+    python backfill_search.py --rebuild   # recompute every row (e.g. after changing weights)
+"""
+import argparse
+import asyncio
+import uuid
+
+from app.database import engine
+from app.services.search import install_search_trigger, backfill_search_vectors
+
+BATCH_SIZE = 5000
+
+
+async def backfill(rebuild: bool = False):
+    async with engine.begin() as conn:
+        await install_search_trigger(conn)
+
+    after = uuid.UUID(int=0)
+    total = 0
+    while True:
+        # One transaction per batch keeps locks short on a live catalog
+        async with engine.begin() as conn:
+            ids = await backfill_search_vectors(conn, after, BATCH_SIZE, rebuild)
+        if not ids:
+            break
+        total += len(ids)
+        after = ids[-1]
+        print(f"  {total} products indexed...")
+
+    print(f"Done: {total} products indexed.")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rebuild", action="store_true", help="recompute every row")
+    args = parser.parse_args()
+    asyncio.run(backfill(rebuild=args.rebuild))
@@ -0,0 +1,115 @@
+"""Benchmark autocomplete: in-process prefix index vs. the SQL backends.
+
+Usage:
+    python bench_autocomplete.py                      # synthetic 200k-name index only
+    python bench_autocomplete.py --size 50000
+    python bench_autocomplete.py --sql trigram ilike  # also time SQL against DATABASE_URL
+
+The SQL run queries whatever catalog DATABASE_URL points at, so seed it at
+a comparable size first for a fair comparison.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from app.models.product import UnitType
+from app.services.prefix_index import PrefixIndex, Suggestion
+
+WORDS = [
+    "organic", "fresh", "red", "green", "ripe", "baby", "farm", "premium", "local",
+    "tomato", "apple", "banana", "spinach", "onion", "potato", "carrot", "mango",
+    "milk", "paneer", "butter", "yogurt", "bread", "cookies", "chips", "juice",
+    "rice", "basmati", "atta", "dal", "masala", "tea", "coffee", "honey", "oil",
+]
+QUERIES = ["t", "to", "tom", "toma", "ap", "app", "ban", "mi", "org", "fresh m", "pan", "bas"]
+
+
+def _catalog(size: int) -> list[Suggestion]:
+    rng = random.Random(42)
+    syllables = ["ka", "ro", "mi", "ta", "su", "ne", "lo", "pa", "ri", "do", "ve", "za"]
+    # Brand-like made-up words so the key space is not just the few above
+    brands = ["".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(3000)]
+    return [
+        Suggestion(
+            id=uuid.uuid4(),
+            name=" ".join([rng.choice(brands)] + rng.sample(WORDS, rng.randint(1, 3))),
+            price=rng.uniform(10, 500),
+            unit_type=UnitType.PIECE,
+            weight=int(rng.paretovariate(1.2) * 10),
+        )
+        for i in range(size)
+    ]
+
+
+def _report(label: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<28} p50 {statistics.median(samples):>10.1f} us   p99 {p99:>10.1f} us")
+
+
+def bench_memory(size: int, rounds: int) -> None:
+    index = PrefixIndex(max_entries=size)
+    started = time.perf_counter()
+    index.build(_catalog(size))
+    print(f"built {size} products in {time.perf_counter() - started:.2f}s: {index.stats()}")
+
+    short = [q for q in QUERIES if len(q) <= 3]
+    long = [q for q in QUERIES if len(q) > 3]
+    cold = []
+    for q in QUERIES:
+        t0 = time.perf_counter()
+        index.search(q, 10)
+        cold.append((time.perf_counter() - t0) * 1e6)
+    _report("memory, first lookup", cold)
+    for label, queries in (("memory, <=3 chars", short), ("memory, >3 chars", long)):
+        samples = []
+        for _ in range(rounds):
+            for q in queries:
+                t0 = time.perf_counter()
+                index.search(q, 10)
+                samples.append((time.perf_counter() - t0) * 1e6)
+        _report(label, samples)
+
+    extra = _catalog(1000)
+    t0 = time.perf_counter()
+    for item in extra:
+        index.upsert(item)
+    print(f"upsert at cap: {(time.perf_counter() - t0) / len(extra) * 1e6:.1f} us/product")
+    t0 = time.perf_counter()
+    for item in extra:
+        index.remove(item.id)
+    print(f"remove: {(time.perf_counter() - t0) / len(extra) * 1e6:.1f} us/product")
+
+
+async def bench_sql(backends: list[str], rounds: int) -> None:
+    from app.database import AsyncSessionLocal, engine
+    from app.services.autocomplete import trigram_suggestions, ilike_suggestions
+
+    runners = {"trigram": trigram_suggestions, "ilike": ilike_suggestions}
+    async with AsyncSessionLocal() as db:
+        for backend in backends:
+            run = runners[backend]
+            await run(db, "warm", 10)
+            samples = []
+            for _ in range(rounds):
+                for q in QUERIES:
+                    t0 = time.perf_counter()
+                    await run(db, q, 10)
+                    samples.append((time.perf_counter() - t0) * 1e6)
+            _report(f"sql {backend}", samples)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--sql", nargs="*", choices=["trigram", "ilike"], default=[])
+    args = parser.parse_args()
+
+    bench_memory(args.size, args.rounds)
+    if args.sql:
+        asyncio.run(bench_sql(args.sql, max(args.rounds // 5, 1)))
@@ -0,0 +1,145 @@
+"""Benchmark response serialization: the FastAPI default path vs. app.core.responses.
+
+Usage:
+    python bench_serialization.py                 # pages of 20 and 100 rows
+    python bench_serialization.py --rows 50 --rounds 500
+
+Rows are transient ORM objects shaped like the catalog and order lists
+(images, variants, items, status history), so no database is needed.
+"default" is what a handler returning ``PaginatedResponse(data=[Model.
+model_validate(row) ...])`` costs: per-row validation, FastAPI's
+``response_model`` validation and serialization, then stdlib JSON
+(``JSONResponse``, the old default) or orjson (``ORJSONResponse``).
+"render" is ``app.core.responses.render``.
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.utils import create_model_field
+
+from app.core.responses import render
+from app.models.order import Order, OrderItem, OrderStatusHistory, OrderStatus, PaymentStatus
+from app.models.product import Product, ProductImage, ProductVariant, ProductStatus, UnitType
+from app.schemas.base import PaginatedResponse
+from app.schemas.order import OrderResponse
+from app.schemas.product import ProductResponse
+
+NOW = datetime(2026, 1, 1)
+
+
+def _products(n: int, rng: random.Random) -> list[Product]:
+    rows = []
+    for i in range(n):
+        product_id = uuid.uuid4()
+        rows.append(Product(
+            id=product_id, vendor_id=uuid.uuid4(), category_id=uuid.uuid4(),
+            name=f"Fresh Produce {i}", slug=f"fresh-produce-{i}",
+            description="Farm fresh, picked this morning. " * 4,
+            short_description="Farm fresh", price=rng.uniform(10, 500),
+            compare_at_price=None, sku=f"SKU{i:06d}", stock_quantity=rng.randint(0, 200),
+            unit_type=UnitType.KG, unit_value=1.0, status=ProductStatus.ACTIVE,
+            is_featured=False, is_organic=bool(i % 2), avg_rating=4.2, total_reviews=12,
+            total_sold=rng.randint(0, 5000), tags={"brand": "Acme", "origin": "local"},
+            nutritional_info=None, created_at=NOW, updated_at=NOW,
+            images=[
+                ProductImage(id=uuid.uuid4(), product_id=product_id,
+                             image_url=f"/uploads/products/{i}-{k}.jpg", alt_text=None,
+                             sort_order=k, is_primary=k == 0)
+                for k in range(3)
+            ],
+            variants=[
+                ProductVariant(id=uuid.uuid4(), product_id=product_id, name=f"{k} kg",
+                               sku=None, price=rng.uniform(10, 500), compare_at_price=None,
+                               stock_quantity=10, unit_type=UnitType.KG, unit_value=float(k),
+                               is_active=True, attributes=None)
+                for k in (1, 2)
+            ],
+        ))
+    return rows
+
+
+def _orders(n: int, rng: random.Random) -> list[Order]:
+    rows = []
+    for i in range(n):
+        order_id = uuid.uuid4()
+        rows.append(Order(
+            id=order_id, order_number=f"ORD{i:08d}", customer_id=uuid.uuid4(),
+            vendor_id=uuid.uuid4(), delivery_partner_id=None,
+            delivery_address={"full_address": "12 Market Road", "city": "Pune", "postal_code": "411001"},
+            subtotal=420.0, delivery_fee=30.0, discount_amount=0.0, tax_amount=21.0,
+            total_amount=471.0, commission_rate=10.0, commission_amount=42.0,
+            status=OrderStatus.CONFIRMED, payment_status=PaymentStatus.COD,
+            payment_method="cod", coupon_code=None, customer_note=None,
+            estimated_delivery_time=NOW + timedelta(hours=1), actual_delivery_time=None,
+            created_at=NOW, updated_at=NOW,
+            items=[
+                OrderItem(id=uuid.uuid4(), order_id=order_id, product_id=uuid.uuid4(),
+                          variant_id=None, product_name=f"Item {k}", product_image_url=None,
+                          unit_price=rng.uniform(10, 200), quantity=2, total_price=100.0,
+                          unit_type="kg", unit_value=1.0)
+                for k in range(4)
+            ],
+            status_history=[
+                OrderStatusHistory(id=uuid.uuid4(), order_id=order_id, status=status,
+                                   note=None, created_at=NOW)
+                for status in (OrderStatus.PENDING, OrderStatus.CONFIRMED)
+            ],
+        ))
+    return rows
+
+
+def _default(model, field, response_class, rows) -> bytes:
+    # What FastAPI's serialize_response does for a response_model route
+    content = PaginatedResponse(data=[model.model_validate(row) for row in rows], total=len(rows))
+    value, errors = field.validate(content, {}, loc=("response",))
+    assert not errors, errors
+    return response_class(field.serialize(value, by_alias=True)).body
+
+
+def _render(model, rows) -> bytes:
+    return render(PaginatedResponse[model], dict(data=rows, total=len(rows))).body
+
+
+def _time(fn, rows: list, rounds: int) -> float:
+    """Best-of-``rounds`` microseconds per row (least disturbed by other load)."""
+    fn(rows)  # warm up (builds validators)
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn(rows)
+        samples.append((time.perf_counter() - t0) * 1e6 / len(rows))
+    return min(samples)
+
+
+def bench(model, make_rows, page_sizes: list[int], rounds: int) -> None:
+    field = create_model_field(
+        name=f"Response_{model.__name__}", type_=PaginatedResponse[model], mode="serialization",
+    )
+    rng = random.Random(42)
+    for size in page_sizes:
+        rows = make_rows(size, rng)
+        paths = {
+            "default + JSONResponse": lambda r: _default(model, field, JSONResponse, r),
+            "default + ORJSONResponse": lambda r: _default(model, field, ORJSONResponse, r),
+            "render": lambda r: _render(model, r),
+        }
+        baseline = None
+        for label, fn in paths.items():
+            per_row = _time(fn, rows, rounds)
+            baseline = baseline or per_row
+            print(f"{model.__name__:<16} {size:>4} rows  {label:<26} "
+                  f"{per_row:>8.1f} us/row  x{baseline / per_row:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="*", default=[20, 100])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    bench(ProductResponse, _products, args.rows, args.rounds)
+    bench(OrderResponse, _orders, args.rows, args.rounds)
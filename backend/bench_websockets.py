@@ -0,0 +1,301 @@
+"""Load-test the WebSocket endpoints of a running app.
+
+Usage:
+    uvicorn app.main:app --port 8000 &
+    python bench_websockets.py --clients 2000 --server-pid $!
+    python bench_websockets.py --clients 5000 --orders 500 --vendors 50 --output ws.json
+    python bench_websockets.py --order-ids ORDER_ID ... --partner-token TOKEN
+
+Opens ``--clients`` sockets spread over ``--orders`` ``/ws/orders/{id}``
+channels and ``--vendors`` ``/ws/vendor/{id}`` channels, then drives them
+for ``--duration`` seconds with:
+
+- location updates: with ``--partner-token`` (an access token of the
+  delivery partner assigned to every ``--order-ids`` order) the first
+  socket of each order channel connects as the partner and sends a frame
+  every ``1 / --location-hz`` seconds. Watchers get the coalesced
+  position, so this latency includes the location tracker's tick. The
+  server ignores positions from anyone else, so without a token (or with
+  random order ids) this is skipped;
+- order status events, ``--events-per-second`` in total, published
+  straight onto the broker's Redis channels (``ws:order:<id>``,
+  ``ws:vendor:<id>``), the path a broadcast from another worker takes.
+  Needs the app on the redis broker backend; skipped if ``--redis-url``
+  cannot be reached.
+
+Latency is receive time minus the send time carried in each message, so
+run this on the same host as the app. With ``--server-pid`` (Linux) the
+server's RSS growth per socket and its CPU time per delivered message are
+read from /proc; with ``--admin-token`` the worker's send-queue stats are
+included. The report is JSON (stdout, or ``--output``) for comparing runs.
+Large ``--clients`` need a raised ``ulimit -n`` on both sides.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import httpx
+import orjson
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from websockets.asyncio.client import connect
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+@dataclass
+class Recorder:
+    status_ms: list[float] = field(default_factory=list)
+    location_ms: list[float] = field(default_factory=list)
+    closed: int = 0  # sockets the server closed during the run
+
+    def record(self, raw: str | bytes) -> None:
+        now = time.time()
+        message = orjson.loads(raw)
+        if message.get("type") == "location_update":
+            sent_at = message.get("timestamp")
+            target = self.location_ms
+        else:
+            sent_at = message.get("sent_at")
+            target = self.status_ms
+        if isinstance(sent_at, (int, float)):
+            target.append((now - sent_at) * 1000)
+
+
+def _summary(values: list[float]) -> dict:
+    if len(values) < 2:
+        return {"count": len(values)}
+    cuts = statistics.quantiles(values, n=100)
+    return {
+        "count": len(values),
+        "p50_ms": round(cuts[49], 3),
+        "p99_ms": round(cuts[98], 3),
+        "max_ms": round(max(values), 3),
+    }
+
+
+def _rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise ValueError(f"no VmRSS for pid {pid}")
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def _listen(ws, recorder: Recorder) -> None:
+    try:
+        async for raw in ws:
+            recorder.record(raw)
+    except Exception:
+        pass
+    recorder.closed += 1
+
+
+async def _open(url: str, paths: list[str], concurrency: int, recorder: Recorder):
+    gate = asyncio.Semaphore(concurrency)
+    sockets: list = [None] * len(paths)
+    listeners = []
+
+    async def one(i: int, path: str):
+        async with gate:
+            try:
+                sockets[i] = await connect(url + path, open_timeout=30, max_queue=None)
+            except Exception:
+                return
+            listeners.append(asyncio.create_task(_listen(sockets[i], recorder)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i, path) for i, path in enumerate(paths)))
+    return sockets, listeners, time.perf_counter() - started
+
+
+async def _drive_locations(partners: list, hz: float, until: float) -> int:
+    if not partners or hz <= 0:
+        return 0
+    sent = 0
+    positions = [[18.5 + random.random() / 10, 73.8 + random.random() / 10] for _ in partners]
+    while time.time() < until:
+        tick = time.perf_counter()
+        for ws, position in zip(partners, positions):
+            position[0] += 0.0002  # ~22 m, past the tracker's minimum distance
+            try:
+                await ws.send(orjson.dumps({
+                    "type": "location_update", "latitude": position[0],
+                    "longitude": position[1], "timestamp": time.time(),
+                }).decode())
+                sent += 1
+            except Exception:
+                pass
+        await asyncio.sleep(max(0.0, 1 / hz - (time.perf_counter() - tick)))
+    return sent
+
+
+async def _drive_events(redis, channels: dict[str, int], rate: float, until: float) -> dict:
+    """Publish status events round-robin over ``channels`` (name -> watchers)."""
+    names = list(channels)
+    published = expected = 0
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    while time.time() < until:
+        name = names[published % len(names)]
+        kind = "new_order" if name.startswith("vendor:") else "order_status"
+        await redis.publish("ws:" + name, orjson.dumps({
+            "type": kind, "status": "bench", "seq": published, "sent_at": time.time(),
+        }))
+        published += 1
+        expected += channels[name]
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+    return {"published": published, "expected_deliveries": expected}
+
+
+async def bench(args) -> dict:
+    base = args.url.rstrip("/") + settings.API_V1_PREFIX
+    ws_base = "ws" + base.removeprefix("http")
+    orders = args.order_ids or [str(uuid.uuid4()) for _ in range(args.orders)]
+    vendors = [str(uuid.uuid4()) for _ in range(args.vendors)]
+    vendor_clients = round(args.clients * args.vendor_share) if vendors else 0
+    channels = [f"vendor:{vendors[i % len(vendors)]}" for i in range(vendor_clients)]
+    channels += [f"order:{orders[i % len(orders)]}" for i in range(args.clients - vendor_clients)]
+    paths = [
+        f"/ws/vendor/{c.split(':')[1]}" if c.startswith("vendor:") else f"/ws/orders/{c.split(':')[1]}"
+        for c in channels
+    ]
+    # The first socket of each order channel reports as the partner
+    partner_at: set[int] = set()
+    if args.partner_token:
+        first: set[str] = set()
+        for i, channel in enumerate(channels):
+            if channel.startswith("order:") and channel not in first:
+                first.add(channel)
+                partner_at.add(i)
+                paths[i] += f"?token={args.partner_token}"
+
+    recorder = Recorder()
+    secrets = ("admin_token", "partner_token")
+    report: dict = {"config": {k: v for k, v in vars(args).items() if k not in secrets}}
+    rss_before = _rss_bytes(args.server_pid) if args.server_pid else None
+
+    sockets, listeners, connect_seconds = await _open(ws_base, paths, args.concurrency, recorder)
+    connected = sum(1 for ws in sockets if ws is not None)
+    report["connect"] = {
+        "requested": len(paths), "connected": connected,
+        "failed": len(paths) - connected, "seconds": round(connect_seconds, 3),
+    }
+    watchers: dict[str, int] = {}
+    partners = []
+    for i, (ws, channel) in enumerate(zip(sockets, channels)):
+        if ws is None:
+            continue
+        watchers[channel] = watchers.get(channel, 0) + 1
+        if i in partner_at:
+            partners.append(ws)
+
+    await asyncio.sleep(args.settle)
+    server: dict = {}
+    if args.server_pid:
+        rss_after = _rss_bytes(args.server_pid)
+        server.update(
+            rss_before_bytes=rss_before, rss_connected_bytes=rss_after,
+            rss_per_socket_bytes=round((rss_after - rss_before) / connected) if connected else None,
+        )
+
+    redis = aioredis.Redis.from_url(args.redis_url)
+    try:
+        await redis.ping()
+    except (RedisError, OSError) as exc:
+        report["status_events_skipped"] = f"Redis unavailable: {exc}"
+        await redis.aclose()
+        redis = None
+
+    cpu_before = _cpu_seconds(args.server_pid) if args.server_pid else None
+    client_cpu_before = time.process_time()
+    until = time.time() + args.duration
+    drivers = [_drive_locations(partners, args.location_hz, until)]
+    if redis is not None and watchers and args.events_per_second > 0:
+        drivers.append(_drive_events(redis, watchers, args.events_per_second, until))
+    results = await asyncio.gather(*drivers)
+    await asyncio.sleep(args.drain)
+    cpu_after = _cpu_seconds(args.server_pid) if args.server_pid else None
+
+    deliveries = len(recorder.status_ms) + len(recorder.location_ms)
+    if args.partner_token:
+        report["location_updates"] = {"sent": results[0], **_summary(recorder.location_ms)}
+    else:
+        report["location_updates_skipped"] = "no --partner-token"
+    if len(results) > 1:
+        report["status_events"] = {**results[1], **_summary(recorder.status_ms)}
+    if cpu_before is not None:
+        cpu = cpu_after - cpu_before
+        server.update(
+            cpu_seconds=round(cpu, 3),
+            cpu_percent=round(100 * cpu / (args.duration + args.drain), 1),
+            cpu_us_per_delivery=round(cpu * 1e6 / deliveries, 2) if deliveries else None,
+        )
+    report["server"] = server
+    report["client"] = {
+        "cpu_seconds": round(time.process_time() - client_cpu_before, 3),
+        "deliveries": deliveries,
+        "closed_by_server": recorder.closed,
+    }
+
+    if args.admin_token:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(
+                f"{base}/admin/system/websockets",
+                headers={"Authorization": f"Bearer {args.admin_token}"},
+            )
+            report["worker_stats"] = response.json().get("data") if response.is_success else None
+
+    for task in listeners:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in sockets if ws is not None), return_exceptions=True)
+    if redis is not None:
+        await redis.aclose()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--order-ids", nargs="+",
+                        help="existing orders to watch instead of --orders random ids")
+    parser.add_argument("--vendors", type=int, default=10)
+    parser.add_argument("--vendor-share", type=float, default=0.2,
+                        help="fraction of clients on vendor channels")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--location-hz", type=float, default=2.0)
+    parser.add_argument("--events-per-second", type=float, default=50.0)
+    parser.add_argument("--concurrency", type=int, default=200, help="parallel connects")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds before measuring")
+    parser.add_argument("--drain", type=float, default=3.0, help="seconds to wait for stragglers")
+    parser.add_argument("--redis-url", default=settings.REDIS_URL)
+    parser.add_argument("--server-pid", type=int)
+    parser.add_argument("--admin-token")
+    parser.add_argument("--partner-token", help="token of the orders' delivery partner")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(bench(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)